@@ -1,4 +1,4 @@
-import concurrent
+import traceback
 from threading import Lock
 from typing import List
 
@@ -19,6 +19,8 @@ class Announcer(BaseAutomation):
     _dnd_entity_id: str
     _queue: List
     _announcer_lock: Lock
+    _announcing: bool
+    _waiting_players: List
 
     def initialize(self):
         self._announcer_config = AnnouncerConfig({
@@ -35,6 +37,8 @@ class Announcer(BaseAutomation):
         })
 
         self._announcer_lock = Lock()
+        self._announcing = False
+        self._waiting_players = []
         self._queue = []
         self._dnd_player_entity_ids = []
 
@@ -130,18 +134,59 @@ class Announcer(BaseAutomation):
             self.error('No player specified')
             return
 
-        self._announcer_lock.acquire()
-        try:
-            self._do_announce(players)
-        finally:
-            self._announcer_lock.release()
+        # playing doesn't hold a thread, so instead of waiting for the lock, the players are queued up and used for
+        # whatever is queued once the current announcement finishes
+        with self._announcer_lock:
+            if self._announcing:
+                self.debug('Announcement in progress, queueing players ...')
+                self._waiting_players.append(players)
+                return
+
+            self._announcing = True
+
+        self._do_announce(players)
+
+    def _announce_finished(self):
+        with self._announcer_lock:
+            players = self._waiting_players.pop(0) if self._waiting_players else None
+            if players is None:
+                self._announcing = False
+                return
+
+        self._do_announce(players)
 
     def _do_announce(self, players):
-        queue = self._dequeue_all()
-        if not queue:
+        try:
+            queue = self._dequeue_all()
+            medias = self._figure_medias(queue)
+        except Exception:
+            self._announce_finished()
+            raise
+
+        if not medias:
             self.debug('Nothing in the queue, skipping ....')
+            self._announce_finished()
             return
 
+        remaining = [len(players)]
+        remaining_lock = Lock()
+
+        def player_finished():
+            with remaining_lock:
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+
+            if finished:
+                self._announce_finished()
+
+        for player in players:
+            try:
+                player.play_media(medias, on_complete=player_finished)
+            except Exception as e:
+                self.error('Unable to play media on {}: {}\n{}'.format(player, e, traceback.format_exc()))
+                player_finished()
+
+    def _figure_medias(self, queue):
         with_chime = True
         medias = []
         previous_announcement = None
@@ -162,13 +207,7 @@ class Announcer(BaseAutomation):
 
             with_chime = False
 
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = {
-                executor.submit(p.play_media, medias) for p in players
-            }
-
-            for future in concurrent.futures.as_completed(futures):
-                future.result()
+        return medias
 
     def _dequeue_all(self):
         dequeued, self._queue[:] = self._queue[:], []
@@ -0,0 +1,55 @@
+from async_configurable_automation import AsyncConfigurableAutomation, AsyncHandler
+from lib.actions import get_async_action
+from lib.constraints import get_async_constraint
+from lib.triggers import get_async_trigger
+
+
+def create_async_handler(app, handler_config):
+    do_parallel_actions = handler_config.get("do_parallel_actions", True)
+
+    constraints = []
+    constraint_configs = handler_config.get("constraints") or []
+    for constraint_config in constraint_configs:
+        constraints.append(get_async_constraint(app, constraint_config))
+
+    actions = []
+    action_configs = handler_config.get("actions", [])
+    for action_config in action_configs:
+        actions.append(get_async_action(app, action_config))
+
+    return AsyncHandler(app, constraints, actions, do_parallel_actions)
+
+
+class AsyncAutomation(AsyncConfigurableAutomation):
+    """Automation configured the same way, dispatched on the event loop."""
+
+    def initialize(self):
+        super().initialize()
+
+        # keep all template variables so they can be used in component where jinja template is initialized
+        self._variables = self.args.get("variables", {})
+
+        for trigger_config in self.cfg.value("triggers"):
+            trigger = get_async_trigger(self, trigger_config, self.trigger_handler, self.sync_trigger_handler)
+            self.debug('Registered trigger={}', trigger)
+
+        constraint_configs = self.args.get("constraints") or []
+        for constraint_config in constraint_configs:
+            self._global_constraints.append(get_async_constraint(self, constraint_config))
+
+        for handler_config in self.cfg.value("handlers"):
+            handler = create_async_handler(self, handler_config)
+            self.init_handler(handler)
+            self.debug('Registered handler={}', handler)
+
+        if self.args.get("cancel_job_when_no_match", False):
+            self.init_handler(create_async_handler(self, {
+                "constraints": [],
+                "actions": [{
+                    "platform": "cancel_job"
+                }]
+            }))
+
+    @property
+    def variables(self):
+        return self._variables
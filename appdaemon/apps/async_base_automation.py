@@ -0,0 +1,124 @@
+import asyncio
+import contextvars
+import traceback
+from contextlib import asynccontextmanager
+
+import appdaemon.utils as utils
+
+from base_automation import BaseAutomation, do_action
+from lib.actions import AsyncAction
+from lib.core.app_profiler import APP_PROFILER
+from lib.core.slow_callback_watchdog import SLOW_CALLBACK_WATCHDOG
+from lib.core.state_snapshot import StateSnapshot
+from lib.core.tracing import TRACER
+
+# each dispatch runs in its own task, so the snapshot follows the task instead of the app
+_DISPATCH_SNAPSHOT = contextvars.ContextVar('dispatch_snapshot', default=None)
+
+
+class AsyncBaseAutomation(BaseAutomation):
+    """Base class for apps whose callbacks are coroutines running on AppDaemon's event loop.
+
+    get_state, get_states, call_service and do_actions return awaitables when called from the loop, so a dispatch
+    reads state and calls services without a round-trip through a worker thread. Called from a worker thread they
+    block and return the result like the BaseAutomation ones do, which keeps sync components usable.
+    """
+
+    @asynccontextmanager
+    async def async_state_snapshot(self):
+        """state_snapshot for a dispatch running on the loop, nested calls reuse the outer snapshot."""
+        snapshot = _DISPATCH_SNAPSHOT.get()
+        if snapshot is not None:
+            yield snapshot
+            return
+
+        # AppDaemon starts async state callbacks before the state mirror's callback for the same state change, yield
+        # once so the mirror has it before the dispatch reads
+        await asyncio.sleep(0)
+
+        snapshot = StateSnapshot()
+        token = _DISPATCH_SNAPSHOT.set(snapshot)
+        try:
+            yield snapshot
+        finally:
+            _DISPATCH_SNAPSHOT.reset(token)
+            snapshot.close()
+            self.debug('Dispatch finished with {}', snapshot)
+
+    @utils.sync_wrapper
+    async def get_state(self, entity=None, **kwargs):
+        # attaching blocks on AppDaemon, leave it to the first read from a worker thread
+        mirror = self._state_mirror(kwargs, attach=False)
+        if mirror is not None:
+            return mirror.get_state(entity, **kwargs)
+
+        snapshot = _DISPATCH_SNAPSHOT.get()
+        if snapshot is None or entity is None:
+            return await self._get_state(entity, **kwargs)
+
+        return await snapshot.get_async(self._get_state, entity, kwargs)
+
+    @utils.sync_wrapper
+    async def get_states(self, entity_ids, attribute=None):
+        kwargs = {} if attribute is None else {'attribute': attribute}
+        states = await asyncio.gather(*[self.get_state(entity_id, **kwargs) for entity_id in entity_ids])
+        return dict(zip(entity_ids, states))
+
+    def _invalidate_state_snapshot(self, entity_ids):
+        snapshot = _DISPATCH_SNAPSHOT.get()
+        if snapshot is not None and entity_ids:
+            snapshot.invalidate(entity_ids)
+
+        super()._invalidate_state_snapshot(entity_ids)
+
+    @utils.sync_wrapper
+    async def do_actions(self, actions, trigger_info=None, do_parallel_actions=True):
+        if len(actions) == 0:
+            return
+
+        if len(actions) == 1 or not do_parallel_actions:
+            self.debug('About to do action(s) in sequential order')
+            for action in actions:
+                await do_async_action(action, trigger_info)
+        else:
+            self.debug('About to do action(s) concurrently')
+            await asyncio.gather(*[do_async_action(action, trigger_info) for action in actions])
+
+        self.debug('All action(s) are performed')
+
+    async def async_sleep(self, duration):
+        """sleep for coroutines, waits on the loop instead of blocking a worker thread. sleep stays the blocking one
+        that sync components call."""
+        self.debug('About to sleep for {} sec', duration)
+        await asyncio.sleep(duration)
+
+
+async def do_async_action(action, trigger_info):
+    """do_action for the loop, sync actions are handed to AppDaemon's executor since they block on state reads."""
+    if not isinstance(action, AsyncAction):
+        return await action.app.run_in_executor(do_action, action, trigger_info)
+
+    # traced, watched and profiled like do_action, the watch and profile are of the loop thread while it runs, what
+    # other tasks run in between its awaits is part of them
+    name = type(action).__name__
+    with TRACER.span(action.app, name, 'action'), SLOW_CALLBACK_WATCHDOG.watch(action.app, name, trigger_info), \
+            APP_PROFILER.profiling(action.app):
+        return await _do_async_action(action, trigger_info)
+
+
+async def _do_async_action(action, trigger_info):
+    if not await action.check_action_constraints(trigger_info):
+        return
+
+    action.debug('About to do action: {}', action)
+    try:
+        action.cfg.trigger_info = trigger_info
+        return await action.do_action(trigger_info)
+    except Exception as e:
+        action.error('Error when running actions concurrently: {}, action={}, trigger_info={}\n{}'.format(
+            e,
+            action,
+            trigger_info,
+            traceback.format_exc()))
+
+    action.cfg.trigger_info = None
@@ -0,0 +1,68 @@
+import asyncio
+import traceback
+
+from async_base_automation import AsyncBaseAutomation
+from configurable_automation import ConfigurableAutomation, Handler
+from lib.actions import get_async_action
+from lib.constraints import get_async_constraint
+from lib.triggers import get_async_trigger
+
+
+class AsyncConfigurableAutomation(AsyncBaseAutomation, ConfigurableAutomation):
+    """ConfigurableAutomation whose dispatch runs on AppDaemon's event loop: constraints are awaited, state is read
+    without a worker thread and actions are fanned out with asyncio.gather."""
+
+    def init_trigger(self, platform, config):
+        config['platform'] = platform
+        get_async_trigger(self, config, self.trigger_handler, self.sync_trigger_handler)
+
+    def create_constraint(self, platform, config):
+        config['platform'] = platform
+        return get_async_constraint(self, config)
+
+    def create_action(self, platform, config):
+        config['platform'] = platform
+        return get_async_action(self, config)
+
+    def create_handler(self, constraints, actions, do_parallel_actions=True):
+        return AsyncHandler(self, constraints, actions, do_parallel_actions=do_parallel_actions)
+
+    def sync_trigger_handler(self, trigger_info):
+        # triggers without an async version fire on a worker thread, the dispatch is handed over without waiting
+        asyncio.run_coroutine_threadsafe(self.trigger_handler(trigger_info), self.AD.loop)
+
+    async def trigger_handler(self, trigger_info):
+        self.debug('Triggered with trigger_info={}', trigger_info)
+
+        async with self.async_state_snapshot():
+            try:
+                for constraint in self._global_constraints:
+                    if not await constraint.check(trigger_info):
+                        return
+
+                for handler in self.candidate_handlers(trigger_info):
+                    if await handler.check_constraints(trigger_info):
+                        await handler.do_actions(trigger_info)
+                        return
+            except Exception as e:
+                self.error('Error when handling trigger: ' + traceback.format_exc())
+
+
+class AsyncHandler(Handler):
+    async def check_constraints(self, trigger_info):
+        self._app.debug('Checking handler={}', self)
+        if self._constraints:
+            for constraint in self._constraints:
+                constraint.cfg.trigger_info = trigger_info
+                matched = await constraint.check(trigger_info)
+                constraint.cfg.trigger_info = None
+
+                if not matched:
+                    self._app.debug('Constraint does not match {}', constraint)
+                    return False
+
+        self._app.debug('All constraints match')
+        return True
+
+    async def do_actions(self, trigger_info):
+        await self._app.do_actions(self._actions, trigger_info, do_parallel_actions=self._do_parallel_actions)
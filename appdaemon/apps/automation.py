@@ -30,7 +30,7 @@ class Automation(ConfigurableAutomation):
         for trigger_config in self.cfg.value("triggers"):
             # Initialize a trigger based on config
             trigger = get_trigger(self, trigger_config, self.trigger_handler)
-            self.debug('Registered trigger={}'.format(trigger))
+            self.debug('Registered trigger={}', trigger)
 
         constraint_configs = self.args.get("constraints") or []
         for constraint_config in constraint_configs:
@@ -38,11 +38,11 @@ class Automation(ConfigurableAutomation):
 
         for handler_config in self.cfg.value("handlers"):
             handler = create_handler(self, handler_config)
-            self._handlers.append(handler)
-            self.debug('Registered handler={}'.format(handler))
+            self.init_handler(handler)
+            self.debug('Registered handler={}', handler)
 
         if self.args.get("cancel_job_when_no_match", False):
-            self._handlers.append(create_handler(self, {
+            self.init_handler(create_handler(self, {
                 "constraints": [],
                 "actions": [{
                     "platform": "cancel_job"
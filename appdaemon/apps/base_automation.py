@@ -1,12 +1,28 @@
-import concurrent
+import asyncio
+import functools
 import time
 import traceback
+from contextlib import contextmanager
 
 import appdaemon.plugins.hass.hassapi as hass
 import appdaemon.utils as utils
 
+from lib.core.action_executor import ACTION_EXECUTOR, DEFAULT_MAX_WORKERS_PER_APP
+from lib.core.app_profiler import APP_PROFILER
 from lib.core.config import Config
+from lib.core.constraint_cache import CONSTRAINT_CACHE
+from lib.core.entity_pattern import EntityPatternIndex, entity_pattern_regex
+from lib.core.job_journal import JOB_JOURNAL
+from lib.core.log_sink import LOG_SINK, Lazy
+from lib.core.slow_callback_watchdog import SLOW_CALLBACK_WATCHDOG
+from lib.core.state_dispatcher import STATE_DISPATCHER, StateListener, is_dispatchable
+from lib.core.state_mirror import STATE_MIRROR
+from lib.core.state_snapshot import StateSnapshot
+from lib.core.thread_occupancy import THREAD_OCCUPANCY
+from lib.core.time_table import TIME_TABLE
+from lib.core.tracing import TRACER
 from lib.helper import to_float
+from lib.schedule_job import restore_jobs
 
 LOG_LEVELS = {
     'DEBUG': 10,
@@ -15,12 +31,20 @@ LOG_LEVELS = {
     'ERROR': 40,
 }
 
+# get_state keyword arguments STATE_MIRROR can answer, anything else (e.g. namespace) goes to AppDaemon
+MIRRORED_STATE_KWARGS = {'attribute', 'default'}
+
 
 class BaseAutomation(hass.Hass):
 
     @property
     def cfg(self):
-        return Config(self, self.args)
+        config = self.__dict__.get('_cfg')
+        if config is None or config.raw_config is not self.args:
+            config = Config(self, self.args)
+            self._cfg = config
+
+        return config
 
     @property
     def log_level(self):
@@ -33,63 +57,214 @@ class BaseAutomation(hass.Hass):
     @property
     def is_sleeping_time(self):
         sleeping_time_entity_id = self.cfg.value('sleeping_time_entity_id', 'binary_sensor.sleeping_time')
-        return self.get_state(sleeping_time_entity_id) == 'on'
+        return self.state_is(sleeping_time_entity_id, 'on')
 
     @property
     def is_midnight_time(self):
         midnight_time_entity_id = self.cfg.value('midnight_time_entity_id', 'binary_sensor.midnight_time')
-        return self.get_state(midnight_time_entity_id) == 'on'
-
-    def log(self, msg, level='INFO'):
-        if LOG_LEVELS[level] < LOG_LEVELS[self.log_level]:
+        return self.state_is(midnight_time_entity_id, 'on')
+
+    def state_is(self, entity_id, state):
+        """Whether entity_id is in state, the answer is shared with every app through CONSTRAINT_CACHE until
+        entity_id changes."""
+        return CONSTRAINT_CACHE.evaluate(('state_is', entity_id, state), (entity_id,),
+                                         lambda: self.get_state(entity_id) == state)
+
+    def is_log_enabled(self, level):
+        min_level = self.__dict__.get('_min_log_level')
+        if min_level is None:
+            # log_level comes from the app config, which doesn't change while the app runs
+            min_level = self._min_log_level = LOG_LEVELS[self.log_level]
+
+        return LOG_LEVELS[level] >= min_level
+
+    def log(self, msg, *args, level='INFO'):
+        """Logs msg.format(*args), nothing is formatted when level is below the app's log_level. The record is
+        written by LOG_SINK's thread, wrap arguments that are expensive to compute in Lazy."""
+        if not self.is_log_enabled(level):
             return
 
+        # messages aren't always strings, e.g. debug(config) logs a dict
+        msg = str(msg)
+        if args:
+            try:
+                msg = msg.format(*args)
+            except (IndexError, KeyError, ValueError):
+                # literal braces in msg (e.g. a dict rendered into it), log it as is with the arguments after it
+                msg = '{} {}'.format(msg, args)
+
         if level == 'DEBUG':
-            msg = 'DEBUG - {}'.format(msg)
+            msg = 'DEBUG - ' + msg
             level = 'INFO'
 
+        if not LOG_SINK.is_running:
+            ad_config = self.__dict__.get('config') or {}
+            LOG_SINK.start(ad_config.get('log_queue_size'))
+
+        LOG_SINK.emit(self._write_log, msg, level)
+
+    def _write_log(self, msg, level):
         super().log(msg, level=level)
 
-    def debug(self, msg):
-        return self.log(msg, level='DEBUG')
+    def debug(self, msg, *args):
+        return self.log(msg, *args, level='DEBUG')
 
-    def warn(self, msg):
-        return self.log(msg, level='WARNING')
+    def warn(self, msg, *args):
+        return self.log(msg, *args, level='WARNING')
 
-    def error(self, msg):
-        return self.log(msg, level='ERROR')
+    def error(self, msg, *args):
+        return self.log(msg, *args, level='ERROR')
 
     def sleep(self, duration):
-        self.debug('About to sleep for {} sec'.format(duration))
-        time.sleep(duration)
+        """Blocks the calling worker thread, prefer after() so that waiting doesn't hold a thread."""
+        self.debug('About to sleep for {} sec', duration)
+        with THREAD_OCCUPANCY.blocking():
+            time.sleep(duration)
+
+    def after(self, seconds, fn, *args, **kwargs):
+        """Calls fn(*args, **kwargs) in seconds without holding a worker thread while waiting, returns the timer
+        handle."""
+
+        @functools.wraps(fn)
+        def continuation(_):
+            THREAD_OCCUPANCY.resumed()
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                self.error('Exception thrown in continuation {}: {}\n{}'.format(fn.__name__, e, traceback.format_exc()))
+
+        self.debug('About to call {} in {} sec', fn.__name__, seconds)
+        THREAD_OCCUPANCY.deferred(seconds)
+        return self.run_in(continuation, max(0, seconds))
+
+    def cancel_after(self, handle):
+        """Cancels a continuation scheduled with after() that hasn't run yet."""
+        self.cancel_timer(handle)
+        THREAD_OCCUPANCY.cancelled()
+
+    def now_is_between(self, start_time, end_time, name=None):
+        """Same as AppDaemon's, answered from TIME_TABLE's precomputed times of the day."""
+        return TIME_TABLE.is_between(self, start_time, end_time)
+
+    def sun_down(self):
+        return TIME_TABLE.sun_down(self)
 
     def float_state(self, entity_id):
         return to_float(self.get_state(entity_id))
 
+    @contextmanager
+    def state_snapshot(self):
+        """Serves repeated get_state calls made while handling one trigger from a snapshot, nested calls reuse the
+        outer snapshot."""
+        if self.__dict__.get('_state_snapshot') is not None:
+            yield self._state_snapshot
+            return
+
+        snapshot = StateSnapshot()
+        self._state_snapshot = snapshot
+        try:
+            yield snapshot
+        finally:
+            self._state_snapshot = None
+            snapshot.close()
+            self.debug('Dispatch finished with {}', snapshot)
+
+    def get_state(self, entity=None, **kwargs):
+        with TRACER.span(self, 'get_state', 'state', entity):
+            mirror = self._state_mirror(kwargs)
+            if mirror is not None:
+                return mirror.get_state(entity, **kwargs)
+
+            snapshot = self.__dict__.get('_state_snapshot')
+            if snapshot is None or entity is None:
+                return self._get_state(entity, **kwargs)
+
+            return snapshot.get(self._get_state, entity, kwargs)
+
+    def all_states(self):
+        """(entity_id, entity) of every entity, for scans over all of them. With the state mirror nothing is copied
+        and the entities are read-only."""
+        mirror = self._state_mirror({})
+        if mirror is not None:
+            return mirror.items()
+
+        return self.get_state().items()
+
+    def get_states(self, entity_ids, attribute=None):
+        """Returns a dict of entity_id to state (or attribute) for all entity_ids, fetched in one event loop hop."""
+        kwargs = {} if attribute is None else {'attribute': attribute}
+
+        mirror = self._state_mirror(kwargs)
+        if mirror is not None:
+            return {entity_id: mirror.get_state(entity_id, **kwargs) for entity_id in entity_ids}
+
+        snapshot = self.__dict__.get('_state_snapshot')
+        if snapshot is None:
+            return self._get_states(entity_ids, **kwargs)
+
+        return snapshot.get_many(self._get_states, entity_ids, kwargs)
+
+    def _state_mirror(self, kwargs, attach=True):
+        """Returns STATE_MIRROR when it can answer a read with kwargs, the first read attaches it when state_mirror is
+        enabled in appdaemon.yaml."""
+        if not kwargs.keys() <= MIRRORED_STATE_KWARGS:
+            return None
+
+        if STATE_MIRROR.is_live:
+            return STATE_MIRROR
+
+        ad_config = self.__dict__.get('config') or {}
+        if not attach or not ad_config.get('state_mirror'):
+            return None
+
+        if STATE_MIRROR.attach(self, self._get_state):
+            return STATE_MIRROR
+
+        return None
+
+    def _invalidate_state_snapshot(self, entity_ids):
+        snapshot = self.__dict__.get('_state_snapshot')
+        if snapshot is not None and entity_ids:
+            snapshot.invalidate(entity_ids)
+
     @utils.sync_wrapper
-    async def get_state(self, entity=None, **kwargs):
+    async def _get_state(self, entity=None, **kwargs):
         if entity is None and not 'namespace' in kwargs:
-            self.debug('About to retrieve state with entity=None\n{}'.format(''.join(traceback.format_stack())))
+            self.debug('About to retrieve state with entity=None\n{}',
+                       Lazy(lambda: ''.join(traceback.format_stack())))
 
         state = await super().get_state(entity, **kwargs)
 
         if entity is not None and not 'namespace' in kwargs:
-            self.debug('Retrieved state, entity_id={} state={}'.format(entity, state))
+            self.debug('Retrieved state, entity_id={} state={}', entity, state)
 
         return state
 
+    @utils.sync_wrapper
+    async def _get_states(self, entity_ids, **kwargs):
+        states = {}
+        for entity_id in entity_ids:
+            states[entity_id] = await super().get_state(entity_id, **kwargs)
+
+        self.debug('Retrieved states, states={}', states)
+
+        return states
+
     def set_state(self, entity_id, **kwargs):
-        self.log('Updated {} state: kwargs{}'.format(entity_id, kwargs))
+        self.log('Updated {} state: kwargs{}', entity_id, kwargs)
+        self._invalidate_state_snapshot(entity_id)
         super().set_state(entity_id, **kwargs)
 
     @utils.sync_wrapper
     async def call_service(self, service, **kwargs):
-        self.log('Calling {} with {}'.format(service, kwargs))
-        return await super().call_service(service, **kwargs)
+        self.log('Calling {} with {}', service, kwargs)
+        self._invalidate_state_snapshot(kwargs.get('entity_id'))
+        with TRACER.span(self, 'call_service', 'service', service):
+            return await super().call_service(service, **kwargs)
 
     def select_option(self, entity_id, option, **kwargs):
         if self.get_state(entity_id) == option:
-            self.debug('{} already in {}, skipping ...'.format(entity_id, option))
+            self.debug('{} already in {}, skipping ...', entity_id, option)
             return
 
         options = self.get_state(entity_id, attribute='options')
@@ -97,9 +272,58 @@ class BaseAutomation(hass.Hass):
             self.error('{} is not a valid option in {} ({})'.format(option, entity_id, options))
             return
 
-        self.log('Selecting {} in {}'.format(option, entity_id))
+        self.log('Selecting {} in {}', option, entity_id)
         super().select_option(entity_id, option, **kwargs)
 
+    def listen_state(self, callback, entity=None, **kwargs):
+        """Registers with STATE_DISPATCHER when the state mirror is on, registrations using options only AppDaemon
+        implements (duration, immediate, constraints ...) stay with AppDaemon."""
+        if not is_dispatchable(kwargs) or self._state_mirror({}) is None:
+            return super().listen_state(callback, entity, **kwargs)
+
+        return STATE_DISPATCHER.listen(self, callback, entity, **kwargs)
+
+    def listen_state_pattern(self, callback, patterns, **kwargs):
+        """listen_state for every entity matching one of patterns (globs, or regexes starting with ^), entities
+        showing up later included. Without the state mirror it's a listen_state for all entities filtered by the
+        patterns."""
+        if is_dispatchable(kwargs) and self._state_mirror({}) is not None:
+            return STATE_DISPATCHER.listen_pattern(self, callback, patterns, **kwargs)
+
+        index = EntityPatternIndex()
+        for pattern in patterns:
+            index.add(entity_pattern_regex(pattern), callback)
+
+        if asyncio.iscoroutinefunction(callback):
+            @functools.wraps(callback)
+            async def matched_callback(entity, attribute, old, new, kwargs):
+                if index.matching(entity):
+                    await callback(entity, attribute, old, new, kwargs)
+        else:
+            @functools.wraps(callback)
+            def matched_callback(entity, attribute, old, new, kwargs):
+                if index.matching(entity):
+                    callback(entity, attribute, old, new, kwargs)
+
+        return super().listen_state(matched_callback, None, **kwargs)
+
+    def cancel_listen_state(self, handle):
+        if isinstance(handle, StateListener):
+            STATE_DISPATCHER.cancel(handle)
+            return
+
+        super().cancel_listen_state(handle)
+
+    def terminate(self):
+        APP_PROFILER.detach(self)
+        STATE_DISPATCHER.cancel_app(self)
+
+        if STATE_MIRROR.detach(self):
+            # the subscription goes away with this app, other apps' registrations need a new one
+            successors = [listener.app for listener in STATE_DISPATCHER.listeners()]
+            if successors:
+                successors[0]._state_mirror({})
+
     def cancel_timer(self, handle):
         try:
             super().cancel_timer(handle)
@@ -117,19 +341,41 @@ class BaseAutomation(hass.Hass):
             return
 
         self.debug('About to do action(s) in parallel')
-        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-            futures = {executor.submit(do_action, action, trigger_info): action for action in actions}
-            for future in concurrent.futures.as_completed(futures):
-                future.result()
+        ACTION_EXECUTOR.run_all(self.name, do_action, actions, trigger_info,
+                                max_workers_per_app=self.cfg.int('max_parallel_actions', DEFAULT_MAX_WORKERS_PER_APP))
+
+        self.debug('All action(s) are performed')
+
+    def configure_action_executor(self):
+        """Sizes the pool do_actions runs parallel actions on, once when the app initializes."""
+        # process-wide setting, lives next to threadpool_workers in appdaemon.yaml
+        ad_config = self.__dict__.get('config') or {}
+        ACTION_EXECUTOR.configure(ad_config.get('action_executor_workers'))
+
+    def restore_scheduled_jobs(self):
+        """Re-arms jobs this app had pending before a restart and journals the ones it schedules from now on,
+        only when job_journal_path is set in appdaemon.yaml."""
+        ad_config = self.__dict__.get('config') or {}
+        journal_path = ad_config.get('job_journal_path')
+        if not journal_path:
+            return
 
-            self.debug('All action(s) are performed')
+        JOB_JOURNAL.open(journal_path)
+        restore_jobs(self)
 
 
 def do_action(action, trigger_info):
+    name = type(action).__name__
+    with TRACER.span(action.app, name, 'action'), SLOW_CALLBACK_WATCHDOG.watch(action.app, name, trigger_info), \
+            APP_PROFILER.profiling(action.app):
+        return _do_action(action, trigger_info)
+
+
+def _do_action(action, trigger_info):
     if not action.check_action_constraints(trigger_info):
         return
 
-    action.debug('About to do action: {}'.format(action))
+    action.debug('About to do action: {}', action)
     try:
         action.cfg.trigger_info = trigger_info
         return action.do_action(trigger_info)
@@ -193,8 +193,7 @@ class FanMonitor(Monitor):
     def _update_oscillating(self, oscillating):
         current_oscillating = self.get_state(self.fan_entity_id, attribute='oscillating')
         if current_oscillating != oscillating:
-            self.app.sleep(2)
-            self.call_service('fan/oscillate', **{
+            self.app.after(2, self.call_service, 'fan/oscillate', **{
                 'entity_id': self.fan_entity_id,
                 'oscillating': oscillating,
             })
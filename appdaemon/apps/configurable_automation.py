@@ -1,10 +1,12 @@
-import concurrent
-
 import traceback
 
-from base_automation import BaseAutomation, do_action
+from base_automation import BaseAutomation
 from lib.actions import get_action
 from lib.constraints import get_constraint
+from lib.core.dispatch_index import DispatchIndex
+from lib.core.tracing import TRACER
+from lib.template_renderer import TEMPLATE_CACHE
+from lib.template_result_cache import TemplateResultCache, DEFAULT_TTL
 from lib.triggers import get_trigger
 
 
@@ -12,6 +14,14 @@ class ConfigurableAutomation(BaseAutomation):
     def initialize(self):
         self._global_constraints = []
         self._handlers = []
+        self._handler_index = None
+
+        if self.cfg.value('cache_templates', True):
+            self._template_results = TemplateResultCache(self, TEMPLATE_CACHE,
+                                                         ttl=self.cfg.int('template_cache_ttl', DEFAULT_TTL))
+
+        self.configure_action_executor()
+        self.restore_scheduled_jobs()
 
     def init_trigger(self, platform, config):
         config['platform'] = platform
@@ -29,26 +39,48 @@ class ConfigurableAutomation(BaseAutomation):
         config['platform'] = platform
         return get_action(self, config)
 
+    def template_dependencies(self):
+        """Lists every cached template of this app with the entities it depends on, for debugging."""
+        results = self.__dict__.get('_template_results')
+        if results is None:
+            return {}
+
+        return results.dependencies()
+
     def init_handler(self, handler):
         self._handlers.append(handler)
+        self._handler_index = None
 
     def create_handler(self, constraints, actions, do_parallel_actions=True):
         return Handler(self, constraints, actions, do_parallel_actions=do_parallel_actions)
 
     def trigger_handler(self, trigger_info):
-        self.debug('Triggered with trigger_info={}'.format(trigger_info))
-
-        try:
-            for constraint in self._global_constraints:
-                if not constraint.check(trigger_info):
-                    return
-
-            for handler in self._handlers:
-                if handler.check_constraints(trigger_info):
-                    handler.do_actions(trigger_info)
-                    return
-        except Exception as e:
-            self.error('Error when handling trigger: ' + traceback.format_exc())
+        self.debug('Triggered with trigger_info={}', trigger_info)
+
+        with self.state_snapshot():
+            try:
+                for constraint in self._global_constraints:
+                    with TRACER.span(self, type(constraint).__name__, 'constraint'):
+                        if not constraint.check(trigger_info):
+                            return
+
+                for handler in self.candidate_handlers(trigger_info):
+                    if handler.check_constraints(trigger_info):
+                        handler.do_actions(trigger_info)
+                        return
+            except Exception as e:
+                self.error('Error when handling trigger: ' + traceback.format_exc())
+
+    def candidate_handlers(self, trigger_info):
+        """Handlers that could match trigger_info, in registration order, so first-match semantics are unchanged."""
+        index = self.__dict__.get('_handler_index')
+        if index is None or len(index) != len(self._handlers):
+            # subclasses register their handlers after initialize(), index them on the first trigger instead
+            index = DispatchIndex(self._handlers)
+            self._handler_index = index
+            self.debug('Built handler index={}', index)
+
+        return index.candidates(trigger_info)
 
 
 class Handler:
@@ -59,37 +91,42 @@ class Handler:
         self._actions = actions
 
     def check_constraints(self, trigger_info):
-        self._app.debug('Checking handler={}'.format(self))
+        with TRACER.span(self._app, 'check_constraints', 'handler'):
+            return self._check_constraints(trigger_info)
+
+    def _check_constraints(self, trigger_info):
+        self._app.debug('Checking handler={}', self)
         if self._constraints:
             for constraint in self._constraints:
                 constraint.cfg.trigger_info = trigger_info
-                matched = constraint.check(trigger_info)
+                with TRACER.span(self._app, type(constraint).__name__, 'constraint'):
+                    matched = constraint.check(trigger_info)
                 constraint.cfg.trigger_info = None
 
                 if not matched:
-                    self._app.debug('Constraint does not match {}'.format(constraint))
+                    self._app.debug('Constraint does not match {}', constraint)
                     return False
 
         self._app.debug('All constraints match')
         return True
 
+    def dispatch_filter(self):
+        trigger_filter = None
+        for constraint in self._constraints or []:
+            constraint_filter = constraint.dispatch_filter()
+            if constraint_filter is None:
+                break
+
+            merged = constraint_filter if trigger_filter is None else trigger_filter.merge(constraint_filter)
+            if merged is None:
+                break
+
+            trigger_filter = merged
+
+        return trigger_filter
+
     def do_actions(self, trigger_info):
-        if len(self._actions) == 0:
-            return
-
-        if len(self._actions) == 1 or not self._do_parallel_actions:
-            self._app.debug('About to do action(s) in sequential order')
-            for action in self._actions:
-                do_action(action, trigger_info)
-            return
-
-        self._app.debug('About to do action(s) in parallel')
-        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-            futures = {executor.submit(do_action, action, trigger_info): action for action in self._actions}
-            for future in concurrent.futures.as_completed(futures):
-                future.result()
-
-            self._app.debug('All action(s) are performed')
+        self._app.do_actions(self._actions, trigger_info, do_parallel_actions=self._do_parallel_actions)
 
     def __repr__(self):
         return "{}(constraints={}, actions={}, do_parallel_actions={})".format(
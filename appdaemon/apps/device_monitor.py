@@ -125,7 +125,7 @@ class EntityNameFilteringChecker(Checker):
 
         device_results = []
         checked_entity_ids = []
-        all_entities = self.app.get_state().items()
+        all_entities = self.app.all_states()
 
         for pattern_config in self._patterns:
             (pattern, config) = self._extract_config(pattern_config)
@@ -14,8 +14,8 @@ class DeviceOnCounter(BaseAutomation):
     def _state_change_handler(self, entity, attribute, old, new, kwargs):
         count = 0
 
-        for device_entity_id in self.device_entity_ids:
-            if self.get_state(device_entity_id) == self.device_on_state:
+        for state in self.get_states(self.device_entity_ids).values():
+            if state == self.device_on_state:
                 count = count + 1
 
         self.call_service('input_number/set_value',
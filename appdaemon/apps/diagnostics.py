@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+
+from base_automation import BaseAutomation
+from lib.core.action_executor import ACTION_EXECUTOR
+from lib.core.app_profiler import APP_PROFILER
+from lib.core.callback_latency import CALLBACK_LATENCIES
+from lib.core.constraint_cache import CONSTRAINT_CACHE
+from lib.core.job_journal import JOB_JOURNAL
+from lib.core.log_sink import LOG_SINK
+from lib.core.monitored_callback import monitored_callback
+from lib.core.slow_callback_watchdog import SLOW_CALLBACK_WATCHDOG
+from lib.core.state_dispatcher import STATE_DISPATCHER
+from lib.core.state_mirror import STATE_MIRROR
+from lib.core.state_snapshot import snapshot_stats
+from lib.core.thread_occupancy import THREAD_OCCUPANCY
+from lib.core.time_table import TIME_TABLE
+from lib.core.tracing import TRACER
+from lib.template_renderer import TEMPLATE_CACHE
+
+# name in the response -> function returning the stats of a process-wide component
+STATS_SOURCES = {
+    'constraint_cache': CONSTRAINT_CACHE.stats,
+    'state_mirror': STATE_MIRROR.stats,
+    'state_dispatcher': STATE_DISPATCHER.stats,
+    'state_snapshot': snapshot_stats,
+    'thread_occupancy': THREAD_OCCUPANCY.stats,
+    'action_executor': ACTION_EXECUTOR.stats,
+    'job_journal': JOB_JOURNAL.stats,
+    'template_cache': TEMPLATE_CACHE.stats,
+    'time_table': TIME_TABLE.stats,
+    'callback_latency': CALLBACK_LATENCIES.stats,
+    'log_sink': LOG_SINK.stats,
+    'tracing': TRACER.stats,
+    'slow_callback_watchdog': SLOW_CALLBACK_WATCHDOG.stats,
+    'app_profiler': APP_PROFILER.stats,
+}
+
+
+class Diagnostics(BaseAutomation):
+    """Serves the stats of the components shared by every app as JSON at POST /api/appdaemon/<endpoint>, needs
+    AppDaemon's http and api to be configured in appdaemon.yaml.
+
+    With latency_sensor_entity_id set, the slowest monitored callbacks are also published as that sensor every
+    latency_sensor_interval seconds.
+
+    The dispatch spans recorded when trace_buffer_size is set in appdaemon.yaml are served as Chrome trace-event JSON
+    at POST /api/appdaemon/<trace_endpoint>, optionally limited to {"apps": [...]}. Firing trace_event (with the
+    same optional apps) writes them to a file in trace_dump_dir instead.
+    """
+
+    def initialize(self):
+        self.register_endpoint(self._endpoint_handler, self.cfg.value('endpoint', 'diagnostics'))
+        self.register_endpoint(self._trace_endpoint_handler, self.cfg.value('trace_endpoint', 'trace'))
+
+        self.trace_dump_dir = self.cfg.value('trace_dump_dir')
+        if self.trace_dump_dir:
+            self.listen_event(self._trace_event_handler, self.cfg.value('trace_event', 'appdaemon_dump_trace'))
+
+        self.latency_sensor_entity_id = self.cfg.value('latency_sensor_entity_id')
+        if self.latency_sensor_entity_id:
+            now = datetime.now() + timedelta(seconds=5)
+            self.run_every(self._latency_sensor_handler, now, self.cfg.int('latency_sensor_interval', 60))
+
+    def _endpoint_handler(self, data):
+        sections = data.get('sections') if isinstance(data, dict) else None
+        return self.collect_stats(sections), 200
+
+    def _trace_endpoint_handler(self, data):
+        app_names = data.get('apps') if isinstance(data, dict) else None
+        return TRACER.chrome_trace(app_names), 200
+
+    @monitored_callback
+    def _trace_event_handler(self, event_name, data, kwargs):
+        path = TRACER.dump(self.trace_dump_dir, data.get('apps'))
+        self.log('Dumped dispatch trace to {}', path)
+
+    def collect_stats(self, sections=None):
+        stats = {}
+        for name, source in STATS_SOURCES.items():
+            if sections and name not in sections:
+                continue
+
+            try:
+                stats[name] = source()
+            except Exception as e:
+                stats[name] = {'error': repr(e)}
+
+        return stats
+
+    @monitored_callback
+    def _latency_sensor_handler(self, kwargs):
+        slowest = CALLBACK_LATENCIES.slowest(self.cfg.int('latency_sensor_callbacks', 10))
+        callbacks = {
+            name: {key: summary[key] for key in ['count', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms']}
+            for name, summary in slowest
+        }
+
+        self.set_state(self.latency_sensor_entity_id,
+                       state=slowest[0][1]['p95_ms'] if slowest else 0,
+                       attributes={
+                           'friendly_name': 'Slowest Callbacks',
+                           'unit_of_measurement': 'ms',
+                           'callbacks': callbacks,
+                       })
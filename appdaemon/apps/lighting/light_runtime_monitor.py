@@ -1,7 +1,7 @@
-import re
 from datetime import datetime, timedelta
 
 from base_automation import BaseAutomation
+from lib.core.entity_pattern import EntityPatternIndex
 from lib.core.monitored_callback import monitored_callback
 from lib.helper import to_datetime
 
@@ -10,29 +10,26 @@ class LightRuntimeMonitor(BaseAutomation):
     def initialize(self):
         self._thresholds = self.cfg.value('thresholds')
 
+        # threshold entity_ids are regexes, the first matching threshold applies to an entity
+        self._threshold_index = EntityPatternIndex()
+        for config in self._thresholds:
+            self._threshold_index.add(config['entity_id'], config)
+
         now = datetime.now() + timedelta(seconds=2)
         self.run_every(self._run_every_handler, now, self.cfg.value('check_frequency'))
 
     @monitored_callback
     def _run_every_handler(self, time=None, **kwargs):
-        checked_entities = []
-
-        for entity_id, entity in self.get_state().items():
+        for entity_id, entity in self.all_states():
             if entity is None:
                 continue
 
-            for config in self._thresholds:
-                if re.match(config['entity_id'], entity_id):
-                    if entity_id in checked_entities:
-                        continue
-
-                    checked_entities.append(entity_id)
-
-                    if config.get('ignore', False):
-                        continue
+            configs = self._threshold_index.matching(entity_id)
+            if not configs or configs[0].get('ignore', False):
+                continue
 
-                    if self.runtime_exceeds_threshold(config, entity):
-                        self.turn_off(entity_id)
+            if self.runtime_exceeds_threshold(configs[0], entity):
+                self.turn_off(entity_id)
 
     def runtime_exceeds_threshold(self, config, entity):
         runtime = get_entity_runtime(entity)
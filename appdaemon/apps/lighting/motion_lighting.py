@@ -5,11 +5,14 @@ from lib.actions import TurnOnAction, get_action, TurnOffAction
 from lib.actions import figure_light_settings
 from lib.constraints import get_constraint, Constraint
 from lib.core.monitored_callback import monitored_callback
+from lib.core.time_table import TimeWindows
+from lib.schedule_job import schedule_job, cancel_job
 from lib.triggers import TriggerInfo
 
 DEFAULT_SCENE = 'Default'
 TURN_ON_TRIGGER_STATES = ['on', 'unlocked']
 PATHWAY_LIGHT_TRIGGER_ENTITY_ID = "pathway_light_trigger_entity_id"
+TURN_OFF_LIGHTS_JOB_KEY = "turn_off_lights"
 
 
 def light_settings_to_entity_ids(settings):
@@ -37,6 +40,7 @@ class MotionLighting(BaseAutomation):
     enabler_entity_id: str
     scene_entity_id: str
     lighting_scenes: Dict[str, Any]
+    time_based_scenes: TimeWindows
     turn_off_delay: int
     dim_light_before_turn_off: bool
     turn_on_constraints: List[Constraint]
@@ -49,6 +53,7 @@ class MotionLighting(BaseAutomation):
         self.enabler_entity_id = self.cfg.value('enabler_entity_id')
         self.scene_entity_id = self.cfg.value('scene_entity_id')
         self.lighting_scenes = self.cfg.value('lighting_scenes')
+        self.time_based_scenes = self._time_based_scenes()
         self.turn_off_delay = self.cfg.value('turn_off_delay')
         self.dim_light_before_turn_off = self.cfg.value('dim_light_before_turn_off', True)
 
@@ -61,7 +66,6 @@ class MotionLighting(BaseAutomation):
 
         light_entity_ids = light_settings_to_entity_ids(self.lighting_scenes)
         self.turn_off_light_entity_ids = self.cfg.list('turn_off_light_entity_ids', light_entity_ids)
-        self.turn_off_lights_handle = None
 
         if self.is_enabled:
             self._register_motion_state_change_event()
@@ -69,6 +73,9 @@ class MotionLighting(BaseAutomation):
         if self.enabler_entity_id:
             self.listen_state(self._enabler_state_change_handler, self.enabler_entity_id)
 
+        self.configure_action_executor()
+        self.restore_scheduled_jobs()
+
     @property
     def is_enabled(self):
         return self.enabler_entity_id is None or self.get_state(self.enabler_entity_id) == 'on'
@@ -103,10 +110,11 @@ class MotionLighting(BaseAutomation):
             "to": new,
         })
 
-        if self._should_turn_on_lights(trigger_info):
-            self._turn_on_lights()
-        elif self._should_turn_off_lights(trigger_info):
-            self._turn_off_lights(trigger_info)
+        with self.state_snapshot():
+            if self._should_turn_on_lights(trigger_info):
+                self._turn_on_lights()
+            elif self._should_turn_off_lights(trigger_info):
+                self._turn_off_lights(trigger_info)
 
     def _should_turn_on_lights(self, trigger_info):
         if not self.is_enabled:
@@ -131,8 +139,8 @@ class MotionLighting(BaseAutomation):
         if len(self.motion_entity_ids) == 1:
             return motion_state not in TURN_ON_TRIGGER_STATES
 
-        for motion_entity_id in self.motion_entity_ids:
-            if self.get_state(motion_entity_id) in TURN_ON_TRIGGER_STATES:
+        for motion_state in self.get_states(self.motion_entity_ids).values():
+            if motion_state in TURN_ON_TRIGGER_STATES:
                 return False
 
         return True
@@ -145,7 +153,8 @@ class MotionLighting(BaseAutomation):
         actions = [TurnOnAction(self, {'entity_ids': [light_setting]}) for light_setting in light_settings]
         self.do_actions(actions)
 
-    def _figure_light_settings(self):
+    def _time_based_scenes(self):
+        windows = []
         for scene, light_settings in self.lighting_scenes.items():
             if not scene.startswith('sun') and not scene[0].isdigit():
                 continue
@@ -160,19 +169,21 @@ class MotionLighting(BaseAutomation):
                 self.debug('Skipping time based scene, missing start={} or end={}'.format(start, end))
                 continue
 
-            if not self.now_is_between(start, end):
-                self.debug('Skipping time based scene, now is not between start={} and end={}'.format(start, end))
-                continue
+            windows.append((start, end, (period, scene, light_settings)))
 
-            current_scene = DEFAULT_SCENE if self.scene_entity_id is None else self.get_state(self.scene_entity_id)
-            if scene is not None and current_scene != scene:
+        return TimeWindows(windows)
+
+    def _figure_light_settings(self):
+        current_scene = DEFAULT_SCENE if self.scene_entity_id is None else self.get_state(self.scene_entity_id)
+        for period, scene, light_settings in self.time_based_scenes.active(self):
+            if current_scene != scene:
                 self.debug('Skipping time based scene, scene={} does not match current={}'.format(scene, current_scene))
                 continue
 
             self.debug('Using time based scene, period={} light_settings={}'.format(period, scene, light_settings))
             return light_settings
 
-        scene = DEFAULT_SCENE if self.scene_entity_id is None else self.get_state(self.scene_entity_id)
+        scene = current_scene
         if scene not in self.lighting_scenes:
             scene = DEFAULT_SCENE
         light_settings = self.lighting_scenes.get(scene)
@@ -188,13 +199,10 @@ class MotionLighting(BaseAutomation):
             return
 
         self.debug('About to turn lights off in {} second'.format(turn_off_delay))
-        self.turn_off_lights_handle = self.run_in(self._turn_off_lights_handler, turn_off_delay)
+        schedule_job(self, self._turn_off_lights_handler, turn_off_delay, job_key=TURN_OFF_LIGHTS_JOB_KEY)
 
     def _cancel_turn_off_delay(self):
-        if self.turn_off_lights_handle is not None:
-            self.cancel_timer(self.turn_off_lights_handle)
-            self.turn_off_lights_handle = None
-            self.debug('Cancelled turn off delay timer')
+        cancel_job(self, job_key=TURN_OFF_LIGHTS_JOB_KEY)
 
     def _turn_off_lights_handler(self, kwargs={}):
         actions = [TurnOffAction(self, {
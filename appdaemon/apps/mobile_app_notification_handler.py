@@ -66,7 +66,7 @@ class TelusAlarmHandler(Handler):
             self.log('Alarm state is already {}, skipping title={}, text={}'.format(current_alarm_state, title, text))
             return
 
-        alarm_attributes = current_alarm.get('attributes', {})
+        alarm_attributes = dict(current_alarm.get('attributes', {}))
         alarm_attributes['changed_by'] = 'Telus SmartHome'
 
         # setting state before calling service to alarm_state_change_events to filter by changed_by attribute
@@ -47,6 +47,8 @@ class NoiseLevelMonitor(BaseAutomation):
     def initialize(self):
         self.sleeping_time_entity_id = self.cfg.value('sleeping_time_entity_id')
         self.is_monitoring = False
+        # pending ffmpeg start or stop continuation of each noise sensor, a new one replaces it
+        self._sensor_continuations = {}
 
         monitor_configs = self.cfg.list('monitor_settings', [])
         self.monitor_settings = []
@@ -126,17 +128,24 @@ class NoiseLevelMonitor(BaseAutomation):
         return False
 
     def start_monitor(self):
-        just_started = False
-
         for setting in self.monitor_settings:
             if self.get_state(setting.noise_entity_id) == 'unavailable':
                 self.call_service('ffmpeg/restart', entity_id=setting.noise_entity_id)
-                self.sleep(10)
-                self.call_service('ffmpeg/start', entity_id=setting.noise_entity_id)
+                self._continue_sensor(setting, self._start_noise_sensor)
+
+    def _continue_sensor(self, setting, fn):
+        pending = self._sensor_continuations.pop(setting.noise_entity_id, None)
+        if pending is not None:
+            # a stop right after a start (or the other way round) must not be undone by the earlier continuation
+            self.cancel_after(pending)
+
+        self._sensor_continuations[setting.noise_entity_id] = self.after(10, fn, setting)
 
-                just_started = True
+    def _start_noise_sensor(self, setting):
+        self._sensor_continuations.pop(setting.noise_entity_id, None)
+        self.call_service('ffmpeg/start', entity_id=setting.noise_entity_id)
 
-        if just_started and not self.is_monitoring:
+        if not self.is_monitoring:
             self.enable_monitor(True)
 
     def stop_monitor(self):
@@ -145,9 +154,12 @@ class NoiseLevelMonitor(BaseAutomation):
                 self.enable_monitor(False)
 
                 self.call_service('ffmpeg/restart', entity_id=setting.noise_entity_id)
-                self.sleep(10)
-                self.call_service('ffmpeg/stop', entity_id=setting.noise_entity_id)
-                self.set_state(setting.noise_entity_id, state='off')
+                self._continue_sensor(setting, self._stop_noise_sensor)
+
+    def _stop_noise_sensor(self, setting):
+        self._sensor_continuations.pop(setting.noise_entity_id, None)
+        self.call_service('ffmpeg/stop', entity_id=setting.noise_entity_id)
+        self.set_state(setting.noise_entity_id, state='off')
 
     def enable_monitor(self, enable):
         self.is_monitoring = enable
@@ -176,8 +188,10 @@ def handle_noise_detected(app, light_setting, light_data):
         'flash': 'long',
     })
 
-    app.sleep(3)
+    app.after(3, _restore_delegate_light, app, light_setting, original)
+
 
+def _restore_delegate_light(app, light_setting, original):
     if original['state'] == 'on':
         app.turn_on(light_setting.delegate_light_entity_id, **{
             'rgb_color': original['attributes']['rgb_color'],
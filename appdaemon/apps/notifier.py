@@ -87,8 +87,8 @@ class Messenger:
     def call_service(self, service, **kwargs):
         self.app.call_service(service, **kwargs)
 
-    def log(self, msg, level='INFO'):
-        return self.app.log(msg, level)
+    def log(self, msg, *args, level='INFO'):
+        return self.app.log(msg, *args, level=level)
 
     def send(self, message: Message):
         raise NotImplementedError()
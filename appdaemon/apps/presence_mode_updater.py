@@ -56,8 +56,10 @@ class UpdateAction(Action):
         away_people = []
         arriving_people = []
 
+        person_statuses = self.get_states(self.person_entity_ids)
+
         for person_entity_id in self.person_entity_ids:
-            person_status = self.get_state(person_entity_id)
+            person_status = person_statuses.get(person_entity_id)
 
             if person_status in HOME_PERSON_STATUSES:
                 home_people.append(person_entity_id)
@@ -1,10 +1,10 @@
-import time
+import traceback
 from threading import Lock
 
 import appdaemon.plugins.mqtt.mqttapi as mqtt
 from teslajson import Connection
 
-from base_automation import BaseAutomation, LOG_LEVELS
+from base_automation import BaseAutomation
 from lib.core.component import Component
 from lib.core.monitored_callback import monitored_callback
 from lib.helper import to_int
@@ -88,13 +88,16 @@ class TeslaProxy(mqtt.Mqtt, BaseAutomation):
             self.log('Nothing in the queue, skipping ...')
             return
 
-        if self._lock.locked():
-            self.log('Unable to acquire lock, rescheduling ...')
+        # commands wait for the vehicle to wake up without holding a thread, whoever holds the lock processes
+        # everything queued in the meantime
+        if not self._lock.acquire(blocking=False):
+            self.log('Already processing, command is queued ...')
+            return
 
-        self._lock.acquire()
-        try:
-            last_command = None
-            last_result = None
+        self._process_next(None, None)
+
+    def _process_next(self, last_command, last_result):
+        while True:
             while self._queue:
                 command = self._queue.pop(0)
 
@@ -105,23 +108,23 @@ class TeslaProxy(mqtt.Mqtt, BaseAutomation):
                         last_result))
                     continue
 
-                result = command.execute()
-                self.debug('Executed command={}, result={}'.format(command, result))
+                try:
+                    command.execute(lambda result, command=command: self._command_executed(command, result))
+                    return
+                except Exception as e:
+                    self.error('Error when executing command={}: {}\n{}'.format(command, e, traceback.format_exc()))
+                    last_command = command
+                    last_result = False
 
-                last_command = command
-                last_result = result
-        finally:
             self._lock.release()
 
-    def log(self, msg, level='INFO'):
-        if LOG_LEVELS[level] < LOG_LEVELS[self.log_level]:
-            return
-
-        if level == 'DEBUG':
-            msg = 'DEBUG - {}'.format(msg)
-            level = 'INFO'
+            # a command queued right before the lock was released would otherwise wait for the next one
+            if not self._queue or not self._lock.acquire(blocking=False):
+                return
 
-        super().log(msg, level=level)
+    def _command_executed(self, command, result):
+        self.debug('Executed command={}, result={}'.format(command, result))
+        self._process_next(command, result)
 
 
 class Command(Component):
@@ -131,8 +134,9 @@ class Command(Component):
         self.vehicle = vehicle
         self.params = params
 
-    def execute(self):
-        pass
+    def execute(self, on_result):
+        """Runs the command, on_result is called with its result once it's done."""
+        on_result(None)
 
     def get_vehicle_state(self):
         response = self.get('')
@@ -142,10 +146,6 @@ class Command(Component):
 
         return response.get('response', {}).get('state', 'unknown')
 
-    def sleep(self, duration):
-        self.debug('About to sleep for {} sec'.format(duration))
-        time.sleep(duration)
-
     def command(self, name, data={}):
         self.debug('About to call Tesla command: {} - {}'.format(name, data))
         response = self.vehicle.command(name, data)
@@ -169,26 +169,36 @@ class WakeupRequiredCommand(Command):
     def __init__(self, app, vehicle, params={}):
         super().__init__(app, vehicle, params=params)
 
-    def execute(self):
+    def execute(self, on_result):
         if not self.should_wakeup():
-            return self.execute_after_wakeup()
+            on_result(self.execute_after_wakeup())
+            return
 
-        retry_count = 0
-        while True:
+        self._try_wakeup(0, on_result)
+
+    def _try_wakeup(self, retry_count, on_result):
+        # runs as a continuation, so on_result has to be called even when the vehicle can't be reached
+        try:
             state = self.wakeup()
+            result = self.execute_after_wakeup() if state == 'online' else None
+        except Exception as e:
+            self.error('Failed to wake up vehicle: {}\n{}'.format(e, traceback.format_exc()))
+            on_result(False)
+            return
 
-            if state == 'online':
-                self.debug('Vehicle is now awake')
-                return self.execute_after_wakeup()
+        if state == 'online':
+            self.debug('Vehicle is now awake')
+            on_result(result)
+            return
 
-            self.sleep(3)
-            retry_count += 1
+        retry_count += 1
 
-            if self.is_max_retry_reached(retry_count):
-                self.error('Failed, max wakeup retry reached')
-                return False
+        if self.is_max_retry_reached(retry_count):
+            self.error('Failed, max wakeup retry reached')
+            on_result(False)
+            return
 
-        return False
+        self.app.after(3, self._try_wakeup, retry_count, on_result)
 
     def execute_after_wakeup(self):
         return True
@@ -243,9 +253,9 @@ class AnnouncementUnlockCommand(UnlockCommand):
 
         self.motion_entity_id = motion_entity_id
 
-    def execute(self):
+    def execute(self, on_result):
         self.wakeup_count = 0
-        super().execute()
+        super().execute(on_result)
 
     def wakeup(self):
         if self.wakeup_count == 0:
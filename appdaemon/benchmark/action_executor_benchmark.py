@@ -0,0 +1,109 @@
+"""Fires multi-action triggers through BaseAutomation.do_actions and reports dispatch latency, comparing a
+ThreadPoolExecutor created per dispatch (previous behaviour) with the shared action executor.
+
+Usage: python benchmark/action_executor_benchmark.py [triggers] [actions_per_trigger] [action_latency_ms]
+"""
+import concurrent.futures
+import sys
+import threading
+import time
+from unittest.mock import MagicMock
+
+from bench_helper import print_result, summarize
+
+from base_automation import BaseAutomation, do_action
+from lib.core.action_executor import ACTION_EXECUTOR
+
+CALLBACK_THREADS = 8
+
+
+class FakeAction:
+    def __init__(self, app, latency):
+        self.app = app
+        self._latency = latency
+        self.cfg = MagicMock()
+
+    def check_action_constraints(self, trigger_info):
+        return True
+
+    def debug(self, msg, *args):
+        pass
+
+    def do_action(self, trigger_info):
+        # stands in for a call_service round-trip
+        time.sleep(self._latency)
+
+
+def create_app(name):
+    app = object.__new__(BaseAutomation)
+    app.name = name
+    app.args = {}
+    app.log = MagicMock()
+    return app
+
+
+def per_dispatch_executor(app, actions, trigger_info):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+        futures = {executor.submit(do_action, action, trigger_info): action for action in actions}
+        for future in concurrent.futures.as_completed(futures):
+            future.result()
+
+
+def shared_executor(app, actions, trigger_info):
+    app.do_actions(actions, trigger_info)
+
+
+def fire(dispatch, triggers, actions_per_trigger, latency):
+    apps = [create_app('app_{}'.format(i)) for i in range(CALLBACK_THREADS)]
+    actions = {app.name: [FakeAction(app, latency) for _ in range(actions_per_trigger)] for app in apps}
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(app, count):
+        for _ in range(count):
+            start = time.perf_counter()
+            dispatch(app, actions[app.name], None)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    # AppDaemon runs callbacks of different apps on its worker threads at the same time
+    threads = [threading.Thread(target=worker, args=(app, triggers // CALLBACK_THREADS)) for app in apps]
+    peak_threads = [0]
+    running = threading.Event()
+
+    def sample_threads():
+        while running.is_set():
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+            time.sleep(0.001)
+
+    running.set()
+    sampler = threading.Thread(target=sample_threads)
+    sampler.start()
+
+    start = time.perf_counter()
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    total = time.perf_counter() - start
+
+    running.clear()
+    sampler.join()
+
+    return summarize(latencies), peak_threads[0], total
+
+
+def main():
+    triggers = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    actions_per_trigger = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 1) / 1000
+
+    for name, dispatch in [('executor per dispatch', per_dispatch_executor), ('shared executor', shared_executor)]:
+        result, peak_threads, total = fire(dispatch, triggers, actions_per_trigger, latency)
+        print_result(name, result)
+        print('{:<40} wall={:.2f}s peak_threads={}'.format('', total, peak_threads))
+
+    print(ACTION_EXECUTOR)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Compares trigger-to-service-call latency of Automation, dispatched on a worker thread with every state read and
+service call hopping to the event loop, with AsyncAutomation, dispatched on the loop itself.
+
+Both handle the same trigger: two state constraints, a triggered_state constraint and two service actions. Latency
+is measured from the trigger until both service calls returned, burst triggers are fired at once. Home Assistant
+round-trips are simulated with an asyncio.sleep of service_latency_ms on the loop.
+
+Usage: python benchmark/async_dispatch_benchmark.py [triggers] [burst] [service_latency_ms]
+"""
+import asyncio
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, Mock, patch
+
+from bench_helper import print_result, summarize
+
+import appdaemon.plugins.hass.hassapi as hass
+
+from async_automation import AsyncAutomation, create_async_handler
+from automation import Automation, create_handler
+from lib.triggers import TriggerInfo
+
+WORKER_THREADS = 20
+
+HANDLER_CONFIG = {
+    'constraints': [
+        {'platform': 'state', 'entity_id': 'input_boolean.kitchen_motion_enabled', 'state': 'on'},
+        {'platform': 'state', 'entity_id': 'sensor.kitchen_illuminance', 'state': '<50'},
+        {'platform': 'triggered_state', 'entity_id': 'binary_sensor.kitchen_motion', 'to': 'on'},
+    ],
+    'actions': [
+        {'platform': 'service', 'service': 'light/turn_on', 'data': {'entity_id': 'light.kitchen'}},
+        {'platform': 'service', 'service': 'light/turn_on', 'data': {'entity_id': 'light.kitchen_island'}},
+    ],
+}
+
+STATES = {
+    'input_boolean.kitchen_motion_enabled': 'on',
+    'sensor.kitchen_illuminance': '12',
+    'binary_sensor.kitchen_motion': 'on',
+}
+
+
+class FakeAD:
+    def __init__(self, loop):
+        self.loop = loop
+        self.futures = Mock()
+        self.executor = ThreadPoolExecutor(max_workers=WORKER_THREADS)
+        self.internal_function_timeout = 30
+
+
+def create_app(app_class, create, ad):
+    app = object.__new__(app_class)
+    app.name = app_class.__name__
+    app.args = {}
+    app.log = MagicMock()
+    app.logger = MagicMock()
+    app.AD = ad
+    app._global_constraints = []
+    app._handlers = []
+    app._handler_index = None
+    app.init_handler(create(app, HANDLER_CONFIG))
+    return app
+
+
+def trigger_info():
+    return TriggerInfo('state', {
+        'entity_id': 'binary_sensor.kitchen_motion',
+        'attribute': None,
+        'from': 'off',
+        'to': 'on',
+    })
+
+
+def fire(dispatch, triggers, burst):
+    latencies = []
+
+    def record(start):
+        return lambda future: latencies.append(time.perf_counter() - start)
+
+    for _ in range(triggers // burst):
+        futures = []
+        for _ in range(burst):
+            future = dispatch()
+            future.add_done_callback(record(time.perf_counter()))
+            futures.append(future)
+
+        for future in futures:
+            future.result()
+
+    return summarize(latencies)
+
+
+def main():
+    triggers = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    burst = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    service_latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 0) / 1000
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    ad = FakeAD(loop)
+
+    async def get_state(app, entity=None, **kwargs):
+        await asyncio.sleep(service_latency)
+        return STATES.get(entity)
+
+    async def call_service(app, service, **kwargs):
+        await asyncio.sleep(service_latency)
+
+    with patch.multiple(hass.Hass, get_state=get_state, call_service=call_service):
+        sync_app = create_app(Automation, create_handler, ad)
+        async_app = create_app(AsyncAutomation, create_async_handler, ad)
+
+        workers = ThreadPoolExecutor(max_workers=WORKER_THREADS)
+        models = [
+            ('sync dispatch on worker', lambda: workers.submit(sync_app.trigger_handler, trigger_info())),
+            ('async dispatch on loop',
+             lambda: asyncio.run_coroutine_threadsafe(async_app.trigger_handler(trigger_info()), loop)),
+        ]
+
+        for name, dispatch in models:
+            fire(dispatch, 10, 1)
+            print_result('{} (burst={})'.format(name, burst), fire(dispatch, triggers, burst))
+
+        workers.shutdown()
+
+    loop.call_soon_threadsafe(loop.stop)
+
+
+if __name__ == '__main__':
+    main()
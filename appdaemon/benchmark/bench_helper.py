@@ -0,0 +1,179 @@
+import importlib
+import inspect
+import os
+import sys
+import time
+from unittest import mock
+from unittest.mock import MagicMock
+
+import yaml
+
+APPDAEMON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# mirror the import paths AppDaemon sets up for apps so benchmarks can be run with "python benchmark/<name>.py",
+# lib is excluded from them in appdaemon.yaml, its climate package would shadow apps/climate
+for path in ['apps', 'apps/lighting', 'apps/climate', '']:
+    path = os.path.join(APPDAEMON_DIR, path)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return None
+
+    index = min(len(sorted_values) - 1, int(round(percent / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(fn, iterations, warmup=10):
+    for _ in range(warmup):
+        fn()
+
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+
+    return summarize(latencies)
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    total = sum(latencies)
+
+    return {
+        'count': len(latencies),
+        'total_sec': total,
+        'mean_us': total / len(latencies) * 1e6 if latencies else None,
+        'p50_us': percentile(latencies, 50) * 1e6 if latencies else None,
+        'p99_us': percentile(latencies, 99) * 1e6 if latencies else None,
+    }
+
+
+def print_result(name, result):
+    print('{:<40} n={:<7} mean={:>10.2f}us p50={:>10.2f}us p99={:>10.2f}us'.format(
+        name,
+        result['count'],
+        result['mean_us'],
+        result['p50_us'],
+        result['p99_us']))
+
+
+CONFIGURATION_DIR = os.path.join(APPDAEMON_DIR, 'configurations')
+
+# these apps talk to external services during initialize()
+OFFLINE_UNSAFE_MODULES = ['tesla_proxy', 'tesla_auto_scheduled_charging', 'commute_time_monitor']
+
+
+class _SecretLoader(yaml.SafeLoader):
+    pass
+
+
+_SecretLoader.add_constructor('!secret', lambda loader, node: 'secret_{}'.format(loader.construct_scalar(node)))
+
+
+def load_app_definitions():
+    """Loads configurations/*.yaml the same way AppConfigurationMonitor merges them into apps.yaml."""
+    filenames = sorted(f for f in os.listdir(CONFIGURATION_DIR) if f.endswith('.yaml'))
+    variable_filenames = [f for f in filenames if f.startswith('var')]
+    filenames = variable_filenames + [f for f in filenames if f not in variable_filenames]
+
+    merged = []
+    for filename in filenames:
+        with open(os.path.join(CONFIGURATION_DIR, filename)) as source:
+            merged.append(source.read())
+
+    definitions = yaml.load('\n\n'.join(merged), Loader=_SecretLoader)
+    return {name: definition for name, definition in definitions.items()
+            if isinstance(definition, dict)
+            and 'module' in definition
+            and 'class' in definition
+            and definition['module'] not in OFFLINE_UNSAFE_MODULES}
+
+
+class FakeStates:
+    """In-memory stand-in for Home Assistant states, counts every read."""
+
+    def __init__(self, states=None):
+        self.states = states or {}
+        self.get_state_count = 0
+        self.service_calls = []
+
+    def set(self, entity_id, state, attributes=None):
+        self.states[entity_id] = {
+            'entity_id': entity_id,
+            'state': state,
+            'attributes': attributes or {},
+        }
+
+    def get_state(self, entity_id=None, attribute=None, **kwargs):
+        self.get_state_count += 1
+
+        if entity_id is None:
+            return self.states
+
+        entity = self.states.get(entity_id)
+        if entity is None:
+            return None
+
+        if attribute is None:
+            return entity['state']
+        elif attribute == 'all':
+            return entity
+
+        return entity['attributes'].get(attribute)
+
+
+class PatchedHass:
+    """Patches the AppDaemon Hass API so apps can be created and initialized without a running AppDaemon."""
+
+    def __init__(self, states=None):
+        self.states = states or FakeStates()
+        self._patches = []
+
+    def __enter__(self):
+        import appdaemon.plugins.hass.hassapi as hass
+        from base_automation import BaseAutomation
+
+        states = self.states
+
+        def get_state(app, entity=None, **kwargs):
+            return states.get_state(entity, **kwargs)
+
+        def get_states(app, entity_ids, **kwargs):
+            return {entity_id: states.get_state(entity_id, **kwargs) for entity_id in entity_ids}
+
+        def call_service(app, service, **kwargs):
+            states.service_calls.append((service, kwargs))
+
+        for name in dir(hass.Hass):
+            if name.startswith('_') or not callable(inspect.getattr_static(hass.Hass, name)):
+                continue
+
+            self._patches.append(mock.patch.object(hass.Hass, name, MagicMock(return_value=None)))
+
+        self._patches.append(mock.patch.object(hass.Hass, 'now_is_between', MagicMock(return_value=False)))
+        self._patches.append(mock.patch.object(BaseAutomation, '_get_state', get_state))
+        self._patches.append(mock.patch.object(BaseAutomation, '_get_states', get_states))
+        self._patches.append(mock.patch.object(BaseAutomation, 'call_service', call_service))
+
+        for patch in self._patches:
+            patch.start()
+
+        return self
+
+    def __exit__(self, *args):
+        for patch in reversed(self._patches):
+            patch.stop()
+
+        self._patches = []
+
+
+def create_app(name, definition):
+    module = importlib.import_module(definition['module'])
+    app = object.__new__(getattr(module, definition['class']))
+    app.name = name
+    app.args = definition
+    return app
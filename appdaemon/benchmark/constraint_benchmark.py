@@ -0,0 +1,115 @@
+"""Measures Constraint.check latency per platform, with the expected values compiled once at construction versus
+compiled again on every check (how values were interpreted before).
+
+Usage: python benchmark/constraint_benchmark.py [iterations]
+"""
+import sys
+
+from bench_helper import measure, print_result
+
+from lib.constraints import get_constraint
+from lib.triggers import TriggerInfo
+
+STATE_TRIGGER = TriggerInfo('state', {
+    'entity_id': 'binary_sensor.kitchen_motion',
+    'attribute': None,
+    'from': 'off',
+    'to': 'on',
+})
+
+CASES = [
+    ('triggered_state', {
+        'entity_id': ['binary_sensor.kitchen_motion', 'binary_sensor.dining_room_motion',
+                      'binary_sensor.family_room_motion'],
+        'from': 'off',
+        'to': ['on', 'detected'],
+    }, STATE_TRIGGER),
+    ('triggered_state', {
+        'entity_id': 'sensor.kitchen_temperature',
+        'to': '>=24.5',
+    }, TriggerInfo('state', {'entity_id': 'sensor.kitchen_temperature', 'from': '24', 'to': '25.1'})),
+    ('triggered_event', {
+        'event_name': ['zha_event', 'deconz_event'],
+        'event_data': {
+            'device_ieee': '00:15:8d:00:02:b5:2f:7a',
+            'args': {
+                'button': 'left',
+                'press_type': ['single', 'double'],
+            },
+        },
+    }, TriggerInfo('event', {'event_name': 'zha_event', 'data': {
+        'device_ieee': '00:15:8d:00:02:b5:2f:7a',
+        'command': 'click',
+        'args': {
+            'button': 'left',
+            'press_type': 'double',
+        },
+    }})),
+    ('triggered_action', {
+        'action_name': 'ARRIVE_HOME',
+    }, TriggerInfo('action', {'action_name': 'ARRIVE_HOME', 'data': {}})),
+    ('triggered_time', {
+        'time': ['07:00:00', '12:00:00', '18:30:00'],
+    }, TriggerInfo('time', {'time': '18:30:00'})),
+    ('state', {
+        'entity_id': ['binary_sensor.front_door', 'binary_sensor.back_door', 'binary_sensor.garage_door'],
+        'state': ['off', 'closed'],
+        'match_all': True,
+    }, STATE_TRIGGER),
+    ('attribute', {
+        'entity_id': 'climate.main_floor',
+        'attribute': 'current_temperature',
+        'value': '<20',
+    }, STATE_TRIGGER),
+    ('template', {
+        'template': "{{ state('binary_sensor.front_door') }}",
+        'expected_value': ['off', 'closed'],
+    }, STATE_TRIGGER),
+]
+
+
+class FakeApp:
+    variables = {}
+
+    def get_state(self, entity_id=None, attribute=None, **kwargs):
+        if attribute is not None:
+            return '19.5'
+        return 'off'
+
+    def get_states(self, entity_ids, attribute=None):
+        return {entity_id: self.get_state(entity_id, attribute=attribute) for entity_id in entity_ids}
+
+    def log(self, msg, *args, level='INFO'):
+        pass
+
+
+def recompile_on_check(constraint):
+    """Makes constraint compile its expected values on every check, like before they were compiled once."""
+    constraint._matchers.clear()
+    if hasattr(constraint, '_event_data_matcher'):
+        constraint._event_data_matcher = None
+
+    return constraint
+
+
+def check(constraint, trigger_info):
+    def fn():
+        constraint.check(trigger_info)
+
+    return fn
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    app = FakeApp()
+
+    for platform, config, trigger_info in CASES:
+        compiled = get_constraint(app, {'platform': platform, **config})
+        uncompiled = recompile_on_check(get_constraint(app, {'platform': platform, **config}))
+
+        print_result('{} (per check)'.format(platform), measure(check(uncompiled, trigger_info), iterations))
+        print_result('{} (compiled)'.format(platform), measure(check(compiled, trigger_info), iterations))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,351 @@
+"""Drives synthetic trigger streams through the Automation, MotionLighting, Reminder and DeviceMonitor apps defined
+in configurations/*.yaml and reports, per class and per app, triggers/sec, dispatch latency percentiles, get_state
+calls, Home Assistant reads and service calls per dispatch and memory allocated per dispatch. Results are also
+written as JSON, and compared with an earlier run when its JSON is given.
+
+Apps are initialized against the patched Hass API of bench_helper, every listen_state, listen_event and timer
+they register is recorded. A trigger picks one of those registrations at random (seeded, so runs compare) and
+calls it the way AppDaemon would: a state change flips the entity's state between on and off (or to the new
+value it listens for) in the fake state table first, an event carries the entity_id it listens for and a timer
+just fires. Entities mentioned in the configuration start out randomly on or off. Pattern registrations and
+delayed timers (run_in) are not driven. The benchmark exits with an error when one of the apps fails to
+initialize, or registers nothing to drive. Reminder's Google Maps client and calendar requests are stubbed out,
+calendar fetches fail like they would without a network.
+
+CPython doesn't count allocations, so memory is measured in a second pass under tracemalloc: the peak of memory
+allocated while a dispatch runs, and the blocks still allocated after it returned.
+
+Usage: python benchmark/dispatch_throughput_benchmark.py [triggers_per_app] [json_path] [baseline_json_path]
+"""
+import json
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytz
+
+from bench_helper import APPDAEMON_DIR, PatchedHass, create_app, load_app_definitions, percentile
+
+import appdaemon.plugins.hass.hassapi as hass
+
+from base_automation import BaseAutomation
+from lib.core.callback_latency import CALLBACK_LATENCIES
+
+BENCHMARKED_CLASSES = ['Automation', 'MotionLighting', 'Reminder', 'DeviceMonitor']
+STATE_REGISTRATION_METHODS = ['listen_state']
+EVENT_REGISTRATION_METHODS = ['listen_event']
+TIMER_REGISTRATION_METHODS = ['run_every', 'run_daily', 'run_minutely', 'run_hourly', 'run_at_sunrise',
+                              'run_at_sunset']
+ENTITY_ID = re.compile(r'^[a-z_]+\.[a-z0-9_]+$')
+MEMORY_SAMPLES = 200
+SEED = 2021
+
+
+class FakeScheduler:
+    """The parts of AppDaemon's scheduler TIME_TABLE reads."""
+
+    def __init__(self, tz):
+        self.tz = tz
+
+    def get_now_sync(self):
+        return datetime.now(self.tz)
+
+    def next_sunrise(self):
+        return self._next_at(7)
+
+    def next_sunset(self):
+        return self._next_at(19)
+
+    def _next_at(self, hour):
+        now = self.get_now_sync()
+        at = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+        return at if at > now else at + timedelta(days=1)
+
+
+class FakeAppDaemon:
+    def __init__(self):
+        self.tz = pytz.timezone('America/Vancouver')
+        self.sched = FakeScheduler(self.tz)
+
+
+def entity_ids_in(value):
+    if isinstance(value, str):
+        return [value] if ENTITY_ID.match(value) else []
+    if isinstance(value, dict):
+        return [entity_id for item in value.values() for entity_id in entity_ids_in(item)]
+    if isinstance(value, list):
+        return [entity_id for item in value for entity_id in entity_ids_in(item)]
+    return []
+
+
+def registrations_of(mocks):
+    """(kind, callback, entity_id, kwargs) of everything registered through the patched Hass methods."""
+    registrations = []
+    for method, mock in mocks.items():
+        for call in mock.call_args_list:
+            args, kwargs = call
+            if method in STATE_REGISTRATION_METHODS:
+                entity_id = args[1] if len(args) > 1 else kwargs.pop('entity', None)
+                if entity_id is not None:
+                    registrations.append(('state', args[0], entity_id, kwargs))
+            elif method in EVENT_REGISTRATION_METHODS:
+                registrations.append(('event', args[0], args[1] if len(args) > 1 else None, kwargs))
+            else:
+                registrations.append(('timer', args[0], None, kwargs))
+        mock.reset_mock()
+
+    return registrations
+
+
+def create_trigger(registration, states, rng):
+    """Function firing registration once, like AppDaemon would."""
+    kind, callback, entity_id, kwargs = registration
+
+    if kind == 'state':
+        attribute = kwargs.get('attribute')
+
+        def fire():
+            entity = states.states.get(entity_id) or {'state': None, 'attributes': {}}
+            old = entity['state'] if attribute is None else entity['attributes'].get(attribute)
+            new = kwargs.get('new') or ('off' if old == 'on' else 'on')
+            if attribute is None:
+                states.set(entity_id, new)
+            callback(entity_id, attribute or 'state', old, new, kwargs)
+
+        return fire
+
+    if kind == 'event':
+        data = {'entity_id': kwargs.get('entity_id') or 'sensor.{}'.format(rng.randint(0, 100))}
+        return lambda: callback(entity_id, data, kwargs)
+
+    return lambda: callback(kwargs)
+
+
+def initialize_apps(definitions, states, rng):
+    registration_methods = STATE_REGISTRATION_METHODS + EVENT_REGISTRATION_METHODS + TIMER_REGISTRATION_METHODS
+    mocks = {method: getattr(hass.Hass, method) for method in registration_methods}
+    apps = []
+    failures = {}
+
+    for name, definition in definitions.items():
+        if definition['class'] not in BENCHMARKED_CLASSES:
+            continue
+
+        for entity_id in entity_ids_in(definition):
+            if entity_id not in states.states:
+                states.set(entity_id, rng.choice(['on', 'off']))
+
+        try:
+            app = create_app(name, definition)
+            app.AD = FakeAppDaemon()
+            app.initialize()
+        except Exception as e:
+            failures[name] = '{}: {}'.format(type(e).__name__, e)
+            registrations_of(mocks)
+            continue
+
+        triggers = [create_trigger(registration, states, rng) for registration in registrations_of(mocks)]
+        if not triggers:
+            failures[name] = 'registered no state, event or timer callback'
+            continue
+
+        apps.append((app, definition['class'], triggers))
+
+    return apps, failures
+
+
+def dispatch_errors(app_name):
+    prefix = app_name + '.'
+    return sum(stats['errors'] for name, stats in CALLBACK_LATENCIES.stats()['callbacks'].items()
+               if name.startswith(prefix))
+
+
+def run_app(app, triggers, count, states, get_state_calls, rng):
+    stream = [rng.choice(triggers) for _ in range(count)]
+    errors_before = dispatch_errors(app.name)
+    get_states_before = get_state_calls[0]
+    reads_before = states.get_state_count
+    service_calls_before = len(states.service_calls)
+
+    latencies = []
+    for fire in stream:
+        started_at = time.perf_counter()
+        fire()
+        latencies.append(time.perf_counter() - started_at)
+
+    # memory pass, tracemalloc slows everything down so it doesn't share the timed pass
+    peaks = []
+    retained = []
+    tracemalloc.start()
+    for fire in stream[:MEMORY_SAMPLES]:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        blocks_before = sys.getallocatedblocks()
+        fire()
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+        retained.append(sys.getallocatedblocks() - blocks_before)
+    tracemalloc.stop()
+
+    # the memory pass dispatched too, counters are per dispatch of both passes
+    dispatches = count + len(peaks)
+    return {
+        'dispatches': count,
+        'total_sec': sum(latencies),
+        'latencies': latencies,
+        'get_state_calls': (get_state_calls[0] - get_states_before) / dispatches * count,
+        'ha_reads': (states.get_state_count - reads_before) / dispatches * count,
+        'service_calls': (len(states.service_calls) - service_calls_before) / dispatches * count,
+        'alloc_peak_bytes': sum(peaks),
+        'retained_blocks': sum(retained),
+        'memory_samples': len(peaks),
+        'errors': dispatch_errors(app.name) - errors_before,
+    }
+
+
+def summarize(runs):
+    latencies = sorted(latency for run in runs for latency in run['latencies'])
+    dispatches = sum(run['dispatches'] for run in runs)
+    memory_samples = sum(run['memory_samples'] for run in runs)
+    total = sum(run['total_sec'] for run in runs)
+
+    def per_dispatch(key):
+        return round(sum(run[key] for run in runs) / dispatches, 3) if dispatches else None
+
+    def per_sample(key):
+        return round(sum(run[key] for run in runs) / memory_samples, 1) if memory_samples else None
+
+    def us(value):
+        return round(value * 1e6, 2) if value is not None else None
+
+    return {
+        'apps': len(runs),
+        'dispatches': dispatches,
+        'triggers_per_sec': round(dispatches / total, 1) if total else None,
+        'latency_us': {
+            'mean': us(total / dispatches) if dispatches else None,
+            'p50': us(percentile(latencies, 50)),
+            'p95': us(percentile(latencies, 95)),
+            'p99': us(percentile(latencies, 99)),
+            'max': us(latencies[-1]) if latencies else None,
+        },
+        'get_state_calls_per_dispatch': per_dispatch('get_state_calls'),
+        'ha_reads_per_dispatch': per_dispatch('ha_reads'),
+        'service_calls_per_dispatch': per_dispatch('service_calls'),
+        'alloc_peak_bytes_per_dispatch': per_sample('alloc_peak_bytes'),
+        'retained_blocks_per_dispatch': per_sample('retained_blocks'),
+        'errors': sum(run['errors'] for run in runs),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=APPDAEMON_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def print_summary(name, summary):
+    print('{:<40} n={:<6} {:>9.1f}/s p50={:>9.2f}us p95={:>9.2f}us p99={:>9.2f}us get_state={:>6.2f} '
+          'ha_reads={:>6.2f} alloc_peak={:>8.1f}B'.format(
+              name,
+              summary['dispatches'],
+              summary['triggers_per_sec'],
+              summary['latency_us']['p50'],
+              summary['latency_us']['p95'],
+              summary['latency_us']['p99'],
+              summary['get_state_calls_per_dispatch'],
+              summary['ha_reads_per_dispatch'],
+              summary['alloc_peak_bytes_per_dispatch']))
+
+
+def print_comparison(results, baseline):
+    print()
+    print('compared with {} ({})'.format(baseline['meta'].get('commit'), baseline['meta'].get('timestamp')))
+    for cls, summary in sorted(results['classes'].items()):
+        before = baseline['classes'].get(cls)
+        if not before:
+            continue
+
+        print('{:<40} triggers/sec {:>+7.1f}%  p95 {:>+7.1f}%  get_state {:>+6.2f}  alloc_peak {:>+8.1f}B'.format(
+            cls,
+            (summary['triggers_per_sec'] / before['triggers_per_sec'] - 1) * 100,
+            (summary['latency_us']['p95'] / before['latency_us']['p95'] - 1) * 100,
+            summary['get_state_calls_per_dispatch'] - before['get_state_calls_per_dispatch'],
+            summary['alloc_peak_bytes_per_dispatch'] - before['alloc_peak_bytes_per_dispatch']))
+
+
+def main():
+    triggers_per_app = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    json_path = sys.argv[2] if len(sys.argv) > 2 else 'dispatch_throughput.json'
+    baseline_path = sys.argv[3] if len(sys.argv) > 3 else None
+
+    rng = random.Random(SEED)
+    definitions = load_app_definitions()
+    get_state_calls = [0]
+    get_state = BaseAutomation.get_state
+
+    def counted_get_state(app, entity=None, **kwargs):
+        get_state_calls[0] += 1
+        return get_state(app, entity, **kwargs)
+
+    with PatchedHass() as patched:
+        states = patched.states
+        with patch.object(hass.Hass, 'log', lambda *args, **kwargs: None), \
+                patch.object(BaseAutomation, 'sleep', lambda app, duration: None), \
+                patch.object(BaseAutomation, 'get_state', counted_get_state), \
+                patch('googlemaps.Client', MagicMock()), \
+                patch('requests.get', MagicMock(side_effect=ConnectionError('offline benchmark'))):
+            apps, failures = initialize_apps(definitions, states, rng)
+            missing_classes = set(BENCHMARKED_CLASSES) - {cls for _, cls, _ in apps}
+            if failures or missing_classes:
+                # a run missing apps isn't comparable with other runs
+                for name, error in sorted(failures.items()):
+                    print('failed to initialize {}: {}'.format(name, error), file=sys.stderr)
+                for cls in sorted(missing_classes):
+                    print('no {} app to benchmark'.format(cls), file=sys.stderr)
+                sys.exit(1)
+
+            runs = defaultdict(list)
+            app_results = {}
+            for app, cls, triggers in apps:
+                run = run_app(app, triggers, triggers_per_app, states, get_state_calls, rng)
+                runs[cls].append(run)
+                app_results[app.name] = {'class': cls, 'registrations': len(triggers), **summarize([run])}
+
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'triggers_per_app': triggers_per_app,
+            'seed': SEED,
+        },
+        'classes': {cls: summarize(class_runs) for cls, class_runs in runs.items()},
+        'all': summarize([run for class_runs in runs.values() for run in class_runs]),
+        'apps': app_results,
+    }
+
+    for cls, summary in sorted(results['classes'].items()):
+        print_summary(cls, summary)
+    print_summary('all', results['all'])
+
+    with open(json_path, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+    print('results written to {}'.format(json_path))
+
+    if baseline_path:
+        with open(baseline_path) as file:
+            print_comparison(results, json.load(file))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""Compares cancel_job/has_scheduled_job latency of the job registry with the previous SCHEDULED_HANDLES prefix
+scan, for a growing number of outstanding delayed jobs.
+
+Usage: python benchmark/job_registry_benchmark.py [iterations]
+"""
+import sys
+from datetime import datetime, timedelta
+
+from bench_helper import measure, print_result
+
+from lib.schedule_job import schedule_job, cancel_job, has_scheduled_job, JOB_REGISTRY
+from lib.triggers import TriggerInfo
+
+JOB_COUNTS = [100, 1000, 5000]
+JOBS_PER_APP = 10
+
+
+class FakeApp:
+    timers = {}
+    next_handle = 0
+
+    def __init__(self, name):
+        self.name = name
+
+    def run_in(self, callback, delay, **kwargs):
+        FakeApp.next_handle += 1
+        FakeApp.timers[FakeApp.next_handle] = (datetime.now() + timedelta(seconds=delay), 0, kwargs)
+        return FakeApp.next_handle
+
+    def cancel_timer(self, handle):
+        FakeApp.timers.pop(handle, None)
+
+    def info_timer(self, handle):
+        if handle not in FakeApp.timers:
+            raise ValueError('Invalid handle')
+        return FakeApp.timers[handle]
+
+    def log(self, msg, level='INFO'):
+        pass
+
+    def debug(self, msg):
+        pass
+
+    def warn(self, msg):
+        pass
+
+
+class PrefixScanJobs:
+    """The previous implementation, one dict of job name to handle scanned by prefix."""
+
+    def __init__(self):
+        self.handles = {}
+
+    def schedule_job(self, app, callback, delay, trigger_info=None):
+        self.cancel_job(app, trigger_info)
+        self.handles[self.build_job_name(app, trigger_info)] = app.run_in(callback, delay, trigger_info=trigger_info)
+
+    def cancel_job(self, app, trigger_info=None):
+        target_job_name = self.build_job_name(app, trigger_info)
+        existing_job_names = list(self.handles.keys())
+
+        app.debug('cancelling job ... existing_job_names={}, target_job_name={}'.format(
+            existing_job_names,
+            target_job_name))
+
+        for job_name in existing_job_names:
+            if job_name.startswith(target_job_name):
+                app.cancel_timer(self.handles[job_name])
+                self.handles.pop(job_name, None)
+
+    def has_scheduled_job(self, app):
+        for job_name, handle in list(self.handles.items()):
+            if not job_name.startswith(app.name):
+                continue
+
+            try:
+                scheduled_time, interval, kwargs = app.info_timer(handle)
+                if datetime.now() > scheduled_time:
+                    if interval != 0:
+                        return True
+                    continue
+
+                return True
+            except (ValueError, TypeError):
+                pass
+
+        return False
+
+    @staticmethod
+    def build_job_name(app, trigger_info=None):
+        if not trigger_info:
+            return app.name
+
+        return '{}_{}'.format(app.name, trigger_info.data['entity_id'])
+
+
+def motion_trigger_info(app_index, job_index):
+    return TriggerInfo('state', {'entity_id': 'binary_sensor.room_{}_motion_{}'.format(app_index, job_index)})
+
+
+def populate(schedule, job_count):
+    apps = [FakeApp('room_{}_lighting'.format(i)) for i in range(job_count // JOBS_PER_APP)]
+    for app_index, app in enumerate(apps):
+        for job_index in range(JOBS_PER_APP):
+            schedule(app, noop, 300, motion_trigger_info(app_index, job_index))
+
+    return apps
+
+
+def noop(kwargs):
+    pass
+
+
+def motion_cycle(schedule, cancel, apps):
+    """A motion event in a room: cancel the pending turn off for the sensor and schedule it again."""
+    app_index = [0]
+
+    def fn():
+        index = app_index[0] % len(apps)
+        app_index[0] += 1
+        trigger_info = motion_trigger_info(index, 0)
+        cancel(apps[index], trigger_info)
+        schedule(apps[index], noop, 300, trigger_info)
+
+    return fn
+
+
+def check_all(has_job, apps):
+    app_index = [0]
+
+    def fn():
+        index = app_index[0] % len(apps)
+        app_index[0] += 1
+        has_job(apps[index])
+
+    return fn
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    for job_count in JOB_COUNTS:
+        legacy = PrefixScanJobs()
+        apps = populate(legacy.schedule_job, job_count)
+        print_result('prefix scan cancel+schedule ({} jobs)'.format(job_count),
+                     measure(motion_cycle(legacy.schedule_job, legacy.cancel_job, apps), iterations))
+        print_result('prefix scan has_scheduled_job ({} jobs)'.format(job_count),
+                     measure(check_all(legacy.has_scheduled_job, apps), iterations))
+
+        for app in apps:
+            JOB_REGISTRY.remove_all(app.name)
+
+        apps = populate(schedule_job, job_count)
+        print_result('registry cancel+schedule ({} jobs)'.format(job_count),
+                     measure(motion_cycle(schedule_job, cancel_job, apps), iterations))
+        print_result('registry has_scheduled_job ({} jobs)'.format(job_count),
+                     measure(check_all(has_scheduled_job, apps), iterations))
+
+        for app in apps:
+            JOB_REGISTRY.remove_all(app.name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Measures the cost logging adds to a callback, with the app's log_level at INFO (debug records dropped) and at
+DEBUG, comparing messages formatted by the caller and written right away (how apps logged before) with lazy
+arguments handed to LOG_SINK's writer thread.
+
+The callback logs like a dispatch of ConfigurableAutomation does: a handful of debug records carrying the
+trigger_info and config dicts and one info record for the service call. Records go through a logging.Logger
+writing to a file, the way AppDaemon's main log does.
+
+Usage: python benchmark/logging_benchmark.py [iterations]
+"""
+import logging
+import sys
+import tempfile
+from unittest.mock import patch
+
+from bench_helper import measure, print_result
+
+import appdaemon.plugins.hass.hassapi as hass
+
+from base_automation import BaseAutomation, LOG_LEVELS
+from lib.core.log_sink import LOG_SINK
+
+TRIGGER_INFO = {
+    'platform': 'state',
+    'data': {
+        'entity_id': 'binary_sensor.kitchen_motion',
+        'attribute': 'state',
+        'from': 'off',
+        'to': 'on',
+    },
+}
+CONFIG = {
+    'entity_ids': {
+        'light.kitchen_island': {'brightness': 255, 'color_temp': 300},
+        'light.kitchen_ceiling': {'brightness': 200},
+    },
+    'constraints': [{'platform': 'state', 'entity_id': 'input_boolean.kitchen_motion', 'state': 'on'}],
+}
+
+
+class EagerApp(BaseAutomation):
+    """Logs the way BaseAutomation did before LOG_SINK."""
+
+    def log(self, msg, level='INFO'):
+        if LOG_LEVELS[level] < LOG_LEVELS[self.log_level]:
+            return
+
+        if level == 'DEBUG':
+            msg = 'DEBUG - {}'.format(msg)
+            level = 'INFO'
+
+        hass.Hass.log(self, msg, level=level)
+
+
+def eager_callback(app):
+    app.debug('Triggered with trigger_info={}'.format(TRIGGER_INFO))
+    for constraint in CONFIG['constraints']:
+        app.debug('Checking {} {} {}? {}'.format('on', '=', constraint['state'], True))
+    app.debug('All constraints match')
+    app.debug('About to run TurnOnAction: {}'.format(CONFIG['entity_ids']))
+    app.log('Calling {} with {}'.format('light/turn_on', CONFIG['entity_ids']))
+    app.debug('All action(s) are performed')
+
+
+def lazy_callback(app):
+    app.debug('Triggered with trigger_info={}', TRIGGER_INFO)
+    for constraint in CONFIG['constraints']:
+        app.debug('Checking {} {} {}? {}', 'on', '=', constraint['state'], True)
+    app.debug('All constraints match')
+    app.debug('About to run TurnOnAction: {}', CONFIG['entity_ids'])
+    app.log('Calling {} with {}', 'light/turn_on', CONFIG['entity_ids'])
+    app.debug('All action(s) are performed')
+
+
+def create_app(cls, log_level):
+    app = object.__new__(cls)
+    app.name = 'kitchen_motion_lighting'
+    app.args = {'log_level': log_level}
+    return app
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    logger = logging.getLogger('logging_benchmark')
+    logger.propagate = False
+    with tempfile.NamedTemporaryFile('w', suffix='.log') as log_file:
+        logger.addHandler(logging.FileHandler(log_file.name))
+        write = lambda app, msg, level='INFO': logger.log(logging.getLevelName(level), msg)
+
+        with patch.object(hass.Hass, 'log', write):
+            for log_level in ['INFO', 'DEBUG']:
+                for name, cls, callback in [('caller formats and writes', EagerApp, eager_callback),
+                                            ('lazy args, log sink', BaseAutomation, lazy_callback)]:
+                    app = create_app(cls, log_level)
+                    print_result('{} {}'.format(log_level, name), measure(lambda: callback(app), iterations))
+                    LOG_SINK.flush()
+
+    print('{:<40} {}'.format('log sink', LOG_SINK.stats()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Initializes every app defined in configurations/*.yaml against a patched Hass API and reports initialize()
+time together with the number of jinja Environment instances alive afterwards.
+
+Usage: python benchmark/startup_benchmark.py
+"""
+import gc
+import time
+from collections import defaultdict
+
+from bench_helper import PatchedHass, create_app, load_app_definitions
+
+from jinja2 import Environment
+
+from lib.core.component import Component
+
+
+def count_instances(cls):
+    return sum(1 for o in gc.get_objects() if isinstance(o, cls))
+
+
+def main():
+    definitions = load_app_definitions()
+    durations = defaultdict(list)
+    failures = {}
+    apps = []
+
+    with PatchedHass():
+        start = time.perf_counter()
+        for name, definition in definitions.items():
+            try:
+                app = create_app(name, definition)
+                app_start = time.perf_counter()
+                app.initialize()
+                durations[definition['class']].append(time.perf_counter() - app_start)
+                apps.append(app)
+            except Exception as e:
+                failures[name] = '{}: {}'.format(type(e).__name__, e)
+        total = time.perf_counter() - start
+
+        gc.collect()
+        print('initialized {} of {} apps in {:.1f}ms'.format(len(apps), len(definitions), total * 1000))
+        print('jinja Environment instances: {}'.format(count_instances(Environment)))
+        print('components: {}'.format(count_instances(Component)))
+        print()
+
+        for cls, values in sorted(durations.items(), key=lambda i: -sum(i[1])):
+            print('{:<32} n={:<4} total={:>8.2f}ms mean={:>8.2f}ms'.format(
+                cls, len(values), sum(values) * 1000, sum(values) / len(values) * 1000))
+
+        if failures:
+            print()
+            for name, error in sorted(failures.items()):
+                print('failed to initialize {}: {}'.format(name, error))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Measures how many state changes per second get matched to their listen_state registrations, comparing
+AppDaemon's matching (every state callback checked against every state change, like
+State.process_state_callbacks) with STATE_DISPATCHER's entity index.
+
+Registrations are spread over exact entity ids with a few domain and prefix wildcards, state changes hit random
+entities of a larger table so most of them match nothing. AppDaemon has no prefix wildcard, so it gets one
+registration per entity the prefix covers. Callbacks are only counted, not run.
+
+Usage: python benchmark/state_dispatch_benchmark.py [registrations] [entities] [events]
+"""
+import random
+import sys
+import time
+import uuid
+from unittest.mock import MagicMock
+
+import bench_helper  # noqa: F401, sets up the import paths
+
+from lib.core.state_dispatcher import StateDispatcher
+
+DOMAINS = ['light', 'switch', 'sensor', 'binary_sensor', 'input_boolean', 'media_player']
+
+
+class CountingDispatcher(StateDispatcher):
+    def __init__(self):
+        super().__init__()
+        self.delivered = 0
+
+    def _submit(self, listener, args):
+        self.delivered += 1
+
+
+def appdaemon_matching(callbacks, entity_id, old_state, new_state):
+    """The matching part of AppDaemon's State.process_state_callbacks, returns how many callbacks it would run."""
+    delivered = 0
+    device, entity = entity_id.split('.')
+
+    for name in callbacks.keys():
+        for uuid_ in callbacks[name]:
+            callback = callbacks[name][uuid_]
+            if callback['type'] != 'state':
+                continue
+
+            cdevice = None
+            centity = None
+            if callback['entity'] is not None:
+                if '.' not in callback['entity']:
+                    cdevice = callback['entity']
+                else:
+                    cdevice, centity = callback['entity'].split('.')
+
+            cattribute = callback['kwargs'].get('attribute') or 'state'
+
+            if cdevice is None or (centity is None and device == cdevice) or (device == cdevice and entity == centity):
+                old = old_state.get(cattribute, old_state['attributes'].get(cattribute))
+                new = new_state.get(cattribute, new_state['attributes'].get(cattribute))
+                if old != new:
+                    delivered += 1
+
+    return delivered
+
+
+def create_entity(entity_id, state):
+    return {'entity_id': entity_id, 'state': state, 'attributes': {'friendly_name': entity_id}}
+
+
+def main():
+    registrations = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+    entities = int(sys.argv[2]) if len(sys.argv) > 2 else 3000
+    events = int(sys.argv[3]) if len(sys.argv) > 3 else 20000
+
+    random.seed(0)
+    entity_ids = ['{}.entity_{}'.format(DOMAINS[i % len(DOMAINS)], i) for i in range(entities)]
+    listened = [random.choice(entity_ids) for _ in range(registrations - 6)]
+    # a few apps listen to whole domains or name prefixes
+    listened += ['media_player', 'input_boolean.*', 'sensor.entity_1*', 'light.entity_2*', 'switch', 'sensor.*']
+
+    apps = [MagicMock() for _ in range(40)]
+    for i, app in enumerate(apps):
+        app.name = 'app_{}'.format(i)
+
+    dispatcher = CountingDispatcher()
+    callbacks = {app.name: {} for app in apps}
+    appdaemon_registrations = 0
+    for i, entity in enumerate(listened):
+        app = apps[i % len(apps)]
+        dispatcher.listen(app, MagicMock(), entity)
+
+        if entity.endswith('.*'):
+            expanded = [entity[:-2]]
+        elif entity.endswith('*'):
+            expanded = [entity_id for entity_id in entity_ids if entity_id.startswith(entity[:-1])]
+        else:
+            expanded = [entity]
+
+        for callback_entity in expanded:
+            callbacks[app.name][uuid.uuid4().hex] = {'type': 'state', 'entity': callback_entity, 'kwargs': {}}
+            appdaemon_registrations += 1
+
+    changes = []
+    for i in range(events):
+        entity_id = random.choice(entity_ids)
+        changes.append((entity_id, create_entity(entity_id, str(i)), create_entity(entity_id, str(i + 1))))
+
+    print('registrations={} (appdaemon={}) entities={} events={}'.format(
+        len(listened), appdaemon_registrations, entities, events))
+
+    start = time.perf_counter()
+    delivered = sum(appdaemon_matching(callbacks, *change) for change in changes)
+    elapsed = time.perf_counter() - start
+    print('{:<40} {:>12.0f} events/s  matched={}'.format('appdaemon matching', events / elapsed, delivered))
+
+    start = time.perf_counter()
+    for change in changes:
+        dispatcher.dispatch(*change)
+    elapsed = time.perf_counter() - start
+    print('{:<40} {:>12.0f} events/s  matched={}'.format('state dispatcher', events / elapsed, dispatcher.delivered))
+
+
+if __name__ == '__main__':
+    main()
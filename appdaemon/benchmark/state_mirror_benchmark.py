@@ -0,0 +1,127 @@
+"""Compares reading state through AppDaemon, a hop to its event loop plus a deepcopy per read like
+AppDaemon's get_state does, with reading STATE_MIRROR, over a state table of a few thousand entities.
+
+Measures single entity reads, LightRuntimeMonitor's bulk scan of the whole table (using its configuration from
+configurations/*.yaml) and the memory a bulk scan allocates.
+
+Usage: python benchmark/state_mirror_benchmark.py [entities] [iterations]
+"""
+import asyncio
+import copy
+import sys
+import threading
+import tracemalloc
+from unittest.mock import MagicMock, patch
+
+from bench_helper import create_app, load_app_definitions, measure, print_result
+
+from lib.core.state_mirror import StateMirror
+
+DOMAINS = ['light', 'switch', 'sensor', 'binary_sensor', 'input_boolean', 'media_player']
+
+
+def create_states(count):
+    states = {}
+    for i in range(count):
+        entity_id = '{}.entity_{}'.format(DOMAINS[i % len(DOMAINS)], i)
+        states[entity_id] = {
+            'entity_id': entity_id,
+            'state': 'on' if i % 3 else 'off',
+            'attributes': {
+                'friendly_name': 'Entity {}'.format(i),
+                'brightness': i % 255,
+                'supported_features': 41,
+                'icon': 'mdi:lightbulb',
+            },
+            'last_changed': '2021-01-01T00:00:00.000000+00:00',
+            'last_updated': '2021-01-01T00:00:00.000000+00:00',
+            'context': {'id': str(i), 'parent_id': None, 'user_id': None},
+        }
+
+    return states
+
+
+class FakeAppDaemonState:
+    """AppDaemon's get_state, run on its own loop thread and copying what it returns."""
+
+    def __init__(self, states):
+        self.states = states
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+
+    async def _get_state(self, entity_id=None, attribute=None, default=None):
+        if entity_id is None:
+            return copy.deepcopy(self.states)
+
+        entity = self.states.get(entity_id)
+        if entity is None:
+            return default
+        if attribute is None:
+            return copy.deepcopy(entity['state'])
+        if attribute == 'all':
+            return copy.deepcopy(entity)
+
+        return copy.deepcopy(entity['attributes'].get(attribute, default))
+
+    def get_state(self, entity_id=None, **kwargs):
+        return asyncio.run_coroutine_threadsafe(self._get_state(entity_id, **kwargs), self.loop).result()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def create_monitor(ad_state, use_mirror):
+    definitions = load_app_definitions()
+    app = create_app('light_runtime_monitor', definitions['light_runtime_monitor'])
+    app.log = MagicMock()
+    app.turn_off = MagicMock()
+    app.config = {'state_mirror': use_mirror}
+    app.listen_event = MagicMock()
+    app._get_state = ad_state.get_state
+    app.run_every = MagicMock()
+    app.initialize()
+    return app
+
+
+def allocated(fn):
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    entities = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    states = create_states(entities)
+    entity_ids = list(states.keys())
+    ad_state = FakeAppDaemonState(states)
+
+    for name, use_mirror in [('appdaemon', False), ('state mirror', True)]:
+        with patch('base_automation.STATE_MIRROR', StateMirror()) as mirror:
+            app = create_monitor(ad_state, use_mirror)
+
+            reads = iter(range(sys.maxsize))
+            print_result('{} get_state'.format(name),
+                         measure(lambda: app.get_state(entity_ids[next(reads) % entities]), iterations * 10))
+            print_result('{} get_state all'.format(name),
+                         measure(lambda: app.get_state(entity_ids[next(reads) % entities], attribute='all'),
+                                 iterations * 10))
+            print_result('{} light_runtime_monitor scan'.format(name),
+                         measure(app._run_every_handler, iterations))
+
+            scan_bytes = allocated(lambda: [entity['state'] for entity in app.get_state().values()])
+            print('{:<40} entities={} scan_allocated={:.1f}KiB {}'.format(
+                '', entities, scan_bytes / 1024, mirror.stats() if use_mirror else ''))
+
+    mirror = StateMirror()
+    mirror_bytes = allocated(lambda: mirror.attach(MagicMock(), lambda: copy.deepcopy(states)))
+    print('{:<40} mirror seeding peak={:.1f}KiB'.format('state mirror', mirror_bytes / 1024))
+
+    ad_state.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Compares template render latency with and without the shared compiled-template cache.
+
+Usage: python benchmark/template_renderer_benchmark.py [iterations]
+"""
+import sys
+
+from bench_helper import measure, print_result
+
+from lib.template_renderer import TemplateRenderer, TEMPLATE_CACHE, TEMPLATE_ENVIRONMENT
+
+TEMPLATES = [
+    "{{ state('sensor.master_bedroom_temperature') }}",
+    "{{ (state('sensor.master_bedroom') | float) - (state('sensor.lynn_s_room') | float) }}",
+    "{% if is_state_attr('climate.main_floor', 'hvac_action', 'heating') %}on{% else %}off{% endif %}",
+    "{{ state('input_select.presence_mode', {'Someone is Home': 'home', 'No One is Home': 'away'}) }}",
+    "The garage door has been open for {{ relative_time(state_attr('cover.garage_door', 'last_changed')) }}",
+]
+
+
+class FakeApp:
+    variables = {}
+
+    def get_state(self, entity_id=None, attribute=None, **kwargs):
+        if attribute == 'last_changed':
+            return '2021-02-25T19:02:07.776968+00:00'
+        if attribute is not None:
+            return 'heating'
+        return '21.5'
+
+    def now_is_between(self, start_time, end_time):
+        return True
+
+
+UNCACHED_ENVIRONMENT = TEMPLATE_ENVIRONMENT.overlay(cache_size=0)
+
+
+class UncachedTemplateRenderer(TemplateRenderer):
+    """Renderer behaviour before the cache: every render re-parses and re-compiles the template source, in an
+    environment with the same globals but no compiled-template cache."""
+
+    def render(self, message, **kwargs):
+        if self._should_render_template(message):
+            template = UNCACHED_ENVIRONMENT.from_string(message)
+            return template.render(self._get_globals(), **kwargs).strip()
+
+        return message
+
+
+def render_all(renderer):
+    def fn():
+        for template in TEMPLATES:
+            renderer.render(template, trigger_info=None)
+
+    return fn
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    app = FakeApp()
+
+    print_result('uncached render ({} templates)'.format(len(TEMPLATES)),
+                 measure(render_all(UncachedTemplateRenderer(app)), iterations))
+    print_result('cached render ({} templates)'.format(len(TEMPLATES)),
+                 measure(render_all(TemplateRenderer(app)), iterations))
+    print(TEMPLATE_CACHE)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Fires callbacks that wait between two service calls (like handle_noise_detected or a Sonos restore) on a pool
+the size of AppDaemon's worker pool, comparing a blocking BaseAutomation.sleep with a BaseAutomation.after
+continuation. Reports how long callbacks queued for a worker and how many workers sat sleeping.
+
+Usage: python benchmark/thread_occupancy_benchmark.py [callbacks] [wait_ms]
+"""
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+from bench_helper import print_result, summarize
+
+from base_automation import BaseAutomation
+from lib.core.thread_occupancy import ThreadOccupancy
+
+WORKER_THREADS = 20
+
+
+def create_app(pool):
+    app = object.__new__(BaseAutomation)
+    app.name = 'noise_level_monitor'
+    app.args = {}
+    app.log = MagicMock()
+
+    def run_in(callback, delay, **kwargs):
+        # AppDaemon's scheduler runs on its own loop and only takes a worker once the timer is due
+        timer = threading.Timer(delay, pool.submit, args=(callback, kwargs))
+        timer.start()
+        return timer
+
+    app.run_in = run_in
+    return app
+
+
+def fire(callbacks, wait, cooperative):
+    pool = ThreadPoolExecutor(max_workers=WORKER_THREADS)
+    app = create_app(pool)
+    queued_latencies = []
+    done = threading.Semaphore(0)
+
+    def finish():
+        done.release()
+
+    def callback(submitted_at):
+        queued_latencies.append(time.perf_counter() - submitted_at)
+
+        if cooperative:
+            app.after(wait, finish)
+        else:
+            app.sleep(wait)
+            finish()
+
+    start = time.perf_counter()
+    for _ in range(callbacks):
+        pool.submit(callback, time.perf_counter())
+
+    for _ in range(callbacks):
+        done.acquire()
+
+    total = time.perf_counter() - start
+    pool.shutdown()
+
+    return summarize(queued_latencies), total
+
+
+def main():
+    callbacks = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    wait = (float(sys.argv[2]) if len(sys.argv) > 2 else 100) / 1000
+
+    for name, cooperative in [('blocking sleep', False), ('after continuation', True)]:
+        occupancy = ThreadOccupancy()
+        with patch('base_automation.THREAD_OCCUPANCY', occupancy):
+            result, total = fire(callbacks, wait, cooperative)
+
+        print_result('{} (queued for worker)'.format(name), result)
+        print('{:<40} wall={:.2f}s {}'.format('', total, occupancy.stats()))
+
+
+if __name__ == '__main__':
+    main()
@@ -7,10 +7,11 @@ from alarm_notifier import AlarmNotifier
 from announcer import Announcer
 from base_automation import do_action
 from lib.constraints import Constraint
-from lib.constraints import get_constraint
+from lib.constraints import get_constraint, get_async_constraint
 from lib.core.component import Component
 from lib.helper import to_int, list_value
 from lib.schedule_job import cancel_job, schedule_job, schedule_repeat_job
+from lib.template_renderer import contains_template
 from notifier import Message, NotifierType, Notifier
 
 
@@ -82,6 +83,16 @@ def get_action(app, config):
         raise ValueError("Invalid action config: {}".format(config))
 
 
+def get_async_action(app, config):
+    """Action for an app running on the event loop. Service calls without templates run natively, everything else
+    is a sync action that do_async_action hands to AppDaemon's executor."""
+    if config["platform"] == "service" and not any(raw is not None and contains_template(raw)
+                                                   for raw in config.values()):
+        return AsyncServiceAction(app, config)
+
+    return get_action(app, config)
+
+
 DEFAULT_BRIGHTNESS = 255
 DEFAULT_TRANSITION_TIME = 1.5
 DEFAULT_DIMMED_BRIGHTNESS = 80
@@ -102,12 +113,12 @@ def turn_on_entity(app, entity_id, config={}):
         if "rgb_color" in config:
             attributes["rgb_color"] = config.get("rgb_color")
 
-    app.log("Turning on {} with {}".format(entity_id, attributes))
+    app.log("Turning on {} with {}", entity_id, attributes)
     app.turn_on(entity_id, **attributes)
 
 
 def turn_off_entity(app, entity_id, config={}):
-    app.debug("About to turn off {} with {}".format(entity_id, config))
+    app.debug("About to turn off {} with {}", entity_id, config)
 
     entity_type, entity_name = entity_id.split(".")
     attributes = {}
@@ -116,7 +127,7 @@ def turn_off_entity(app, entity_id, config={}):
         full_transition_time = config.get("transition", DEFAULT_TRANSITION_TIME)
         attributes["transition"] = figure_transition_time(app, entity_id, 0, full_transition_time)
 
-    app.log("Turning off {} with {}".format(entity_id, attributes))
+    app.log("Turning off {} with {}", entity_id, attributes)
     app.turn_off(entity_id, **attributes)
 
 
@@ -137,7 +148,7 @@ def toggle_entity(app, entity_id, config={}):
         if "rgb_color" in config:
             attributes["rgb_color"] = config.get("rgb_color")
 
-    app.log("Toggling on {} with {}".format(entity_id, attributes))
+    app.log("Toggling on {} with {}", entity_id, attributes)
     app.toggle(entity_id, **attributes)
 
 
@@ -154,7 +165,7 @@ def figure_transition_time(app, entity_id, target_brightness, full_transition_ti
 
 
 def notify(app, target, message, recipient_target=None, data={}):
-    app.log("Notifying {} with {}".format(target, message))
+    app.log("Notifying {} with {}", target, message)
     app.call_service("notify/" + target, message=message, target=recipient_target, data=data)
 
 
@@ -181,7 +192,7 @@ def set_cover_position(app, entity_id, position, difference_threshold=0):
                                                    difference_threshold))
         return
 
-    app.log('Updating {} with position={} (from position={})'.format(entity_id, position, current_position))
+    app.log('Updating {} with position={} (from position={})', entity_id, position, current_position)
 
     if position == 0:
         app.call_service("cover/close_cover", entity_id=entity_id)
@@ -204,7 +215,7 @@ class Action(Component):
 
         for constraint in self._constraints:
             if not constraint.check(trigger_info):
-                self.app.debug('Action constraint does not match {}'.format(constraint))
+                self.app.debug('Action constraint does not match {}', constraint)
                 return False
 
         self.app.debug('All action constraints passed')
@@ -214,6 +225,26 @@ class Action(Component):
         raise NotImplementedError()
 
 
+class AsyncAction(Action):
+    """Action of an app running on the event loop, do_action is a coroutine."""
+
+    def __init__(self, app, action_config):
+        super().__init__(app, action_config)
+
+        self._constraints = [get_async_constraint(app, c) for c in self.cfg.list('constraints', [])]
+
+    async def check_action_constraints(self, trigger_info):
+        for constraint in self._constraints:
+            if not await constraint.check(trigger_info):
+                self.app.debug('Action constraint does not match {}', constraint)
+                return False
+
+        return True
+
+    async def do_action(self, trigger_info):
+        raise NotImplementedError()
+
+
 class DelayableAction(Action):
     def __init__(self, app, action_config):
         super().__init__(app, action_config)
@@ -311,7 +342,7 @@ class TurnOnAction(Action):
 
         cancel_job(self.app, trigger_info)
 
-        self.debug('About to run TurnOnAction: {}'.format(entity_ids))
+        self.debug('About to run TurnOnAction: {}', entity_ids)
 
         for entity_id, config in entity_ids.items():
             config = config or {}
@@ -369,7 +400,7 @@ class TurnOffAction(Action):
     def turn_off_lights_job_runner(self, kwargs={}):
         entity_ids = figure_light_settings(self.cfg.value('entity_ids', None))
         trigger_info = kwargs.get('trigger_info')
-        self.debug('About to run TurnOffAction: {}'.format(entity_ids))
+        self.debug('About to run TurnOffAction: {}', entity_ids)
 
         for entity_id, config in entity_ids.items():
             config = config or {}
@@ -537,7 +568,7 @@ class AddInputSelectOptionAction(Action):
     def do_action(self, trigger_info):
         entity_id = self.cfg.value("entity_id")
         option = self.cfg.value("option")
-        options = self.get_state(entity_id, attribute='options')
+        options = list(self.get_state(entity_id, attribute='options'))
 
         if option not in options:
             options.append(option)
@@ -555,7 +586,7 @@ class RemoveInputSelectOptionAction(Action):
     def do_action(self, trigger_info):
         entity_id = self.cfg.value("entity_id", None)
         option = self.cfg.value("option")
-        options = self.get_state(entity_id, attribute='options')
+        options = list(self.get_state(entity_id, attribute='options'))
 
         if option in options:
             options.remove(option)
@@ -670,6 +701,14 @@ class ServiceAction(Action):
         self.call_service(service, **data)
 
 
+class AsyncServiceAction(AsyncAction, ServiceAction):
+    async def do_action(self, trigger_info):
+        service = self.cfg.value("service", None)
+        data = self.cfg.value("data", {})
+
+        await self.call_service(service, **data)
+
+
 class SetFanMinOnTimeAction(Action):
     def __init__(self, app, action_config):
         super().__init__(app, action_config)
@@ -750,7 +789,7 @@ class DebugAction(Action):
 
     def do_action(self, trigger_info):
         template_value = self.cfg.value('template', None)
-        self.log("Debugging, trigger_info={}, template_value={}".format(trigger_info, template_value))
+        self.log("Debugging, trigger_info={}, template_value={}", trigger_info, template_value)
 
 
 class CameraSnapshotAction(Action):
@@ -799,7 +838,7 @@ class DelayActionWrapper(DelayableAction):
     def job_runner(self, kwargs={}):
         trigger_info = kwargs.get('trigger_info')
 
-        self.debug('About to run delayed job, trigger_info={}'.format(trigger_info))
+        self.debug('About to run delayed job, trigger_info={}', trigger_info)
 
         for action in self.actions:
             do_action(action, trigger_info)
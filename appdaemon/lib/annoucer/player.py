@@ -105,13 +105,28 @@ class Player(AppAccessible):
         if current_volume != volume:
             self.call_service('media_player/volume_set', entity_id=player_entity_id, volume_level=volume)
 
-    def play_media(self, medias):
+    def play_media(self, medias, on_complete=None):
+        """Plays medias one after another, on_complete is called once the last one has finished playing."""
+        playlist = [(player_entity_id, media_data)
+                    for player_entity_id in self.config.player_entity_ids
+                    for media_data in medias]
+        self._play_playlist(playlist, on_complete)
+
+    def _play_playlist(self, playlist, on_complete):
         try:
-            for player_entity_id in self.config.player_entity_ids:
-                for media_data in medias:
-                    self._play_media(player_entity_id, media_data)
+            while playlist:
+                player_entity_id, media_data = playlist.pop(0)
+                self._play_media(player_entity_id, media_data)
+
+                # wait for it to finish without holding a thread, the rest is played as a continuation
+                if media_data.duration:
+                    self.app.after(media_data.duration, self._play_playlist, playlist, on_complete)
+                    return
         except:
-            self.error("Unable to get play media, medias={}: {}".format(medias, traceback.format_exc()))
+            self.error("Unable to get play media, playlist={}: {}".format(playlist, traceback.format_exc()))
+
+        if on_complete is not None:
+            on_complete()
 
     def _play_media(self, player_entity_id, media_data):
         self.debug('About to play, entity={}, data={}'.format(player_entity_id, media_data))
@@ -120,12 +135,6 @@ class Player(AppAccessible):
         self.call_service('media_player/play_media', entity_id=player_entity_id, media_content_id=url,
                           media_content_type='music')
 
-        if media_data.duration:
-            self._sleep(media_data.duration)
-
-    def _sleep(self, duration):
-        self.app.sleep(duration)
-
 
 class GoogleMediaPlayer(Player):
     def __init__(self, app, config, media_manager):
@@ -136,21 +145,22 @@ class GoogleMediaPlayer(Player):
             self.app.run_every(self._run_every_handler, now, 240)
 
     def _run_every_handler(self, time=None, **kwargs):
-        self.app._announcer_lock.acquire()
-        try:
+        with self.app._announcer_lock:
+            if self.app._announcing:
+                self.debug('Skipping keep alive ... announcing')
+                return
+
             for player_entity_id in self.player_entity_ids:
                 if self.get_state(player_entity_id) != 'playing':
                     empty_media = self._media_manager.get_sound_media('empty', duration=0)
                     self._play_media(player_entity_id, empty_media)
-        finally:
-            self.app._announcer_lock.release()
 
 
 class SonosMediaPlayer(Player):
     def __init__(self, app, config, media_manager):
         super().__init__(app, config, media_manager)
 
-    def play_media(self, medias):
+    def play_media(self, medias, on_complete=None):
         requires_snapshot = self._requires_snapshot()
         if requires_snapshot:
             # take a snapshot of how sonos entities are joined
@@ -160,31 +170,41 @@ class SonosMediaPlayer(Player):
         self._group_media_players()
 
         master_entity_id = self.player_entity_ids[0]
+        playlist = [(master_entity_id, media_data) for media_data in medias]
 
-        for media_data in medias:
-            self._play_media(master_entity_id, media_data)
+        if not requires_snapshot:
+            self._play_playlist(playlist, on_complete)
+            return
 
-        if requires_snapshot:
+        def restore():
             # wait few seconds before restore
-            self._sleep(2)
+            self.app.after(2, self._restore_snapshot, on_complete)
+
+        self._play_playlist(playlist, restore)
 
+    def _restore_snapshot(self, on_complete):
+        try:
             # restore sonos entities based on snapshot
             self.call_service('sonos/restore', entity_id=self.player_entity_ids, with_group=True)
+        finally:
+            if on_complete is not None:
+                on_complete()
 
-    def _all_player_paused(self):
-        for entity_id in self.player_entity_ids:
-            if self.get_state(entity_id) != 'paused':
+    @staticmethod
+    def _all_player_paused(entities):
+        for entity in entities:
+            if entity is None or entity.get('state') != 'paused':
                 return False
 
         return True
 
     def _requires_snapshot(self):
-        if self._all_player_paused():
+        entities = list(self.get_states(self.player_entity_ids, attribute='all').values())
+
+        if self._all_player_paused(entities):
             self.debug('No snapshot needed: all players paused')
             return False
 
-        entities = [self.get_state(e, attribute='all') for e in self.player_entity_ids]
-
         for entity in entities:
             if entity is None:
                 continue
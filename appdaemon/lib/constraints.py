@@ -1,10 +1,13 @@
 import calendar
-import operator
+import functools
 from datetime import datetime, date
 
 from lib.core.component import Component
-from lib.helper import to_float, flatten_dict, is_float
+from lib.core.constraint_cache import CONSTRAINT_CACHE, MISS, constraint_fingerprint
+from lib.core.dispatch_index import TriggerFilter, exact_match_values
+from lib.core.value_matcher import compile_matcher, EventDataMatcher
 from lib.schedule_job import has_scheduled_job
+from lib.template_renderer import contains_template
 
 
 def get_constraint(app, config):
@@ -33,85 +36,145 @@ def get_constraint(app, config):
         raise ValueError("Invalid constraint config: " + config)
 
 
-def get_operator_fn(op):
-    return {
-        '<': operator.lt,
-        '<=': operator.le,
-        '>': operator.gt,
-        '>=': operator.ge,
-    }[op]
+def get_async_constraint(app, config):
+    """Constraint for an app running on the event loop. State constraints without templates are checked natively,
+    everything else through AsyncConstraintAdapter."""
+    if config['platform'] == 'state' and config.get('last_changed_seconds') is None \
+            and not any(raw is not None and contains_template(raw) for raw in config.values()):
+        return AsyncStateConstraint(app, config)
+
+    return AsyncConstraintAdapter(app, get_constraint(app, config))
 
 
 class Constraint(Component):
+    # False for constraints that only look at the trigger
+    reads_state = True
+
     def __init__(self, app, constraint_config):
         super().__init__(app, constraint_config)
+        self._matcher_settings = {}
+        self._matchers = {}
 
     def check(self, trigger_info):
         raise NotImplementedError()
 
-    def _matches_value(self, expected, actual):
-        if isinstance(expected, list) and len(expected) == 1:
-            expected = expected[0]
-
-        if isinstance(expected, list):
-            matched = actual in expected
-            self.debug('Checking {} in {}? {}'.format(actual, expected, matched))
-            return matched
-
-        if not isinstance(expected, str):
-            matched = expected == actual
-            self.debug('Checking {} == {}? {}'.format(actual, expected, matched))
-            return matched
-
-        if not expected.startswith('<') and not expected.startswith('>'):
-            matched = expected == actual
-            self.debug('Checking {} == {}? {}'.format(actual, expected, matched))
-            return matched
-
-        if expected.startswith('<='):
-            return self._matches_numeric_value('<=', expected, actual)
-        elif expected.startswith('<'):
-            return self._matches_numeric_value('<', expected, actual)
-        elif expected.startswith('>='):
-            return self._matches_numeric_value('>=', expected, actual)
-        elif expected.startswith('>'):
-            return self._matches_numeric_value('>', expected, actual)
-
-        matched = expected == actual
-        self.debug('Fallback, checking {} == {}? {}'.format(actual, expected, matched))
-        return matched
+    def dispatch_filter(self):
+        """Returns a TriggerFilter that every trigger accepted by this constraint satisfies, or None if the
+        constraint can't be described that way."""
+        return None
 
-    def _matches_numeric_value(self, op, expected, actual):
-        expected = expected.replace(op, '')
-        expected = to_float(expected)
-        actual = to_float(actual) if is_float(actual) else None
-        operator_fn = get_operator_fn(op)
+    def _result_fingerprint(self):
+        """CONSTRAINT_CACHE key of this constraint, None if the config has templates."""
+        if self.cfg.has_templates():
+            return None
 
-        if actual is None:
-            self.debug('Checking {} {} {}? {}'.format(actual, op, expected, False))
-            return False
+        return constraint_fingerprint(self.cfg.raw_config)
+
+    def _shared_result(self, fingerprint, entity_ids, evaluate):
+        # constraints with the same config share the result in every app until one of entity_ids changes
+        if fingerprint is None:
+            return evaluate()
+
+        return CONSTRAINT_CACHE.evaluate(fingerprint, entity_ids, evaluate)
+
+    def _static_match_values(self, key):
+        # mirrors how a compiled matcher compares a list config, None if it's not a plain equality/membership check
+        if not self.cfg.is_static(key):
+            return None
+
+        return exact_match_values(self.cfg.list(key, []))
+
+    def _compile_matcher(self, key, default=None, as_list=False, membership=False):
+        """Compiles the expected value of config key once, templated values are compiled on every check instead."""
+        self._matcher_settings[key] = (default, as_list, membership)
+        if self.cfg.raw(key) is None or self.cfg.is_static(key):
+            self._matchers[key] = self._create_matcher(key, default, as_list, membership)
 
-        matched = operator_fn(actual, expected)
-        self.debug('Checking {} {} {}? {}'.format(actual, op, expected, matched))
+    def _matcher(self, key):
+        matcher = self._matchers.get(key)
+        if matcher is not None:
+            return matcher
+
+        return self._create_matcher(key, *self._matcher_settings[key])
+
+    def _create_matcher(self, key, default, as_list, membership):
+        expected = self.cfg.list(key, default) if as_list else self.cfg.value(key, default)
+        return compile_matcher(expected, membership=membership)
+
+    def _matches(self, matcher, actual):
+        matched = matcher.matches(actual)
+        self.debug('Checking {} {} {}? {}', actual, matcher.op, matcher.value, matched)
         return matched
 
 
+class AsyncConstraint(Constraint):
+    """Constraint of an app running on the event loop, check is a coroutine."""
+
+    async def check(self, trigger_info):
+        raise NotImplementedError()
+
+
+class AsyncConstraintAdapter(AsyncConstraint):
+    """Checks a sync constraint for an app running on the event loop. Constraints that only look at the trigger
+    are checked right on the loop, the rest in AppDaemon's executor since their state reads block."""
+
+    def __init__(self, app, constraint):
+        super().__init__(app, constraint.cfg.raw_config)
+        self._constraint = constraint
+        # shares the config, so trigger_info set by the handler reaches the wrapped constraint
+        self._config = constraint.cfg
+        self._on_loop = not constraint.reads_state and not constraint.cfg.has_templates()
+
+    async def check(self, trigger_info):
+        if self._on_loop:
+            return self._constraint.check(trigger_info)
+
+        return await self.app.run_in_executor(self._constraint.check, trigger_info)
+
+    def dispatch_filter(self):
+        return self._constraint.dispatch_filter()
+
+    def __repr__(self):
+        return "{}(constraint={})".format(
+            self.__class__.__name__,
+            self._constraint)
+
+
 class StateConstraint(Constraint):
     def __init__(self, app, constraint_config):
         super().__init__(app, constraint_config)
+        self._compile_matcher('state')
+        self._compile_matcher('last_changed_seconds')
+        # how long ago an entity changed isn't covered by its version
+        if self.cfg.raw('last_changed_seconds') is None:
+            self._fingerprint = self._result_fingerprint()
+        else:
+            self._fingerprint = None
 
     def check(self, trigger_info):
         entity_ids = self.cfg.list('entity_id')
-        state = self.cfg.value('state', None)
+        state = self._matcher('state')
         negate = self.cfg.value('negate', False)
         match_all = self.cfg.value('match_all', False)
-        last_changed_seconds = self.cfg.value('last_changed_seconds', None)
-        return self._check_entity_state(entity_ids, state, negate, match_all, last_changed_seconds)
+        last_changed_seconds = self._matcher('last_changed_seconds')
+        return self._shared_result(self._fingerprint, entity_ids, lambda: self._check_entity_state(
+            entity_ids, state, negate, match_all, last_changed_seconds))
 
     def _check_entity_state(self, entity_ids, target_state, negate, match_all, last_changed_seconds):
+        # match_all has to look at every entity anyway, so fetch them all in one go
+        if match_all and len(entity_ids) > 1:
+            current_state_of = self.get_states(entity_ids).get
+        else:
+            current_state_of = self.get_state
+
+        return self._match_entity_states(entity_ids, current_state_of, target_state, negate, match_all,
+                                         last_changed_seconds)
+
+    def _match_entity_states(self, entity_ids, current_state_of, target_state, negate, match_all,
+                             last_changed_seconds):
         for entity_id in entity_ids:
-            current_state = self.get_state(entity_id)
-            condition = self._matches_value(target_state, current_state)
+            current_state = current_state_of(entity_id)
+            condition = self._matches(target_state, current_state)
 
             if negate is True:
                 condition = not condition
@@ -119,15 +182,15 @@ class StateConstraint(Constraint):
             if match_all and not condition:
                 return False
 
-            if condition and last_changed_seconds is not None:
+            if condition and last_changed_seconds.expected is not None:
                 last_changed = self.int_state(entity_id, attribute='last_changed')
                 delta = datetime.now() - last_changed
-                condition = self._matches_value(last_changed_seconds, delta.total_seconds)
+                condition = self._matches(last_changed_seconds, delta.total_seconds)
 
             if not match_all and condition:
                 self.debug('state constraint matched, entity_id={} '
                            'target_state={} '
-                           'negate={}'.format(entity_id, target_state, negate))
+                           'negate={}', entity_id, target_state.expected, negate)
                 return condition
 
         if match_all:
@@ -135,61 +198,97 @@ class StateConstraint(Constraint):
 
         self.debug('no state constraint matched, entity_ids={} '
                    'target_state={} '
-                   'negate={}'.format(entity_ids, target_state, negate))
+                   'negate={}', entity_ids, target_state.expected, negate)
 
         return False
 
 
+class AsyncStateConstraint(AsyncConstraint, StateConstraint):
+    async def check(self, trigger_info):
+        entity_ids = self.cfg.list('entity_id')
+        # get_async_constraint only creates these without templates and last_changed_seconds
+        versions = CONSTRAINT_CACHE.versions(entity_ids)
+        result = CONSTRAINT_CACHE.lookup(self._fingerprint, versions)
+        if result is not MISS:
+            return result
+
+        # reads are cheap on the loop, so every entity is fetched up front instead of stopping at the first match
+        current_states = await self.get_states(entity_ids)
+        result = self._match_entity_states(entity_ids, current_states.get, self._matcher('state'),
+                                           self.cfg.value('negate', False), self.cfg.value('match_all', False),
+                                           self._matcher('last_changed_seconds'))
+        CONSTRAINT_CACHE.store(self._fingerprint, versions, result)
+        return result
+
+
 class TemplateConstraint(Constraint):
     def __init__(self, app, constraint_config):
         super().__init__(app, constraint_config)
+        self._compile_matcher('expected_value')
 
     def check(self, trigger_info):
-        expected_value = self.cfg.value('expected_value', None)
+        expected_value = self._matcher('expected_value')
         actual_value = self.cfg.value('template', None)
-        matched = self._matches_value(expected_value, actual_value)
+        matched = self._matches(expected_value, actual_value)
 
-        self.debug('Evaluating template={} with \n expected_value={} and \n actual_value={}, \n matching={}'.format(
-            self.cfg.raw('template'),
-            expected_value,
-            actual_value,
-            matched))
+        self.debug('Evaluating template={} with \n expected_value={} and \n actual_value={}, \n matching={}',
+                   self.cfg.raw('template'),
+                   expected_value.expected,
+                   actual_value,
+                   matched)
 
         return matched
 
 
 class TriggeredStateConstraint(Constraint):
+    reads_state = False
+
     def __init__(self, app, constraint_config):
         super().__init__(app, constraint_config)
 
+        for key in ['entity_id', 'attribute', 'from', 'to']:
+            self._compile_matcher(key, default=[], as_list=True)
+
     def check(self, trigger_info):
         if trigger_info.platform != "state":
             return False
 
         triggered = trigger_info.data
 
-        entity_id = self.cfg.list('entity_id', [])
-        if entity_id and not self._matches_value(entity_id, triggered.get('entity_id')):
-            return False
+        for key in ['entity_id', 'attribute', 'from', 'to']:
+            matcher = self._matcher(key)
+            if matcher.expected and not self._matches(matcher, triggered.get(key)):
+                return False
 
-        attribute = self.cfg.list('attribute', [])
-        if attribute and not self._matches_value(attribute, triggered.get('attribute')):
-            return False
+        return True
 
-        from_state = self.cfg.list('from', [])
-        if from_state and not self._matches_value(from_state, triggered.get('from')):
-            return False
+    def dispatch_filter(self):
+        conditions = {}
+        for key, field in [('entity_id', 'entity_id'), ('attribute', 'attribute'), ('from', 'from'), ('to', 'to')]:
+            if self.cfg.raw(key) is None:
+                continue
 
-        to_state = self.cfg.list('to', [])
-        if to_state and not self._matches_value(to_state, triggered.get('to')):
-            return False
+            values = self._static_match_values(key)
+            if values is None:
+                return None
 
-        return True
+            if values:
+                conditions[field] = values
+
+        return TriggerFilter('state', conditions)
 
 
 class TriggeredEventConstraint(Constraint):
+    reads_state = False
+
     def __init__(self, app, constraint_config):
         super().__init__(app, constraint_config)
+        self._compile_matcher('entity_id', default=[], as_list=True, membership=True)
+        self._compile_matcher('event_name', default=[], as_list=True, membership=True)
+
+        self._event_data_matcher = None
+        if self.cfg.raw('event_data') is None or self.cfg.is_static('event_data'):
+            self._event_data_matcher = self._create_event_data_matcher()
 
     def check(self, trigger_info):
         if trigger_info.platform != "event":
@@ -202,13 +301,35 @@ class TriggeredEventConstraint(Constraint):
 
         return result
 
+    def dispatch_filter(self):
+        if self.cfg.raw('negate') is not None and (not self.cfg.is_static('negate') or self.cfg.value('negate')):
+            return None
+
+        conditions = {}
+        for key in ['entity_id', 'event_name']:
+            if self.cfg.raw(key) is None:
+                continue
+
+            if not self.cfg.is_static(key):
+                return None
+
+            # check_event always does a membership check, even for a single value
+            values = exact_match_values(self.cfg.list(key, []), numeric_operators=False)
+            if values is None:
+                return None
+
+            if values:
+                conditions[key] = values
+
+        return TriggerFilter('event', conditions)
+
     def check_event(self, event):
-        entity_id = self.cfg.list('entity_id', [])
-        if entity_id and event.get('entity_id') not in entity_id:
+        entity_id = self._matcher('entity_id')
+        if entity_id.expected and not entity_id.matches(event.get('entity_id')):
             return False
 
-        event_name = self.cfg.list('event_name', [])
-        if event_name and event.get('event_name') not in event_name:
+        event_name = self._matcher('event_name')
+        if event_name.expected and not event_name.matches(event.get('event_name')):
             return False
 
         if not self.check_event_data(event.get('data', {})):
@@ -217,33 +338,22 @@ class TriggeredEventConstraint(Constraint):
         return True
 
     def check_event_data(self, event_data):
-        default = {}
-        expected_event_data = flatten_dict(self.cfg.value("event_data", default))
-        if not expected_event_data:
-            return True
-
-        event_data = flatten_dict(event_data)
-
-        for key, expected in expected_event_data.items():
-            actual = event_data.get(key)
-            if not self._match_value(expected, actual):
-                self.debug('Key={} has mismatched value => {} != {}'.format(key, expected, actual))
-                return False
+        matcher = self._event_data_matcher or self._create_event_data_matcher()
+        mismatch = matcher.mismatch(event_data)
+        if mismatch is not None:
+            self.debug('Key={} has mismatched value => {} != {}', *mismatch)
+            return False
 
         return True
 
-    @staticmethod
-    def _match_value(expected, actual):
-        if expected == actual:
-            return True
-
-        if isinstance(expected, list) and not isinstance(actual, list):
-            return actual in expected
-
-        return False
+    def _create_event_data_matcher(self):
+        default = {}
+        return EventDataMatcher(self.cfg.value("event_data", default))
 
 
 class TriggeredActionConstraint(Constraint):
+    reads_state = False
+
     def __init__(self, app, constraint_config):
         super().__init__(app, constraint_config)
 
@@ -256,35 +366,56 @@ class TriggeredActionConstraint(Constraint):
         action_name = self.cfg.value('action_name', None)
         return action_name == action['action_name']
 
+    def dispatch_filter(self):
+        if self.cfg.raw('action_name') is not None and not self.cfg.is_static('action_name'):
+            return None
+
+        values = exact_match_values([self.cfg.value('action_name', None)], numeric_operators=False)
+        if values is None:
+            return None
+
+        return TriggerFilter('action', {'action_name': values})
+
 
 class TriggeredTimeConstraint(Constraint):
+    reads_state = False
+
     def __init__(self, app, constraint_config):
         super().__init__(app, constraint_config)
+        self._compile_matcher('time', as_list=True)
 
     def check(self, trigger_info):
         if trigger_info.platform != "time":
             return False
 
         triggered = trigger_info.data
-        expected_times = self.cfg.list('time')
-        matched = self._matches_value(expected_times, triggered['time'])
+        expected_times = self._matcher('time')
+        matched = self._matches(expected_times, triggered['time'])
 
-        self.debug('Checking {} matches {}? {}'.format(triggered['time'], expected_times, matched))
+        self.debug('Checking {} matches {}? {}', triggered['time'], expected_times.expected, matched)
 
         return matched
 
+    def dispatch_filter(self):
+        return TriggerFilter('time', {})
+
 
 class AttributeConstraint(Constraint):
     def __init__(self, app, constraint_config):
         super().__init__(app, constraint_config)
+        self._compile_matcher('value')
+        self._fingerprint = self._result_fingerprint()
 
     def check(self, trigger_info):
         entity_id = self.cfg.value('entity_id', None)
+        return self._shared_result(self._fingerprint, [entity_id], lambda: self._check_attribute(entity_id))
+
+    def _check_attribute(self, entity_id):
         attribute = self.cfg.value('attribute', None)
-        value = self.cfg.value('value', None)
+        value = self._matcher('value')
         negate = self.cfg.value('negate', False)
         current_value = self.get_state(entity_id, attribute=attribute)
-        condition = self._matches_value(value, current_value)
+        condition = self._matches(value, current_value)
 
         if negate is True:
             return not condition
@@ -292,6 +423,12 @@ class AttributeConstraint(Constraint):
         return condition
 
 
+@functools.lru_cache(maxsize=256)
+def _parse_entity_datetime(value):
+    # input_datetime states only change when someone sets them, most checks parse a value seen before
+    return datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+
+
 class TimeConstraint(Constraint):
     def __init__(self, app, constraint_config):
         super().__init__(app, constraint_config)
@@ -307,12 +444,12 @@ class TimeConstraint(Constraint):
         end_time = self.get_state(self.cfg.value('end_time_entity_id', None))
 
         if start_time and end_time:
-            start_time = datetime.strptime(start_time, '%Y-%m-%d %H:%M:%S')
-            end_time = datetime.strptime(end_time, '%Y-%m-%d %H:%M:%S')
-            return start_time <= datetime.now() < end_time
+            return _parse_entity_datetime(start_time) <= datetime.now() < _parse_entity_datetime(end_time)
 
 
 class HasScheduledJobConstraint(Constraint):
+    reads_state = False
+
     def __init__(self, app, constraint_config):
         super().__init__(app, constraint_config)
 
@@ -327,6 +464,8 @@ class HasScheduledJobConstraint(Constraint):
 
 
 class DayOfWeekConstraint(Constraint):
+    reads_state = False
+
     def __init__(self, app, constraint_config):
         super().__init__(app, constraint_config)
 
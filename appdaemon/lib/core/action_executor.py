@@ -0,0 +1,154 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+DEFAULT_MAX_WORKERS = 6
+DEFAULT_MAX_WORKERS_PER_APP = 3
+
+
+class ActionExecutor:
+    """Process-wide pool used to run an app's actions in parallel.
+
+    A task only goes to the pool when there is an idle worker and its app is under its per-app limit, otherwise the
+    calling thread runs it itself. This keeps the number of threads bounded, stops one busy app from taking every
+    worker, and means nested do_actions calls (e.g. an action that triggers another app) can never deadlock the pool.
+
+    There is no queue in front of the pool, the overflow waits in the calling threads instead. caller_backlog counts
+    the tasks that are waiting there for their caller to get to them, ran_in_caller how many overflowed in total.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        self._max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._running = 0
+        # submitted to an idle worker that hasn't picked the task up yet
+        self._starting = 0
+        self._caller_backlog = 0
+        self._running_by_app = {}
+        self._stats = {
+            'submitted': 0,
+            'ran_in_caller': 0,
+            'max_caller_backlog': 0,
+            'max_running': 0,
+        }
+
+    @property
+    def max_workers(self):
+        return self._max_workers
+
+    def configure(self, max_workers):
+        if max_workers is None or max_workers == self._max_workers:
+            return
+
+        with self._lock:
+            if self._executor is not None:
+                # threads that are already running finish their work on the old pool
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+            self._max_workers = max_workers
+
+    def run_all(self, app_name, fn, items, *args, max_workers_per_app=DEFAULT_MAX_WORKERS_PER_APP):
+        """Calls fn(item, *args) for every item in parallel and returns once all of them are done."""
+        if not items:
+            return
+
+        # the calling thread would otherwise sit idle, so it always takes the first item itself
+        futures = []
+        in_caller = [items[0]]
+
+        for item in items[1:]:
+            future = self._try_submit(app_name, max_workers_per_app, fn, item, *args)
+            if future is None:
+                in_caller.append(item)
+            else:
+                futures.append(future)
+
+        overflow = len(in_caller) - 1
+        if overflow:
+            with self._lock:
+                self._caller_backlog += overflow
+                self._stats['max_caller_backlog'] = max(self._stats['max_caller_backlog'], self._caller_backlog)
+
+        try:
+            for index, item in enumerate(in_caller):
+                if index:
+                    with self._lock:
+                        self._caller_backlog -= 1
+                    overflow -= 1
+                fn(item, *args)
+        finally:
+            if overflow:
+                # an item raised, the ones after it are not going to run
+                with self._lock:
+                    self._caller_backlog -= overflow
+
+        done, _ = wait(futures)
+        for future in done:
+            future.result()
+
+    def _try_submit(self, app_name, max_workers_per_app, fn, item, *args):
+        if getattr(self._local, 'is_worker', False):
+            # already on one of our workers, waiting on the pool from here could starve it
+            return self._run_in_caller()
+
+        with self._lock:
+            app_running = self._running_by_app.get(app_name, 0)
+            if self._running + self._starting >= self._max_workers or app_running >= max_workers_per_app:
+                return self._run_in_caller(locked=True)
+
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers,
+                                                    thread_name_prefix='action_executor')
+
+            self._starting += 1
+            self._running_by_app[app_name] = app_running + 1
+            self._stats['submitted'] += 1
+
+            return self._executor.submit(self._run, app_name, fn, item, *args)
+
+    def _run_in_caller(self, locked=False):
+        if locked:
+            self._stats['ran_in_caller'] += 1
+        else:
+            with self._lock:
+                self._stats['ran_in_caller'] += 1
+
+        return None
+
+    def _run(self, app_name, fn, item, *args):
+        with self._lock:
+            self._starting -= 1
+            self._running += 1
+            self._stats['max_running'] = max(self._stats['max_running'], self._running)
+
+        self._local.is_worker = True
+        try:
+            return fn(item, *args)
+        finally:
+            self._local.is_worker = False
+
+            with self._lock:
+                self._running -= 1
+                self._running_by_app[app_name] -= 1
+                if not self._running_by_app[app_name]:
+                    del self._running_by_app[app_name]
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                'max_workers': self._max_workers,
+                'running': self._running,
+                'caller_backlog': self._caller_backlog,
+                'running_by_app': dict(self._running_by_app),
+            }
+
+    def __repr__(self):
+        return "{}(stats={})".format(
+            self.__class__.__name__,
+            self.stats())
+
+
+ACTION_EXECUTOR = ActionExecutor()
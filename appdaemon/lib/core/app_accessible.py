@@ -21,23 +21,29 @@ class AppAccessible:
     def get_state(self, entity=None, **kwargs):
         return self.app.get_state(entity, **kwargs)
 
+    def get_states(self, entity_ids, attribute=None):
+        return self.app.get_states(entity_ids, attribute=attribute)
+
+    def state_is(self, entity_id, state):
+        return self.app.state_is(entity_id, state)
+
     def set_state(self, entity_id, **kwargs):
         self.app.set_state(entity_id, **kwargs)
 
     def call_service(self, service, **kwargs):
-        self.app.call_service(service, **kwargs)
+        return self.app.call_service(service, **kwargs)
 
     def select_option(self, entity_id, option, **kwargs):
         self.app.select_option(entity_id, option, **kwargs)
 
-    def log(self, msg, level="INFO"):
-        return self.app.log(msg, level=level)
+    def log(self, msg, *args, level="INFO"):
+        return self.app.log(msg, *args, level=level)
 
-    def debug(self, msg):
-        return self.log(msg, level='DEBUG')
+    def debug(self, msg, *args):
+        return self.log(msg, *args, level='DEBUG')
 
-    def warn(self, msg):
-        return self.log(msg, level='WARNING')
+    def warn(self, msg, *args):
+        return self.log(msg, *args, level='WARNING')
 
-    def error(self, msg):
-        return self.log(msg, level='ERROR')
+    def error(self, msg, *args):
+        return self.log(msg, *args, level='ERROR')
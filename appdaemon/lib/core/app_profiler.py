@@ -0,0 +1,208 @@
+import cProfile
+import os
+import pstats
+import threading
+import time
+
+
+class _NoProfiling:
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        return False
+
+
+NO_PROFILING = _NoProfiling()
+
+# whether a profiler is enabled on the current thread, a callback nested in a profiled one is part of its profile
+_profiling = threading.local()
+
+
+class _Profiling:
+    """Runs one callback under its own cProfile.Profile, merged into the session when it returns. Each call gets a
+    Profile of its own as worker threads run callbacks of the same app concurrently."""
+
+    __slots__ = ['_session', '_profile']
+
+    def __init__(self, session):
+        self._session = session
+        self._profile = None
+
+    def __enter__(self):
+        if getattr(_profiling, 'active', False):
+            return self
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows one enabled profiler per process, a concurrent callback runs unprofiled
+            return self
+
+        _profiling.active = True
+        self._profile = profile
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if self._profile is not None:
+            self._profile.disable()
+            _profiling.active = False
+            self._session.merge(self._profile)
+        return False
+
+
+class _ProfileSession:
+    """Profiles of the callbacks of one app, from profile_entity_id turning on until it turns off."""
+
+    def __init__(self, app_name):
+        self.app_name = app_name
+        self.started_at = time.time()
+        self.callbacks = 0
+        self._lock = threading.Lock()
+        self._stats = None
+
+    def merge(self, profile):
+        with self._lock:
+            self.callbacks += 1
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+
+    def dump(self, directory):
+        """Writes the merged stats to directory, returns the file's path or None when nothing was profiled."""
+        with self._lock:
+            if self._stats is None:
+                return None
+
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, '{}-{}.pstats'.format(
+                self.app_name,
+                time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started_at))))
+            self._stats.dump_stats(path)
+            return path
+
+
+class _AppProfile:
+    """Follows profile_entity_id of one app, profiles its callbacks while the entity is on."""
+
+    def __init__(self, profiler, app, entity_id, directory):
+        self._profiler = profiler
+        self.app = app
+        self.entity_id = entity_id
+        self.directory = directory
+        self.session = None
+
+    def profile_entity_handler(self, entity, attribute, old, new, kwargs):
+        if new == 'on':
+            self.start()
+        elif new == 'off':
+            self.stop()
+
+    def start(self):
+        if self.session is not None:
+            return
+
+        self.session = _ProfileSession(self.app.name)
+        self._profiler.sessions_started += 1
+        self.app.log('Profiling callbacks, {} is on', self.entity_id)
+
+    def stop(self):
+        session = self.session
+        if session is None:
+            return
+
+        # callbacks still running merge into the closed session, which is not written again
+        self.session = None
+        try:
+            path = session.dump(self.directory)
+        except Exception as e:
+            self.app.error('Error when writing profile of {} callbacks: {}'.format(session.callbacks, e))
+            return
+
+        if path is not None:
+            self._profiler.profiles_written += 1
+        self.app.log('Profiled {} callbacks, stats written to {}', session.callbacks, path)
+
+
+class AppProfiler:
+    """Profiles the callbacks of an app with cProfile while the input_boolean in its profile_entity_id is on, and
+    writes the merged pstats to profile_dir when it turns off. profile_dir is set per app or in appdaemon.yaml.
+
+    monitored_callback, do_action and do_async_action ask for profiling() around every callback, for an app that
+    isn't being profiled that's a dict lookup. Coroutine callbacks are not profiled, the event loop thread runs
+    everything else in between their awaits. Async actions are, what the loop runs in between is in their profile.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profiles = {}
+        self.sessions_started = 0
+        self.profiles_written = 0
+
+    def profiling(self, app):
+        """Context manager profiling a callback of app into its running session, a no-op when there is none."""
+        profile = app.__dict__.get('_app_profile')
+        if profile is None:
+            profile = self._attach(app)
+
+        if not profile or profile.session is None:
+            return NO_PROFILING
+
+        return _Profiling(profile.session)
+
+    def _attach(self, app):
+        with self._lock:
+            profile = app.__dict__.get('_app_profile')
+            if profile is not None:
+                return profile
+
+            # False marks apps without profile_entity_id, so they are only looked at once
+            profile = False
+            args = app.__dict__.get('args') or {}
+            entity_id = args.get('profile_entity_id')
+            if entity_id:
+                ad_config = app.__dict__.get('config') or {}
+                directory = args.get('profile_dir') or ad_config.get('profile_dir') or 'profiles'
+                profile = _AppProfile(self, app, entity_id, directory)
+                self._profiles[app.name] = profile
+
+            app._app_profile = profile
+
+        if profile:
+            app.listen_state(profile.profile_entity_handler, entity_id)
+            if app.get_state(entity_id) == 'on':
+                profile.start()
+
+        return profile
+
+    def detach(self, app):
+        """Writes the running session of app, if any, when the app terminates."""
+        profile = app.__dict__.get('_app_profile')
+        if not profile:
+            return
+
+        profile.stop()
+        with self._lock:
+            if self._profiles.get(app.name) is profile:
+                del self._profiles[app.name]
+
+    def stats(self):
+        profiles = list(self._profiles.values())
+        return {
+            'watched_apps': len(profiles),
+            'profiling_apps': sorted(profile.app.name for profile in profiles if profile.session is not None),
+            'sessions_started': self.sessions_started,
+            'profiles_written': self.profiles_written,
+        }
+
+    def __repr__(self):
+        return "{}(stats={})".format(
+            self.__class__.__name__,
+            self.stats())
+
+
+APP_PROFILER = AppProfiler()
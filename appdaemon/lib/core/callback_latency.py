@@ -0,0 +1,167 @@
+import bisect
+import threading
+import time
+from array import array
+
+# upper bounds of the histogram buckets, the last bucket counts everything slower
+BUCKET_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+# how long the slowest call of a callback is kept before any slower than usual call replaces it
+SLOWEST_WINDOW = 15 * 60
+MAX_ARGS_LENGTH = 300
+
+_BOUNDS_SECONDS = tuple(bound / 1000 for bound in BUCKET_BOUNDS_MS)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+class LatencyHistogram:
+    """Durations counted into the fixed BUCKET_BOUNDS_MS buckets, recording one is a bisect and a few increments
+    of preallocated arrays. Percentiles are the upper bound of the bucket they fall in."""
+
+    def __init__(self):
+        self.counts = array('Q', [0] * (len(BUCKET_BOUNDS_MS) + 1))
+        # total seconds, slowest seconds
+        self.totals = array('d', [0.0, 0.0])
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(_BOUNDS_SECONDS, seconds)] += 1
+        totals = self.totals
+        totals[0] += seconds
+        if seconds > totals[1]:
+            totals[1] = seconds
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.totals[0] += other.totals[0]
+        self.totals[1] = max(self.totals[1], other.totals[1])
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def percentile(self, percentile):
+        """Upper bound in milliseconds of the bucket percentile falls in, the slowest duration for the last bucket."""
+        count = self.count
+        if not count:
+            return None
+
+        rank = percentile / 100 * count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                if i < len(BUCKET_BOUNDS_MS):
+                    return min(BUCKET_BOUNDS_MS[i], _ms(self.totals[1]))
+                break
+
+        return _ms(self.totals[1])
+
+    def summary(self):
+        count = self.count
+        return {
+            'count': count,
+            'mean_ms': _ms(self.totals[0] / count) if count else None,
+            'max_ms': _ms(self.totals[1]),
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'histogram': list(self.counts),
+        }
+
+
+class CallbackLatency:
+    """Wall clock and CPU time of one monitored callback of one app."""
+
+    def __init__(self, app_name, callback_name):
+        self.app_name = app_name
+        self.callback_name = callback_name
+        self.wall = LatencyHistogram()
+        self.cpu = LatencyHistogram()
+        self.errors = 0
+        self._lock = threading.Lock()
+        # wall seconds, time.time() and arguments of the slowest call within SLOWEST_WINDOW
+        self._slowest = (0.0, 0.0, None)
+
+    def record(self, wall, cpu, args, failed):
+        """cpu is None for coroutine callbacks, their thread also runs everything else on the event loop."""
+        with self._lock:
+            self.wall.record(wall)
+            if cpu is not None:
+                self.cpu.record(cpu)
+            if failed:
+                self.errors += 1
+
+            slowest_wall, slowest_at, _ = self._slowest
+            if wall > slowest_wall or time.time() - slowest_at > SLOWEST_WINDOW:
+                self._slowest = (wall, time.time(), args)
+
+    def stats(self):
+        with self._lock:
+            slowest_wall, slowest_at, args = self._slowest
+            stats = {
+                'errors': self.errors,
+                'wall': self.wall.summary(),
+                'cpu': self.cpu.summary(),
+            }
+
+        if args is not None:
+            stats['slowest'] = {
+                'wall_ms': _ms(slowest_wall),
+                'at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(slowest_at)),
+                # the callback arguments after the app, e.g. entity, attribute, old, new, kwargs
+                'trigger_info': repr(args)[:MAX_ARGS_LENGTH],
+            }
+
+        return stats
+
+
+class CallbackLatencies:
+    """Process-wide CallbackLatency of every monitored_callback, per app and callback name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies = {}
+
+    def latency(self, app_name, callback_name):
+        key = (app_name, callback_name)
+        latency = self._latencies.get(key)
+        if latency is None:
+            with self._lock:
+                latency = self._latencies.setdefault(key, CallbackLatency(app_name, callback_name))
+
+        return latency
+
+    def stats(self):
+        callbacks = {}
+        apps = {}
+        for (app_name, callback_name), latency in list(self._latencies.items()):
+            callbacks['{}.{}'.format(app_name, callback_name)] = latency.stats()
+
+            app_wall = apps.setdefault(app_name, LatencyHistogram())
+            app_wall.merge(latency.wall)
+
+        return {
+            'buckets_ms': list(BUCKET_BOUNDS_MS),
+            'apps': {app_name: wall.summary() for app_name, wall in apps.items()},
+            'callbacks': callbacks,
+        }
+
+    def slowest(self, limit=10):
+        """Summaries of the limit callbacks with the highest p95 wall clock time."""
+        summaries = [
+            ('{}.{}'.format(latency.app_name, latency.callback_name), latency.wall.summary())
+            for latency in list(self._latencies.values())
+        ]
+        summaries.sort(key=lambda summary: summary[1]['p95_ms'] or 0, reverse=True)
+        return summaries[:limit]
+
+    def __repr__(self):
+        return "{}(callbacks={})".format(
+            self.__class__.__name__,
+            len(self._latencies))
+
+
+CALLBACK_LATENCIES = CallbackLatencies()
@@ -23,12 +23,12 @@ class Component(AppAccessible):
     @property
     def is_sleeping_time(self):
         sleeping_time_entity_id = self.cfg.value('sleeping_time_entity_id', 'binary_sensor.sleeping_time')
-        return self.get_state(sleeping_time_entity_id) == 'on'
+        return self.state_is(sleeping_time_entity_id, 'on')
 
     @property
     def is_midnight_time(self):
         midnight_time_entity_id = self.cfg.value('midnight_time_entity_id', 'binary_sensor.midnight_time')
-        return self.get_state(midnight_time_entity_id) == 'on'
+        return self.state_is(midnight_time_entity_id, 'on')
 
     @property
     def is_sun_down(self):
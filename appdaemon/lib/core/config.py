@@ -1,5 +1,15 @@
 from lib.helper import to_int, to_float
-from lib.template_renderer import TemplateRenderer
+from lib.template_renderer import TemplateRenderer, contains_template
+
+
+def _copy_static_value(value):
+    # mirrors the containers built by _to_dict/_to_list so callers can keep mutating what they get back
+    if isinstance(value, dict):
+        return {k: _copy_static_value(v) for k, v in value.items()}
+    elif isinstance(value, list):
+        return [_copy_static_value(v) for v in value]
+
+    return value
 
 
 class Config:
@@ -8,6 +18,16 @@ class Config:
         self._config_dict = config_dict
         self._trigger_info = None
 
+        # keys without any template are resolved once here, templated keys are rendered on every access
+        self._static_values = {}
+        self._static_lists = {}
+        for key, raw in config_dict.items():
+            if raw is None or contains_template(raw):
+                continue
+
+            self._static_values[key] = self._resolve_value(raw)
+            self._static_lists[key] = self._resolve_list(self._static_values[key])
+
     @property
     def trigger_info(self):
         return self._trigger_info
@@ -16,20 +36,22 @@ class Config:
     def trigger_info(self, value):
         self._trigger_info = value
 
+    @property
+    def raw_config(self):
+        return self._config_dict
+
     def raw(self, key, default=None):
         return self._config_dict.get(key, default)
 
     def value(self, key, default=None):
+        if key in self._static_values:
+            return _copy_static_value(self._static_values[key])
+
         raw = self.raw(key)
         if raw is None:
             return default
 
-        if isinstance(raw, dict):
-            return self._to_dict(raw)
-        elif isinstance(raw, list):
-            return self._to_list(raw)
-
-        return self._to_template_value(raw)
+        return self._resolve_value(raw)
 
     def int(self, key, default=None):
         value = self.value(key)
@@ -39,6 +61,21 @@ class Config:
         value = self.value(key)
         return to_float(value, default)
 
+    def is_static(self, key):
+        return key in self._static_values
+
+    def has_templates(self):
+        """Whether any value is rendered on access, rendering may read state."""
+        return any(raw is not None and key not in self._static_values for key, raw in self._config_dict.items())
+
+    def _resolve_value(self, raw):
+        if isinstance(raw, dict):
+            return self._to_dict(raw)
+        elif isinstance(raw, list):
+            return self._to_list(raw)
+
+        return self._to_template_value(raw)
+
     def _to_dict(self, dict_value):
         applied = {}
         for k, v in dict_value.items():
@@ -56,10 +93,16 @@ class Config:
         return applied
 
     def list(self, key, default=None):
+        if key in self._static_lists:
+            return _copy_static_value(self._static_lists[key])
+
         value = self.value(key)
         if value is None:
             return default
 
+        return self._resolve_list(value)
+
+    def _resolve_list(self, value):
         if isinstance(value, list):
             return self._flatten_list_config(value)
 
@@ -0,0 +1,93 @@
+import json
+
+from lib.core.state_mirror import STATE_MIRROR
+
+# returned by lookup() when there's no usable result, None and False are valid results
+MISS = object()
+
+
+def constraint_fingerprint(config):
+    """Key of a constraint config, two constraints with equal configs get the same result from the same states."""
+    return json.dumps(config, sort_keys=True, default=str)
+
+
+class ConstraintCache:
+    """Process-wide results of constraint checks, shared by every app.
+
+    A result is stored with the STATE_MIRROR versions of the entities it was computed from and reused until one of
+    them changes version, so a state change invalidates every result depending on it without anything having to
+    listen for it. Versions are read before evaluating, a change that lands while evaluating makes the stored
+    result look stale rather than the other way around. While the mirror isn't live there are no versions to
+    compare and every check is evaluated.
+
+    Only constraints whose result depends on nothing but the states of their entities belong here, templates,
+    trigger info and elapsed time are not covered by the versions. There is one entry per distinct constraint
+    config, so the cache doesn't need evicting.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'invalidated': 0,
+            'bypassed': 0,
+        }
+
+    def versions(self, entity_ids):
+        """Current versions of entity_ids, None while the mirror isn't live."""
+        if not STATE_MIRROR.is_live:
+            return None
+
+        return tuple(STATE_MIRROR.version(entity_id) for entity_id in entity_ids)
+
+    def lookup(self, fingerprint, versions):
+        """Result stored for fingerprint at versions, MISS if there's none."""
+        if versions is None:
+            self._stats['bypassed'] += 1
+            return MISS
+
+        entry = self._entries.get(fingerprint)
+        if entry is None:
+            self._stats['misses'] += 1
+            return MISS
+
+        if entry[0] != versions:
+            self._stats['invalidated'] += 1
+            return MISS
+
+        self._stats['hits'] += 1
+        return entry[1]
+
+    def store(self, fingerprint, versions, result):
+        if versions is not None:
+            self._entries[fingerprint] = (versions, result)
+
+    def evaluate(self, fingerprint, entity_ids, evaluate):
+        """Returns evaluate() computed from the current states of entity_ids, reusing a stored result if they
+        haven't changed since."""
+        versions = self.versions(entity_ids)
+        result = self.lookup(fingerprint, versions)
+        if result is MISS:
+            result = evaluate()
+            self.store(fingerprint, versions, result)
+
+        return result
+
+    def clear(self):
+        self._entries = {}
+
+    def stats(self):
+        stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses'] + stats['invalidated']
+        stats['entries'] = len(self._entries)
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+        return stats
+
+    def __repr__(self):
+        return "{}(stats={})".format(
+            self.__class__.__name__,
+            self.stats())
+
+
+CONSTRAINT_CACHE = ConstraintCache()
@@ -0,0 +1,138 @@
+import heapq
+
+# trigger data fields a handler is indexed by, first one present in its filter wins
+INDEX_FIELDS = ['entity_id', 'action_name', 'event_name']
+
+
+def exact_match_values(values, numeric_operators=True):
+    """Returns values as a frozenset when matching them is a plain equality/membership check, None otherwise.
+
+    With numeric_operators, a single '<x'/'>x' value is a numeric comparison (see Constraint._matches_value) and
+    can't be indexed.
+    """
+    if numeric_operators and len(values) == 1:
+        value = values[0]
+        if isinstance(value, str) and (value.startswith('<') or value.startswith('>')):
+            return None
+
+    try:
+        return frozenset(values)
+    except TypeError:
+        return None
+
+
+class TriggerFilter:
+    """Necessary condition on a TriggerInfo: its platform and, for each field, the values trigger_info.data[field]
+    has to be one of."""
+
+    def __init__(self, platform, conditions):
+        self._platform = platform
+        self._conditions = conditions
+
+    @property
+    def platform(self):
+        return self._platform
+
+    @property
+    def conditions(self):
+        return self._conditions
+
+    def merge(self, other):
+        if other.platform != self._platform:
+            return None
+
+        conditions = dict(self._conditions)
+        for field, values in other.conditions.items():
+            conditions[field] = conditions[field] & values if field in conditions else values
+
+        return TriggerFilter(self._platform, conditions)
+
+    def matches(self, trigger_info):
+        if trigger_info.platform != self._platform:
+            return False
+
+        data = trigger_info.data
+        for field, values in self._conditions.items():
+            try:
+                if data.get(field) not in values:
+                    return False
+            except TypeError:
+                # unhashable value can't be equal to any of the (hashable) expected values
+                return False
+
+        return True
+
+    def __repr__(self):
+        return "{}(platform={}, conditions={})".format(
+            self.__class__.__name__,
+            self._platform,
+            self._conditions)
+
+
+class DispatchIndex:
+    """Maps a trigger to the handlers that could possibly match it, in their original order.
+
+    Each handler is described by the TriggerFilter of its leading triggered_* constraints. Only leading ones are
+    used so a handler is never skipped when evaluating it would have run (and possibly raised in) a constraint
+    before the one that rules it out. Handlers without a filter are always candidates.
+    """
+
+    def __init__(self, handlers):
+        self._handlers = list(handlers)
+        self._filters = []
+        self._unfiltered = []
+        self._by_platform = {}
+        self._by_value = {}
+
+        for position, handler in enumerate(self._handlers):
+            trigger_filter = handler.dispatch_filter()
+            self._filters.append(trigger_filter)
+
+            if trigger_filter is None:
+                self._unfiltered.append(position)
+                continue
+
+            field = next((f for f in INDEX_FIELDS if f in trigger_filter.conditions), None)
+            if field is None:
+                self._by_platform.setdefault(trigger_filter.platform, []).append(position)
+                continue
+
+            for value in trigger_filter.conditions[field]:
+                self._by_value.setdefault((trigger_filter.platform, field, value), []).append(position)
+
+    def __len__(self):
+        return len(self._handlers)
+
+    def candidates(self, trigger_info):
+        positions = [self._unfiltered, self._by_platform.get(trigger_info.platform, [])]
+
+        data = trigger_info.data
+        if isinstance(data, dict):
+            for field in INDEX_FIELDS:
+                try:
+                    positions.append(self._by_value.get((trigger_info.platform, field, data.get(field)), []))
+                except TypeError:
+                    continue
+
+        last = None
+        for position in heapq.merge(*positions):
+            if position == last:
+                continue
+            last = position
+
+            trigger_filter = self._filters[position]
+            if trigger_filter is None or trigger_filter.matches(trigger_info):
+                yield self._handlers[position]
+
+    def stats(self):
+        return {
+            'handlers': len(self._handlers),
+            'unfiltered': len(self._unfiltered),
+            'by_platform': sum(len(p) for p in self._by_platform.values()),
+            'by_value': len(self._by_value),
+        }
+
+    def __repr__(self):
+        return "{}(stats={})".format(
+            self.__class__.__name__,
+            self.stats())
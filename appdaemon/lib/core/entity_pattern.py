@@ -0,0 +1,97 @@
+import fnmatch
+import re
+import threading
+
+
+def entity_pattern_regex(pattern):
+    """Regular expression of an entity pattern from config, one starting with ^ already is one (like the patterns
+    DeviceMonitor takes), anything else is a glob such as "binary_sensor.*_motion"."""
+    if pattern.startswith('^'):
+        return pattern
+
+    return fnmatch.translate(pattern)
+
+
+class EntityPatternIndex:
+    """Finds the items whose regular expression matches an entity_id.
+
+    All expressions are combined into a single alternation, so an entity_id nothing matches (most of them) costs one
+    regex run, and the result for every entity_id is cached. Once an entity_id has been seen, looking it up again is
+    a dict lookup, new entity ids are matched on first sight. Adding or removing an item clears the cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = ()
+        self._combined = None
+        self._matches = {}
+        self._stats = {
+            'lookups': 0,
+            'misses': 0,
+        }
+
+    def add(self, regex, item):
+        with self._lock:
+            self._entries = self._entries + ((re.compile(regex), item),)
+            self._rebuild()
+
+    def remove(self, item):
+        with self._lock:
+            self._entries = tuple(entry for entry in self._entries if entry[1] is not item)
+            self._rebuild()
+
+    def _rebuild(self):
+        if self._entries:
+            self._combined = re.compile('|'.join('(?:{})'.format(regex.pattern) for regex, _ in self._entries))
+        else:
+            self._combined = None
+
+        # replaced last and rather than cleared, see matching()
+        self._matches = {}
+
+    def matching(self, entity_id):
+        """Returns the items matching entity_id in the order they were added, each item once."""
+        self._stats['lookups'] += 1
+
+        # taken before reading the expressions, a result computed while they change only lands in the dropped cache
+        cache = self._matches
+        matches = cache.get(entity_id)
+        if matches is None:
+            self._stats['misses'] += 1
+            matches = self._match(entity_id)
+            cache[entity_id] = matches
+
+        return matches
+
+    def _match(self, entity_id):
+        entries = self._entries
+        combined = self._combined
+        if combined is None or combined.match(entity_id) is None:
+            return ()
+
+        matches = []
+        for regex, item in entries:
+            if regex.match(entity_id) is not None and not any(match is item for match in matches):
+                matches.append(item)
+
+        return tuple(matches)
+
+    def items(self):
+        items = []
+        for _, item in self._entries:
+            if not any(existing is item for existing in items):
+                items.append(item)
+
+        return items
+
+    def stats(self):
+        return {
+            **self._stats,
+            'patterns': len(self._entries),
+            'cached_entities': len(self._matches),
+        }
+
+    def __repr__(self):
+        return "{}(stats={})".format(
+            self.__class__.__name__,
+            self.stats())
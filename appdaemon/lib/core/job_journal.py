@@ -0,0 +1,174 @@
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_FLUSH_INTERVAL = 1
+# pending jobs overdue for this long, or that no app took back for this long (e.g. it was removed or renamed),
+# are dropped
+STALE_AFTER = 24 * 60 * 60
+
+
+class JobJournal:
+    """Append-only SQLite journal of pending scheduled jobs, used to re-arm them after a restart.
+
+    Writes are queued and flushed in one transaction every flush_interval seconds by a background thread, so
+    scheduling or cancelling a job never waits on the disk. Journal entries are replayed and compacted when the
+    journal is opened. Compacting stamps entries with the time they were first carried forward, an app taking its
+    jobs back journals them again without it, so repeating jobs nobody takes back expire like overdue ones.
+    """
+
+    def __init__(self, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self._flush_interval = flush_interval
+        self._path = None
+        self._connection = None
+        self._pending = {}
+        self._queue = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake_up = threading.Event()
+        self._writer = None
+        self._next_id = 0
+        self._stats = {
+            'writes': 0,
+            'flushes': 0,
+        }
+
+    @property
+    def is_open(self):
+        return self._connection is not None
+
+    def open(self, path):
+        """Opens the journal at path, does nothing when it's already open."""
+        with self._lock:
+            if self._connection is not None:
+                return
+
+            connection = sqlite3.connect(path, check_same_thread=False)
+            connection.execute('CREATE TABLE IF NOT EXISTS journal ('
+                               'seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+                               'op TEXT NOT NULL, '
+                               'job_id TEXT NOT NULL, '
+                               'record TEXT)')
+
+            self._pending = self._replay(connection)
+            self._compact(connection)
+
+            self._path = path
+            self._connection = connection
+            self._writer = threading.Thread(target=self._run_writer, name='job_journal', daemon=True)
+            self._writer.start()
+
+    def close(self):
+        with self._lock:
+            connection = self._connection
+            self._connection = None
+
+        if connection is None:
+            return
+
+        self._wake_up.set()
+        self._writer.join()
+        self._flush(connection)
+        connection.close()
+
+    def add(self, record):
+        """Queues record of a newly scheduled job, returns its journal id."""
+        with self._lock:
+            self._next_id += 1
+            job_id = '{}-{}'.format(time.time(), self._next_id)
+            self._queue.append(('put', job_id, json.dumps(record, default=str)))
+
+        return job_id
+
+    def remove(self, job_id):
+        with self._lock:
+            self._queue.append(('delete', job_id, None))
+
+    def take_pending(self, app_name):
+        """Returns (and forgets) the jobs of app_name that were pending when the journal was opened."""
+        with self._lock:
+            job_ids = [job_id for job_id, record in self._pending.items() if record['app_name'] == app_name]
+            records = [self._pending.pop(job_id) for job_id in job_ids]
+            for record in records:
+                del record['unclaimed_since']
+            self._queue.extend(('delete', job_id, None) for job_id in job_ids)
+
+        return records
+
+    def flush(self):
+        with self._lock:
+            connection = self._connection
+
+        if connection is not None:
+            self._flush(connection)
+
+    def _run_writer(self):
+        while self._connection is not None:
+            self._wake_up.wait(self._flush_interval)
+            self._wake_up.clear()
+
+            connection = self._connection
+            if connection is not None:
+                self._flush(connection)
+
+    def _flush(self, connection):
+        with self._write_lock:
+            with self._lock:
+                queue = self._queue
+                self._queue = []
+
+            if not queue:
+                return
+
+            with connection:
+                connection.executemany('INSERT INTO journal (op, job_id, record) VALUES (?, ?, ?)', queue)
+
+            with self._lock:
+                self._stats['writes'] += len(queue)
+                self._stats['flushes'] += 1
+
+    @staticmethod
+    def _replay(connection):
+        pending = {}
+        for op, job_id, record in connection.execute('SELECT op, job_id, record FROM journal ORDER BY seq'):
+            if op == 'put':
+                pending[job_id] = json.loads(record)
+            else:
+                pending.pop(job_id, None)
+
+        now = time.time()
+        restorable = {}
+        for job_id, record in pending.items():
+            if now - record.get('unclaimed_since', now) >= STALE_AFTER:
+                continue
+            if not record.get('interval') and now - record['due'] >= STALE_AFTER:
+                continue
+
+            restorable[job_id] = {**record, 'unclaimed_since': record.get('unclaimed_since', now)}
+
+        return restorable
+
+    def _compact(self, connection):
+        with connection:
+            connection.execute('DELETE FROM journal')
+            connection.executemany('INSERT INTO journal (op, job_id, record) VALUES (?, ?, ?)', [
+                ('put', job_id, json.dumps(record, default=str)) for job_id, record in self._pending.items()
+            ])
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                'queue_depth': len(self._queue),
+                'restorable': len(self._pending),
+            }
+
+    def __repr__(self):
+        return "{}(path={}, stats={})".format(
+            self.__class__.__name__,
+            self._path,
+            self.stats())
+
+
+JOB_JOURNAL = JobJournal()
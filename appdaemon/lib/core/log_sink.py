@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import deque
+
+DEFAULT_MAX_SIZE = 10000
+# levels never dropped when the queue is full, the caller waits for the writer to make room instead
+NEVER_DROPPED_LEVELS = {'WARNING', 'ERROR', 'CRITICAL'}
+# how long such a caller waits before the oldest queued record is dropped to make room
+FULL_QUEUE_WAIT = 1
+
+
+class Lazy:
+    """Log argument computed only when the message gets formatted, e.g.
+    self.debug('Called from {}', Lazy(traceback.format_stack))."""
+
+    __slots__ = ['_fn']
+
+    def __init__(self, fn):
+        self._fn = fn
+
+    def __format__(self, format_spec):
+        return format(self._fn(), format_spec)
+
+    def __str__(self):
+        return str(self._fn())
+
+
+class LogSink:
+    """Process-wide queue of app log records written by a single background thread, so a callback never waits on
+    AppDaemon's log handlers and the file or console behind them.
+
+    Records are written in the order they were queued. Queuing one is a deque append, the writer is only woken up
+    when it went idle, and it then writes everything queued so far. When the queue is full INFO and DEBUG records
+    are dropped and counted. Warnings and errors wait for the writer to make room, up to FULL_QUEUE_WAIT seconds
+    after which the oldest queued record is dropped, so they are never written ahead of older records.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records = deque()
+        self._max_size = DEFAULT_MAX_SIZE
+        self._wakeup = threading.Event()
+        self._writing = False
+        self._writer = None
+        # plain attributes rather than a dict, emit runs for every log record
+        self._emitted = 0
+        self._dropped = 0
+        self._waited_for_space = 0
+        self._write_errors = 0
+        self._max_queue_depth = 0
+
+    @property
+    def is_running(self):
+        return self._writer is not None
+
+    def start(self, max_size=None):
+        with self._lock:
+            if self._writer is not None:
+                return
+
+            self._max_size = max_size or DEFAULT_MAX_SIZE
+            self._writer = threading.Thread(target=self._run, name='log_sink', daemon=True)
+            self._writer.start()
+
+    def emit(self, write, msg, level):
+        """Queues write(msg, level) for the writer thread."""
+        if self._writer is None:
+            self.start()
+
+        records = self._records
+        depth = len(records)
+        if depth >= self._max_size:
+            if level not in NEVER_DROPPED_LEVELS:
+                self._dropped += 1
+                return
+
+            self._make_room()
+            depth = len(records)
+
+        records.append((write, msg, level))
+        self._emitted += 1
+        if depth >= self._max_queue_depth:
+            self._max_queue_depth = depth + 1
+
+        if not self._wakeup.is_set():
+            self._wakeup.set()
+
+    def _make_room(self):
+        self._waited_for_space += 1
+        self._wakeup.set()
+
+        deadline = time.monotonic() + FULL_QUEUE_WAIT
+        while len(self._records) >= self._max_size and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+        if len(self._records) >= self._max_size:
+            # the writer is stuck, losing the oldest record keeps the log in order
+            try:
+                self._records.popleft()
+                self._dropped += 1
+            except IndexError:
+                pass
+
+    def _run(self):
+        records = self._records
+        while True:
+            self._wakeup.wait()
+            # cleared before draining, a record queued from now on sets it again
+            self._wakeup.clear()
+            self._writing = True
+            while records:
+                write, msg, level = records.popleft()
+                try:
+                    write(msg, level)
+                except Exception:
+                    self._write_errors += 1
+            self._writing = False
+
+    def flush(self, timeout=5):
+        """Waits until every queued record has been written."""
+        deadline = time.monotonic() + timeout
+        while (self._records or self._writing) and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+    def stats(self):
+        return {
+            'emitted': self._emitted,
+            'dropped': self._dropped,
+            'waited_for_space': self._waited_for_space,
+            'write_errors': self._write_errors,
+            'max_queue_depth': self._max_queue_depth,
+            'queue_depth': len(self._records),
+            'max_size': self._max_size,
+        }
+
+    def __repr__(self):
+        return "{}(stats={})".format(
+            self.__class__.__name__,
+            self.stats())
+
+
+LOG_SINK = LogSink()
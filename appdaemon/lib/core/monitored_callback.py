@@ -1,14 +1,65 @@
+import asyncio
+import time
 import traceback
 
 from base_automation import BaseAutomation
+from lib.core.app_accessible import AppAccessible
+from lib.core.app_profiler import APP_PROFILER
+from lib.core.callback_latency import CALLBACK_LATENCIES
+from lib.core.slow_callback_watchdog import SLOW_CALLBACK_WATCHDOG
+from lib.core.tracing import TRACER
 
 
 def monitored_callback(callback):
+    """Logs exceptions thrown by an app callback instead of letting them reach AppDaemon, records the wall clock
+    and CPU time of every call in CALLBACK_LATENCIES and traces it with TRACER. Callbacks running on a worker
+    thread are also watched by SLOW_CALLBACK_WATCHDOG and profiled by APP_PROFILER while their app is profiled."""
+    latencies = {}
+
+    def app_of(owner):
+        # callbacks of triggers and other components count towards their app
+        return owner.app if isinstance(owner, AppAccessible) else owner
+
+    def latency_of(owner):
+        app_name = app_of(owner).name
+        latency = latencies.get(app_name)
+        if latency is None:
+            latency = latencies[app_name] = CALLBACK_LATENCIES.latency(app_name, callback.__qualname__)
+        return latency
+
+    if asyncio.iscoroutinefunction(callback):
+        # AppDaemon runs coroutine callbacks on its event loop, the wrapper has to stay one
+        async def async_inner(*args, **kwargs):
+            started_at = time.perf_counter()
+            failed = False
+            try:
+                with TRACER.span(app_of(args[0]), callback.__qualname__, 'callback'):
+                    return await callback(*args, **kwargs)
+            except Exception as e:
+                failed = True
+                app: BaseAutomation = args[0]
+                app.error('Exception thrown in callback: {}\n{}'.format(e, traceback.format_exc()))
+            finally:
+                latency_of(args[0]).record(time.perf_counter() - started_at, None, args[1:], failed)
+
+        return async_inner
+
     def inner(*args, **kwargs):
+        started_at = time.perf_counter()
+        cpu_started_at = time.thread_time()
+        failed = False
+        app = app_of(args[0])
         try:
-            return callback(*args, **kwargs)
+            with TRACER.span(app, callback.__qualname__, 'callback'), \
+                    SLOW_CALLBACK_WATCHDOG.watch(app, callback.__qualname__, args[1:]), \
+                    APP_PROFILER.profiling(app):
+                return callback(*args, **kwargs)
         except Exception as e:
+            failed = True
             app: BaseAutomation = args[0]
             app.error('Exception thrown in callback: {}\n{}'.format(e, traceback.format_exc()))
+        finally:
+            latency_of(args[0]).record(time.perf_counter() - started_at, time.thread_time() - cpu_started_at,
+                                       args[1:], failed)
 
     return inner
@@ -0,0 +1,202 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+DEFAULT_BUDGET = 5
+DEFAULT_SAMPLE_INTERVAL = 0.2
+MAX_STACK_DEPTH = 100
+MAX_TRIGGER_INFO_LENGTH = 500
+
+
+class _Watch:
+    """A callback running on one worker thread, with the stacks sampled once it went over budget."""
+
+    __slots__ = ['_watchdog', 'thread_id', 'app_name', 'name', 'trigger_info', 'budget', 'started_at', 'samples']
+
+    def __init__(self, watchdog, app_name, name, trigger_info, budget):
+        self._watchdog = watchdog
+        self.app_name = app_name
+        self.name = name
+        self.trigger_info = trigger_info
+        self.budget = budget
+        self.samples = None
+
+    def __enter__(self):
+        self.thread_id = threading.get_ident()
+        self.started_at = time.monotonic()
+        self._watchdog.started(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self._watchdog.finished(self)
+        return False
+
+
+class _NoWatch:
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        return False
+
+
+NO_WATCH = _NoWatch()
+
+
+def collapse_stack(frame):
+    """frame and its callers as one line of the collapsed format flamegraph.pl and speedscope read, outermost
+    frame first."""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append('{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), frame.f_lineno))
+        frame = frame.f_back
+
+    return ';'.join(reversed(names))
+
+
+class SlowCallbackWatchdog:
+    """Finds out where callbacks that run longer than their budget spend their time.
+
+    monitored_callback, do_action and do_async_action register the callback they run with its thread. A watchdog
+    thread samples the stack of every callback that went over budget with sys._current_frames() each
+    sample_interval, and once the callback returns writes the sampled stacks as a collapsed-stack file, ready for
+    flamegraph.pl or speedscope, to the configured directory. Every file gets a line in index.jsonl there with the app, the callback,
+    its trigger_info and how long it ran.
+
+    thread_duration_warning_threshold in appdaemon.yaml only tells that a worker was busy for long, the samples
+    show the sleeps, blocking service calls and I/O it was waiting on.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._watches = {}
+        self._finished = deque()
+        self._directory = None
+        self._sample_interval = DEFAULT_SAMPLE_INTERVAL
+        self._thread = None
+        self._stats = {
+            'watched': 0,
+            'over_budget': 0,
+            'samples': 0,
+            'profiles_written': 0,
+            'write_errors': 0,
+        }
+
+    @property
+    def is_running(self):
+        return self._thread is not None
+
+    def start(self, directory, sample_interval=None):
+        with self._lock:
+            if self._thread is not None:
+                return
+
+            self._directory = directory
+            self._sample_interval = sample_interval or DEFAULT_SAMPLE_INTERVAL
+            self._thread = threading.Thread(target=self._run, name='slow_callback_watchdog', daemon=True)
+            self._thread.start()
+
+    def watch(self, app, name, trigger_info=None):
+        """Context manager watching name, a callback of app, while it runs. Returns a no-op unless slow_callback_dir
+        is set in appdaemon.yaml. The budget in seconds is the app's slow_callback_budget, or the process-wide one
+        in appdaemon.yaml."""
+        budget = app.__dict__.get('_slow_callback_budget')
+        if budget is None:
+            budget = app._slow_callback_budget = self._budget_of(app)
+
+        if not budget or threading.get_ident() in self._watches:
+            # callbacks nested in one already watched on this thread are part of its samples
+            return NO_WATCH
+
+        return _Watch(self, app.name, name, trigger_info, budget)
+
+    def _budget_of(self, app):
+        ad_config = app.__dict__.get('config') or {}
+        directory = ad_config.get('slow_callback_dir')
+        if not directory:
+            return 0
+
+        if self._thread is None:
+            self.start(directory, ad_config.get('slow_callback_sample_interval'))
+
+        return app.cfg.float('slow_callback_budget', ad_config.get('slow_callback_budget') or DEFAULT_BUDGET)
+
+    def started(self, watch):
+        self._watches[watch.thread_id] = watch
+        self._stats['watched'] += 1
+
+    def finished(self, watch):
+        self._watches.pop(watch.thread_id, None)
+        if watch.samples:
+            # written by the watchdog thread, the worker goes back to the pool right away
+            self._finished.append((watch, time.monotonic() - watch.started_at))
+
+    def _run(self):
+        while True:
+            time.sleep(self._sample_interval)
+            self.sample()
+            while self._finished:
+                self._write(*self._finished.popleft())
+
+    def sample(self):
+        now = time.monotonic()
+        over_budget = [watch for watch in list(self._watches.values()) if now - watch.started_at > watch.budget]
+        if not over_budget:
+            return
+
+        frames = sys._current_frames()
+        for watch in over_budget:
+            frame = frames.get(watch.thread_id)
+            if frame is None or self._watches.get(watch.thread_id) is not watch:
+                continue
+
+            if watch.samples is None:
+                watch.samples = Counter()
+                self._stats['over_budget'] += 1
+
+            watch.samples[collapse_stack(frame)] += 1
+            self._stats['samples'] += 1
+
+    def _write(self, watch, duration):
+        name = '{}-{}-{}-{}'.format(watch.app_name, watch.name, time.strftime('%Y%m%d-%H%M%S'),
+                                    self._stats['profiles_written'])
+        try:
+            os.makedirs(self._directory, exist_ok=True)
+            with open(os.path.join(self._directory, name + '.folded'), 'w') as file:
+                for stack, count in watch.samples.most_common():
+                    file.write('{} {}\n'.format(stack, count))
+
+            with open(os.path.join(self._directory, 'index.jsonl'), 'a') as file:
+                file.write(json.dumps({
+                    'profile': name + '.folded',
+                    'app': watch.app_name,
+                    'callback': watch.name,
+                    'trigger_info': repr(watch.trigger_info)[:MAX_TRIGGER_INFO_LENGTH],
+                    'budget_sec': watch.budget,
+                    'duration_sec': round(duration, 3),
+                    'samples': sum(watch.samples.values()),
+                }) + '\n')
+
+            self._stats['profiles_written'] += 1
+        except Exception:
+            self._stats['write_errors'] += 1
+
+    def stats(self):
+        return {
+            **self._stats,
+            'running_callbacks': len(self._watches),
+        }
+
+    def __repr__(self):
+        return "{}(stats={})".format(
+            self.__class__.__name__,
+            self.stats())
+
+
+SLOW_CALLBACK_WATCHDOG = SlowCallbackWatchdog()
@@ -0,0 +1,270 @@
+import asyncio
+import threading
+import traceback
+import uuid
+from collections import deque
+
+from lib.core.entity_pattern import EntityPatternIndex, entity_pattern_regex
+from lib.core.state_mirror import STATE_MIRROR
+
+# listen_state keyword arguments only AppDaemon implements, registrations using one of them stay with AppDaemon
+APPDAEMON_STATE_KWARGS = {'duration', 'immediate', 'namespace', 'oneshot', 'pin', 'pin_thread', 'timeout'}
+
+
+def is_dispatchable(kwargs):
+    return not any(key in APPDAEMON_STATE_KWARGS or key.startswith('constrain_') for key in kwargs)
+
+
+def _value(entity, attribute):
+    if entity is None:
+        return None
+    if attribute in entity:
+        return entity[attribute]
+
+    return (entity.get('attributes') or {}).get(attribute)
+
+
+class StateListener:
+    """listen_state registration held by STATE_DISPATCHER, it's also the handle returned to the app."""
+
+    def __init__(self, app, callback, entity, attribute, old, new, kwargs, patterns=None):
+        # AppDaemon keeps per callback counters under this id, like it does for its own registrations
+        self.id = uuid.uuid4().hex
+        self.app = app
+        self.callback = callback
+        self.entity = entity
+        self.patterns = patterns
+        # "sensor.kitchen_*", "light.*" is the whole domain
+        self.prefix = None
+        if entity is not None and entity.endswith('*') and not entity.endswith('.*'):
+            self.prefix = entity[:-1]
+        self.attribute = attribute
+        self.old = old
+        self.new = new
+        self.kwargs = kwargs
+
+    def values(self, old_entity, new_entity):
+        """Returns the (old, new) values to call back with, None when this state change doesn't concern it."""
+        if self.attribute == 'all':
+            return old_entity, new_entity
+
+        old = _value(old_entity, self.attribute)
+        new = _value(new_entity, self.attribute)
+
+        if old == new:
+            return None
+        if self.old is not None and self.old != old:
+            return None
+        if self.new is not None and self.new != new:
+            return None
+
+        return old, new
+
+    def __repr__(self):
+        return "{}(app={}, entity={}, attribute={}, callback={})".format(
+            self.__class__.__name__,
+            self.app.name,
+            self.entity if self.patterns is None else self.patterns,
+            self.attribute,
+            getattr(self.callback, '__name__', self.callback))
+
+
+class StateDispatcher:
+    """Routes state changes from STATE_MIRROR's single state_changed subscription to listen_state registrations.
+
+    AppDaemon matches every state callback against every state change, here registrations are found with dict
+    lookups by entity_id and domain, plus a scan of the prefix wildcards ("sensor.kitchen_*") of the changed
+    entity's domain. An entity of None, a domain ("light") or "light.*" work like they do with listen_state. Glob
+    and regex patterns (see listen_pattern) go through an EntityPatternIndex, also a dict lookup per state change.
+
+    Matched callbacks are handed to AppDaemon's dispatch_worker like its own state callbacks, so app constraints
+    are checked, sync callbacks run on the app's pinned thread one at a time with its timer and event callbacks,
+    and thread accounting and duration warnings cover them. Hand-offs go through one queue drained in order on
+    the event loop, a state change never overtakes an earlier one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_entity = {}
+        self._by_domain = {}
+        self._by_prefix = {}
+        self._any_entity = ()
+        self._patterns = EntityPatternIndex()
+        self._handoffs = deque()
+        self._draining = False
+        self._stats = {
+            'events': 0,
+            'matched': 0,
+            'delivered': 0,
+            'constrained': 0,
+            'max_backlog': 0,
+        }
+
+    def listen(self, app, callback, entity, attribute=None, old=None, new=None, **kwargs):
+        listener = self._create_listener(app, callback, entity, attribute, old, new, kwargs)
+
+        with self._lock:
+            # buckets are tuples replaced on write, dispatch reads them from the loop without the lock
+            if entity is None:
+                self._any_entity = self._any_entity + (listener,)
+            else:
+                index, key = self._index_of(listener)
+                index[key] = index.get(key, ()) + (listener,)
+
+        app.debug('Registered {}', listener)
+        return listener
+
+    def listen_pattern(self, app, callback, patterns, attribute=None, old=None, new=None, **kwargs):
+        """listen for every entity matching one of patterns, globs or regexes starting with ^, including entities
+        that only show up later."""
+        listener = self._create_listener(app, callback, None, attribute, old, new, kwargs, patterns=patterns)
+
+        for pattern in patterns:
+            self._patterns.add(entity_pattern_regex(pattern), listener)
+
+        app.debug('Registered {}', listener)
+        return listener
+
+    @staticmethod
+    def _create_listener(app, callback, entity, attribute, old, new, kwargs, patterns=None):
+        listener = StateListener(app, callback, entity, attribute or 'state', old, new, kwargs, patterns=patterns)
+        if attribute is not None:
+            kwargs['attribute'] = attribute
+        if old is not None:
+            kwargs['old'] = old
+        if new is not None:
+            kwargs['new'] = new
+
+        return listener
+
+    def cancel(self, listener):
+        if listener.patterns is not None:
+            self._patterns.remove(listener)
+            return
+
+        with self._lock:
+            if listener.entity is None:
+                self._any_entity = tuple(l for l in self._any_entity if l is not listener)
+                return
+
+            index, key = self._index_of(listener)
+            listeners = tuple(l for l in index.get(key, ()) if l is not listener)
+            if listeners:
+                index[key] = listeners
+            else:
+                index.pop(key, None)
+
+    def cancel_app(self, app):
+        """Drops every registration of app, called when it terminates."""
+        for listener in self.listeners():
+            if listener.app.name == app.name:
+                self.cancel(listener)
+
+    def listeners(self):
+        with self._lock:
+            listeners = list(self._any_entity)
+            for index in [self._by_entity, self._by_domain, self._by_prefix]:
+                for bucket in index.values():
+                    listeners.extend(bucket)
+
+        return listeners + self._patterns.items()
+
+    def _index_of(self, listener):
+        domain = listener.entity.split('.', 1)[0]
+
+        if listener.prefix is not None:
+            return self._by_prefix, domain
+        if '.' not in listener.entity or listener.entity.endswith('.*'):
+            return self._by_domain, domain
+
+        return self._by_entity, listener.entity
+
+    def matching(self, entity_id):
+        domain = entity_id.split('.', 1)[0]
+
+        listeners = self._by_entity.get(entity_id, ()) + self._by_domain.get(domain, ()) + self._any_entity \
+                    + self._patterns.matching(entity_id)
+        prefixed = self._by_prefix.get(domain)
+        if prefixed:
+            listeners += tuple(listener for listener in prefixed if entity_id.startswith(listener.prefix))
+
+        return listeners
+
+    def dispatch(self, entity_id, old_entity, new_entity):
+        """STATE_MIRROR observer, runs on the event loop."""
+        self._stats['events'] += 1
+
+        for listener in self.matching(entity_id):
+            values = listener.values(old_entity, new_entity)
+            if values is None:
+                continue
+
+            self._stats['matched'] += 1
+            self._submit(listener, (entity_id, listener.attribute, values[0], values[1], dict(listener.kwargs)))
+
+    def _submit(self, listener, args):
+        self._handoffs.append((listener, args))
+        self._stats['max_backlog'] = max(self._stats['max_backlog'], len(self._handoffs))
+
+        if not self._draining:
+            self._draining = True
+            asyncio.ensure_future(self._drain())
+
+    async def _drain(self):
+        try:
+            while self._handoffs:
+                listener, args = self._handoffs.popleft()
+                try:
+                    await self._hand_off(listener, args)
+                except Exception as e:
+                    listener.app.error('Exception thrown dispatching state callback {}: {}\n{}'.format(
+                        listener, e, traceback.format_exc()))
+        finally:
+            self._draining = False
+
+    async def _hand_off(self, listener, args):
+        app = listener.app
+        app_object = app.AD.app_management.objects.get(app.name)
+        if app_object is None:
+            # terminated since the state change, AppDaemon drops its callbacks too
+            return
+
+        entity_id, attribute, old, new, kwargs = args
+        dispatched = await app.AD.threading.dispatch_worker(app.name, {
+            'id': listener.id,
+            'name': app.name,
+            'objectid': app_object['id'],
+            'type': 'state',
+            'function': listener.callback,
+            'attribute': attribute,
+            'entity': entity_id,
+            'new_state': new,
+            'old_state': old,
+            'pin_app': app_object['pin_app'],
+            'pin_thread': app_object['pin_thread'],
+            'kwargs': kwargs,
+        })
+
+        self._stats['delivered' if dispatched else 'constrained'] += 1
+
+    def stats(self):
+        with self._lock:
+            listeners = len(self._any_entity) + len(self._patterns.items())
+            for index in [self._by_entity, self._by_domain, self._by_prefix]:
+                listeners += sum(len(bucket) for bucket in index.values())
+
+            return {
+                **self._stats,
+                'listeners': listeners,
+                'patterns': self._patterns.stats(),
+                'backlog': len(self._handoffs),
+            }
+
+    def __repr__(self):
+        return "{}(stats={})".format(
+            self.__class__.__name__,
+            self.stats())
+
+
+STATE_DISPATCHER = StateDispatcher()
+STATE_MIRROR.add_observer(STATE_DISPATCHER.dispatch)
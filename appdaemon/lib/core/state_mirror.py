@@ -0,0 +1,216 @@
+import copy
+import threading
+
+
+class EntityView(dict):
+    """Read-only entity state dict shared by every reader of the mirror, copy it before changing anything."""
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('{} is read-only, copy it with dict() first'.format(self.__class__.__name__))
+
+    __setitem__ = _read_only
+    __delitem__ = _read_only
+    clear = _read_only
+    pop = _read_only
+    popitem = _read_only
+    setdefault = _read_only
+    update = _read_only
+    __ior__ = _read_only
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memodict={}):
+        return {key: copy.deepcopy(value, memodict) for key, value in self.items()}
+
+
+def _freeze(state):
+    attributes = state.get('attributes')
+    if isinstance(attributes, dict):
+        return EntityView(state, attributes=EntityView(attributes))
+
+    return EntityView(state)
+
+
+class StateMirror:
+    """Process-wide copy of the default namespace entity states, kept current from one state_changed subscription.
+
+    Every update bumps a process-wide version and stores it against the entity, so version(entity_id) changing is
+    enough to know an entity changed. Reads are dict lookups returning shared EntityViews, the table is only copied
+    when an entity is added, so iterating states() never sees it change size.
+
+    The subscription is an async callback, AppDaemon queues it in the same loop step as the sync callbacks of the
+    same state change and a worker thread goes through the loop before running one, so those callbacks already read
+    the new state. Observers are called on the loop with (entity_id, old_entity, new_entity) after every update,
+    new_entity is None when the entity was removed.
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._versions = {}
+        self._version = 0
+        self._owner = None
+        self._observers = []
+        self._lock = threading.Lock()
+        self._attach_lock = threading.Lock()
+        self._stats = {
+            'attaches': 0,
+            'updates': 0,
+            'removals': 0,
+        }
+
+    @property
+    def is_live(self):
+        return self._owner is not None
+
+    def attach(self, app, fetch_all):
+        """Subscribes to state_changed through app and seeds the mirror with fetch_all(), returns False while
+        another app is attaching."""
+        if not self._attach_lock.acquire(blocking=False):
+            return False
+
+        try:
+            if self._owner is not None:
+                return True
+
+            since = self._version
+            app.listen_event(self._state_changed_handler, 'state_changed')
+            self._seed(fetch_all(), since)
+
+            self._owner = app.name
+            with self._lock:
+                self._stats['attaches'] += 1
+
+            app.log('State mirror attached with {} entities'.format(len(self._states)))
+            return True
+        finally:
+            self._attach_lock.release()
+
+    def detach(self, app):
+        """Called when app terminates, AppDaemon drops its callbacks so the next read attaches again. Returns True
+        when app held the subscription."""
+        if self._owner != app.name:
+            return False
+
+        self._owner = None
+        return True
+
+    def add_observer(self, observer):
+        self._observers.append(observer)
+
+    def get(self, entity_id):
+        return self._states.get(entity_id)
+
+    def version(self, entity_id):
+        return self._versions.get(entity_id, 0)
+
+    def states(self):
+        """The whole table as a new dict, like AppDaemon's get_state() returns, sharing the read-only entities."""
+        return dict(self._states)
+
+    def items(self):
+        """(entity_id, entity) of the whole table without copying it, for scans that only read. The view is of the
+        current table, entities added or removed while iterating don't change it."""
+        return self._states.items()
+
+    def get_state(self, entity_id=None, attribute=None, default=None):
+        """Same lookups as AppDaemon's get_state, without copying anything."""
+        if entity_id is not None and '.' in entity_id:
+            entity = self._states.get(entity_id)
+            if entity is None:
+                return default
+            if attribute is None and 'state' in entity:
+                return entity['state']
+            if attribute == 'all':
+                return entity
+
+            attributes = entity.get('attributes') or {}
+            if attribute in attributes:
+                return attributes[attribute]
+            if attribute in entity:
+                return entity[attribute]
+            return default
+
+        if attribute is not None:
+            raise ValueError('Querying a specific attribute is only possible for a single entity')
+
+        if entity_id is None:
+            return self.states()
+
+        prefix = entity_id + '.'
+        return {key: entity for key, entity in self._states.items() if key.startswith(prefix)}
+
+    async def _state_changed_handler(self, event_name, data, kwargs):
+        entity_id = data['entity_id']
+        old_entity = self._states.get(entity_id)
+
+        new_state = data.get('new_state')
+        if new_state is None:
+            if old_entity is None:
+                return
+            self._remove(entity_id)
+            new_entity = None
+        else:
+            new_entity = self._update(entity_id, new_state)
+
+        for observer in self._observers:
+            observer(entity_id, old_entity, new_entity)
+
+    def _update(self, entity_id, new_state):
+        entity = _freeze(new_state)
+
+        with self._lock:
+            self._version += 1
+            self._stats['updates'] += 1
+            self._put(entity_id, entity, self._version)
+
+        return entity
+
+    def _remove(self, entity_id):
+        with self._lock:
+            self._version += 1
+            self._stats['removals'] += 1
+            # copy on write like adding one, the version is kept so anything cached against the entity is stale
+            self._states = {key: entity for key, entity in self._states.items() if key != entity_id}
+            self._versions[entity_id] = self._version
+
+    def _seed(self, states, since):
+        with self._lock:
+            self._version += 1
+            table = dict(self._states)
+
+            for entity_id, state in (states or {}).items():
+                # changed since subscribing, the event is at least as new as the fetched state
+                if state is None or self._versions.get(entity_id, 0) > since:
+                    continue
+
+                table[entity_id] = _freeze(state)
+                self._versions[entity_id] = self._version
+
+            self._states = table
+
+    def _put(self, entity_id, entity, version):
+        if entity_id in self._states:
+            self._states[entity_id] = entity
+        else:
+            # copy on write, anyone iterating states() keeps iterating the previous table
+            self._states = {**self._states, entity_id: entity}
+
+        self._versions[entity_id] = version
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                'live': self.is_live,
+                'entities': len(self._states),
+                'version': self._version,
+            }
+
+    def __repr__(self):
+        return "{}(stats={})".format(
+            self.__class__.__name__,
+            self.stats())
+
+
+STATE_MIRROR = StateMirror()
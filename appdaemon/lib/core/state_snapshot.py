@@ -0,0 +1,117 @@
+import threading
+
+_STATS_LOCK = threading.Lock()
+_STATS = {
+    'dispatches': 0,
+    'hits': 0,
+    'misses': 0,
+}
+
+
+def snapshot_stats():
+    with _STATS_LOCK:
+        return dict(_STATS)
+
+
+class StateSnapshot:
+    """Read-through cache of entity states that lives for a single trigger dispatch.
+
+    Every entity/attribute pair is fetched at most once while the snapshot is active, writes done through the app
+    drop the affected entity so it's fetched again on the next read.
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    def get(self, fetch, entity_id, kwargs):
+        key = (entity_id, tuple(sorted(kwargs.items())))
+
+        with self._lock:
+            if key in self._states:
+                self._hits += 1
+                return self._states[key]
+
+        state = fetch(entity_id, **kwargs)
+
+        with self._lock:
+            self._misses += 1
+            self._states[key] = state
+
+        return state
+
+    async def get_async(self, fetch, entity_id, kwargs):
+        """get for a dispatch running on the event loop, fetch returns an awaitable."""
+        key = (entity_id, tuple(sorted(kwargs.items())))
+
+        with self._lock:
+            if key in self._states:
+                self._hits += 1
+                return self._states[key]
+
+        state = await fetch(entity_id, **kwargs)
+
+        with self._lock:
+            self._misses += 1
+            self._states[key] = state
+
+        return state
+
+    def get_many(self, fetch_many, entity_ids, kwargs):
+        kwargs_key = tuple(sorted(kwargs.items()))
+        states = {}
+        missing = []
+
+        with self._lock:
+            for entity_id in entity_ids:
+                key = (entity_id, kwargs_key)
+                if key in self._states:
+                    self._hits += 1
+                    states[entity_id] = self._states[key]
+                else:
+                    missing.append(entity_id)
+
+        if not missing:
+            return states
+
+        fetched = fetch_many(missing, **kwargs)
+
+        with self._lock:
+            for entity_id, state in fetched.items():
+                self._misses += 1
+                self._states[(entity_id, kwargs_key)] = state
+
+        states.update(fetched)
+        return states
+
+    def invalidate(self, entity_ids):
+        if isinstance(entity_ids, str):
+            entity_ids = [entity_ids]
+
+        with self._lock:
+            for key in [k for k in self._states.keys() if k[0] in entity_ids]:
+                del self._states[key]
+
+    def close(self):
+        with _STATS_LOCK:
+            _STATS['dispatches'] += 1
+            _STATS['hits'] += self._hits
+            _STATS['misses'] += self._misses
+
+        self._states.clear()
+
+    def __repr__(self):
+        return "{}(hits={}, misses={})".format(
+            self.__class__.__name__,
+            self._hits,
+            self._misses)
@@ -0,0 +1,76 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ThreadOccupancy:
+    """Process-wide counters of how AppDaemon worker threads spend time waiting.
+
+    A blocking sleep holds a worker for its whole duration, a deferred wait (BaseAutomation.after) hands the thread
+    back and only needs one again when the continuation runs. Comparing blocked_seconds with deferred_seconds, and
+    peak_sleeping_threads with the size of the thread pool, shows how many workers waiting still costs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sleeping = 0
+        self._pending = 0
+        self._stats = {
+            'blocking_sleeps': 0,
+            'blocked_seconds': 0.0,
+            'peak_sleeping_threads': 0,
+            'deferred_waits': 0,
+            'deferred_seconds': 0.0,
+            'peak_pending_continuations': 0,
+        }
+
+    @contextmanager
+    def blocking(self):
+        """Wraps a time.sleep on a worker thread."""
+        with self._lock:
+            self._sleeping += 1
+            self._stats['blocking_sleeps'] += 1
+            self._stats['peak_sleeping_threads'] = max(self._stats['peak_sleeping_threads'], self._sleeping)
+
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._sleeping -= 1
+                self._stats['blocked_seconds'] += time.monotonic() - started_at
+
+    def deferred(self, seconds):
+        """Records a continuation scheduled to run in seconds."""
+        with self._lock:
+            self._pending += 1
+            self._stats['deferred_waits'] += 1
+            self._stats['deferred_seconds'] += max(0, seconds)
+            self._stats['peak_pending_continuations'] = max(self._stats['peak_pending_continuations'],
+                                                            self._pending)
+
+    def resumed(self):
+        """Records a continuation that is about to run."""
+        with self._lock:
+            self._pending = max(0, self._pending - 1)
+
+    def cancelled(self):
+        """Records a continuation cancelled before it ran."""
+        with self._lock:
+            self._pending = max(0, self._pending - 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                'sleeping_threads': self._sleeping,
+                'pending_continuations': self._pending,
+            }
+
+    def __repr__(self):
+        return "{}(stats={})".format(
+            self.__class__.__name__,
+            self.stats())
+
+
+THREAD_OCCUPANCY = ThreadOccupancy()
@@ -0,0 +1,202 @@
+import bisect
+import re
+import threading
+from datetime import datetime, time, timedelta
+
+SECONDS_PER_DAY = 24 * 60 * 60
+# how long a table stays valid when AppDaemon's clock hasn't caught up with a sun event yet
+MIN_VALIDITY = timedelta(seconds=1)
+
+_TIME = re.compile(r'^(\d+):(\d+):(\d+)$')
+_DATETIME = re.compile(r'^\d+-\d+-\d+\s+(\d+):(\d+):(\d+)$')
+_SUN = re.compile(r'^(sunrise|sunset)(?:\s*([+-])\s*(\d+):(\d+):(\d+))?$')
+
+
+def _seconds_of(dt):
+    return dt.hour * 3600 + dt.minute * 60 + dt.second
+
+
+class TimeWindowTable:
+    """Which of a list of daily windows contain a second of the day.
+
+    Windows are (start, end, item) in seconds of the day and follow now_is_between: both ends are included, also
+    for windows spanning midnight. The day is cut at every second where a window starts or ends and the
+    items active in each piece are stored, so a lookup is a bisect over the cuts.
+    """
+
+    def __init__(self, windows):
+        covered = []
+        cuts = {0}
+        for start, end, item in windows:
+            if start <= end:
+                spans = [(start, end + 1)]
+            else:
+                spans = [(start, SECONDS_PER_DAY), (0, end + 1)]
+
+            spans = [(span_start, span_end) for span_start, span_end in spans if span_start < span_end]
+            covered.append((spans, item))
+            for span_start, span_end in spans:
+                cuts.update((span_start, span_end))
+
+        self._cuts = sorted(cut for cut in cuts if cut < SECONDS_PER_DAY)
+        self._active = [
+            tuple(item for spans, item in covered if any(start <= cut < end for start, end in spans))
+            for cut in self._cuts
+        ]
+
+    def active(self, second):
+        """Items whose window contains second, in the order the windows were given."""
+        return self._active[bisect.bisect_right(self._cuts, second) - 1]
+
+
+class DailyTimeTable:
+    """Process-wide resolution of the time strings now_is_between takes ("07:00:00", "sunset - 00:30:00", ...) into
+    seconds of the day.
+
+    Sun relative times resolve like AppDaemon does, from the next sunrise/sunset, so everything resolved stays valid
+    until midnight or the next sun event. The first lookup after that rebuilds the table and bumps its generation,
+    TimeWindows built from an older generation rebuild themselves. Plain times never change and are parsed once.
+    Reads the clock from AppDaemon's scheduler directly instead of a round trip through the event loop, so it
+    follows time travel like now_is_between does.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._valid_until = None
+        self._sun_down = None
+        self._next_sun = {}
+        self._fixed_seconds = {}
+        self._sun_seconds = {}
+        self._stats = {
+            'rebuilds': 0,
+            'lookups': 0,
+            'parses': 0,
+        }
+
+    def now(self, app):
+        """Current local time, rebuilding the table when it passed midnight or a sun event."""
+        now = app.AD.sched.get_now_sync().astimezone(app.AD.tz)
+        if self._valid_until is None or now >= self._valid_until:
+            self._rebuild(app, now)
+
+        return now
+
+    def clock(self, app):
+        """Returns (generation, second of the day) of the current time."""
+        second = _seconds_of(self.now(app))
+        return self._generation, second
+
+    def _rebuild(self, app, now):
+        with self._lock:
+            if self._valid_until is not None and now < self._valid_until:
+                return
+
+            next_sunrise = app.AD.sched.next_sunrise().astimezone(app.AD.tz)
+            next_sunset = app.AD.sched.next_sunset().astimezone(app.AD.tz)
+            midnight = app.AD.tz.localize(datetime.combine(now.date() + timedelta(days=1), time()))
+
+            self._next_sun = {'sunrise': next_sunrise, 'sunset': next_sunset}
+            self._sun_down = next_sunrise < next_sunset
+            self._sun_seconds = {}
+            self._generation += 1
+            self._stats['rebuilds'] += 1
+            self._valid_until = max(min(midnight, next_sunrise, next_sunset), now + MIN_VALIDITY)
+
+    def seconds(self, app, time_str):
+        """Second of the day time_str currently stands for, raises ValueError for an invalid time string."""
+        self._stats['lookups'] += 1
+        seconds = self._fixed_seconds.get(time_str)
+        if seconds is not None:
+            return seconds
+
+        self.now(app)
+        sun_seconds = self._sun_seconds
+        seconds = sun_seconds.get(time_str)
+        if seconds is None:
+            self._stats['parses'] += 1
+            seconds, fixed = self._parse(time_str)
+            if fixed:
+                self._fixed_seconds[time_str] = seconds
+            else:
+                sun_seconds[time_str] = seconds
+
+        return seconds
+
+    def _parse(self, time_str):
+        # returns (seconds, whether they are the same every day)
+        parts = _TIME.match(time_str) or _DATETIME.match(time_str)
+        if parts:
+            return _seconds_of(time(*[int(part) for part in parts.groups()])), True
+
+        parts = _SUN.match(time_str)
+        if parts is None:
+            raise ValueError('invalid time string: {}'.format(time_str))
+
+        sun, sign, hours, minutes, seconds = parts.groups()
+        sun_time = self._next_sun[sun]
+        if sign is not None:
+            offset = timedelta(hours=int(hours), minutes=int(minutes), seconds=int(seconds))
+            sun_time = sun_time + offset if sign == '+' else sun_time - offset
+
+        return _seconds_of(sun_time), False
+
+    def is_between(self, app, start_time, end_time):
+        """now_is_between without parsing or going through the event loop."""
+        start = self.seconds(app, start_time)
+        end = self.seconds(app, end_time)
+        now = _seconds_of(self.now(app))
+
+        if end < start:
+            # spans midnight
+            return now >= start or now <= end
+
+        return start <= now <= end
+
+    def sun_down(self, app):
+        self.now(app)
+        return self._sun_down
+
+    def stats(self):
+        return {
+            **self._stats,
+            'generation': self._generation,
+            'valid_until': str(self._valid_until),
+            'fixed_times': len(self._fixed_seconds),
+            'sun_times': len(self._sun_seconds),
+        }
+
+    def __repr__(self):
+        return "{}(stats={})".format(
+            self.__class__.__name__,
+            self.stats())
+
+
+TIME_TABLE = DailyTimeTable()
+
+
+class TimeWindows:
+    """Daily windows of an app, (start_time, end_time, item) with now_is_between time strings, whose TimeWindowTable
+    is rebuilt whenever TIME_TABLE is."""
+
+    def __init__(self, windows):
+        self._windows = list(windows)
+        self._table = None
+        self._generation = None
+
+    def active(self, app):
+        """Items whose window contains the current time, in the order the windows were given."""
+        generation, second = TIME_TABLE.clock(app)
+        table = self._table
+        if table is None or self._generation != generation:
+            table = TimeWindowTable([
+                (TIME_TABLE.seconds(app, start), TIME_TABLE.seconds(app, end), item)
+                for start, end, item in self._windows
+            ])
+            self._table = table
+            self._generation = generation
+
+        return table.active(second)
+
+    def __len__(self):
+        return len(self._windows)
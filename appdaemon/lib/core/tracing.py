@@ -0,0 +1,160 @@
+import itertools
+import json
+import os
+import threading
+import time
+
+MAX_DETAIL_LENGTH = 200
+
+
+class Span:
+    """Times a with block into a TraceBuffer."""
+
+    __slots__ = ['_buffer', '_name', '_category', '_detail', '_started_at']
+
+    def __init__(self, buffer, name, category, detail):
+        self._buffer = buffer
+        self._name = name
+        self._category = category
+        self._detail = detail
+
+    def __enter__(self):
+        self._started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self._buffer.record(self._name, self._category, self._started_at, time.perf_counter(), self._detail,
+                            exc_type)
+        return False
+
+
+class _NoSpan:
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+class TraceBuffer:
+    """Fixed-size ring of the latest spans of one app, recording overwrites the oldest slot and allocates only
+    the span tuple. A size of 0 disables tracing for the app."""
+
+    def __init__(self, app_name, size):
+        self.app_name = app_name
+        self.size = size
+        self._spans = [None] * size
+        self._counter = itertools.count()
+
+    def span(self, name, category, detail=None):
+        if not self.size:
+            return NO_SPAN
+
+        return Span(self, name, category, detail)
+
+    def record(self, name, category, started_at, ended_at, detail=None, exc_type=None):
+        # next() on itertools.count is atomic, threads recording at once get different slots
+        index = next(self._counter) % self.size
+        self._spans[index] = (name, category, started_at, ended_at, threading.get_ident(), detail, exc_type)
+
+    def spans(self):
+        """Recorded spans, oldest first."""
+        return sorted((span for span in list(self._spans) if span is not None), key=lambda span: span[2])
+
+
+class Tracer:
+    """Process-wide registry of the TraceBuffer of every app, dumps them as Chrome trace-event JSON that
+    chrome://tracing or https://ui.perfetto.dev can open.
+
+    Every app is a process in the trace and every thread that recorded one of its spans a thread, so a dispatch
+    shows its trigger callback with the constraint checks, actions, state reads and service calls it made nested
+    underneath. Service calls run on AppDaemon's event loop and show up on its thread.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+        self._origin = time.perf_counter()
+
+    def span(self, app, name, category, detail=None):
+        """Span of app's TraceBuffer, sized by trace_buffer_size in appdaemon.yaml when the app first traces."""
+        buffer = app.__dict__.get('_trace_buffer')
+        if buffer is None:
+            ad_config = app.__dict__.get('config') or {}
+            size = ad_config.get('trace_buffer_size')
+            buffer = self.buffer(app.name, size) if size else DISABLED_BUFFER
+            app._trace_buffer = buffer
+
+        return buffer.span(name, category, detail)
+
+    def buffer(self, app_name, size):
+        # an app that is reloaded starts over with a new buffer
+        buffer = TraceBuffer(app_name, size)
+        self._buffers[app_name] = buffer
+        return buffer
+
+    def chrome_trace(self, app_names=None):
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        events = []
+
+        buffers = [buffer for name, buffer in sorted(self._buffers.items()) if not app_names or name in app_names]
+        for pid, buffer in enumerate(buffers, start=1):
+            events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': buffer.app_name}})
+
+            thread_ids = set()
+            for name, category, started_at, ended_at, thread_id, detail, exc_type in buffer.spans():
+                thread_ids.add(thread_id)
+                event = {
+                    'name': name,
+                    'cat': category,
+                    'ph': 'X',
+                    'ts': round((started_at - self._origin) * 1e6, 1),
+                    'dur': round((ended_at - started_at) * 1e6, 1),
+                    'pid': pid,
+                    'tid': thread_id,
+                }
+                args = {}
+                if detail is not None:
+                    args['detail'] = str(detail)[:MAX_DETAIL_LENGTH]
+                if exc_type is not None:
+                    args['exception'] = exc_type.__name__
+                if args:
+                    event['args'] = args
+                events.append(event)
+
+            for thread_id in thread_ids:
+                events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread_id,
+                               'args': {'name': thread_names.get(thread_id, str(thread_id))}})
+
+        return {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+        }
+
+    def dump(self, directory, app_names=None):
+        """Writes chrome_trace() to a new file in directory, returns its path."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, 'trace-{}.json'.format(time.strftime('%Y%m%d-%H%M%S')))
+        with open(path, 'w') as file:
+            json.dump(self.chrome_trace(app_names), file)
+
+        return path
+
+    def stats(self):
+        return {
+            'traced_apps': len(self._buffers),
+            'buffered_spans': sum(len(buffer.spans()) for buffer in list(self._buffers.values())),
+        }
+
+    def __repr__(self):
+        return "{}(stats={})".format(
+            self.__class__.__name__,
+            self.stats())
+
+
+DISABLED_BUFFER = TraceBuffer(None, 0)
+TRACER = Tracer()
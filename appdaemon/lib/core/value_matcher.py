@@ -0,0 +1,157 @@
+import operator
+
+from lib.helper import to_float, is_float, flatten_dict
+
+# longest prefix first so '<=' isn't parsed as '<'
+NUMERIC_OPERATORS = [
+    ('<=', operator.le),
+    ('<', operator.lt),
+    ('>=', operator.ge),
+    ('>', operator.gt),
+]
+
+
+def compile_matcher(expected, membership=False):
+    """Compiles an expected config value into a matcher, a single '<x'/'>x' string is a numeric comparison, a list
+    is a membership check and anything else is compared by equality. With membership, expected is always treated
+    as a list of values."""
+    if membership:
+        return InMatcher(expected, expected)
+
+    value = expected
+    if isinstance(value, list) and len(value) == 1:
+        value = value[0]
+
+    if isinstance(value, list):
+        return InMatcher(expected, value)
+
+    if isinstance(value, str):
+        for op, operator_fn in NUMERIC_OPERATORS:
+            if value.startswith(op):
+                return NumericMatcher(expected, op, operator_fn, value)
+
+    return EqualsMatcher(expected, value)
+
+
+class ValueMatcher:
+    op = None
+
+    def __init__(self, expected, value):
+        self._expected = expected
+        self._value = value
+
+    @property
+    def expected(self):
+        """The config value this matcher was compiled from."""
+        return self._expected
+
+    @property
+    def value(self):
+        return self._value
+
+    def matches(self, actual):
+        raise NotImplementedError()
+
+    def __repr__(self):
+        return "{}({} {})".format(
+            self.__class__.__name__,
+            self.op,
+            self._value)
+
+
+class EqualsMatcher(ValueMatcher):
+    op = '=='
+
+    def matches(self, actual):
+        return self._value == actual
+
+
+class InMatcher(ValueMatcher):
+    op = 'in'
+
+    def __init__(self, expected, value):
+        super().__init__(expected, value)
+
+        try:
+            self._values = frozenset(value)
+        except TypeError:
+            self._values = None
+
+    def matches(self, actual):
+        if self._values is None:
+            return actual in self._value
+
+        try:
+            return actual in self._values
+        except TypeError:
+            return actual in self._value
+
+
+class NumericMatcher(ValueMatcher):
+
+    def __init__(self, expected, op, operator_fn, value):
+        super().__init__(expected, value)
+        self.op = op
+        self._operator_fn = operator_fn
+
+        try:
+            self._threshold = to_float(value.replace(op, ''))
+        except ValueError:
+            # keep failing on every check like before, not when the constraint is created
+            self._threshold = None
+
+    def matches(self, actual):
+        threshold = self._threshold
+        if threshold is None:
+            threshold = to_float(self._value.replace(self.op, ''))
+
+        actual = to_float(actual) if is_float(actual) else None
+        if actual is None:
+            return False
+
+        return self._operator_fn(actual, threshold)
+
+    def __repr__(self):
+        return "{}({} {})".format(
+            self.__class__.__name__,
+            self.op,
+            self._threshold)
+
+
+class EventDataMatcher:
+    """Compares event data against expected (nested) event data, flattened once when compiled."""
+
+    def __init__(self, expected_event_data):
+        self._expected = flatten_dict(expected_event_data)
+
+    @property
+    def expected(self):
+        return self._expected
+
+    def mismatch(self, event_data):
+        """Returns the first (key, expected, actual) that doesn't match, or None if all of them do."""
+        if not self._expected:
+            return None
+
+        event_data = flatten_dict(event_data)
+        for key, expected in self._expected.items():
+            actual = event_data.get(key)
+            if not self._match_value(expected, actual):
+                return key, expected, actual
+
+        return None
+
+    @staticmethod
+    def _match_value(expected, actual):
+        if expected == actual:
+            return True
+
+        if isinstance(expected, list) and not isinstance(actual, list):
+            return actual in expected
+
+        return False
+
+    def __repr__(self):
+        return "{}(expected={})".format(
+            self.__class__.__name__,
+            self._expected)
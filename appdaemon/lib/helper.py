@@ -1,4 +1,4 @@
-import collections
+import collections.abc
 from datetime import datetime
 
 from lib.context import PartsOfDay
@@ -137,7 +137,7 @@ def flatten_dict(d, parent_key=''):
     items = []
     for k, v in d.items():
         new_key = parent_key + sep + k if parent_key else k
-        if isinstance(v, collections.MutableMapping):
+        if isinstance(v, collections.abc.MutableMapping):
             items.extend(flatten_dict(v, new_key).items())
         else:
             items.append((new_key, v))
@@ -1,14 +1,126 @@
+import functools
+import importlib
+import json
+import math
+import threading
+import time
 import traceback
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from lib.core.job_journal import JOB_JOURNAL
 
-SCHEDULED_HANDLES = {}
 
+class ScheduledJob:
+    def __init__(self, name, handle, fire_time, interval=0, journal_id=None, explicit_key=False):
+        self._name = name
+        self._handle = handle
+        self._fire_time = fire_time
+        self._interval = interval
+        self._journal_id = journal_id
+        self._explicit_key = explicit_key
 
-def schedule_job(app, callback, delay, trigger_info=None):
-    cancel_job(app, trigger_info)
+    @property
+    def name(self):
+        return self._name
 
-    job_name = build_job_name(app, trigger_info)
-    SCHEDULED_HANDLES[job_name] = app.run_in(callback, delay, trigger_info=trigger_info)
+    @property
+    def handle(self):
+        return self._handle
+
+    @property
+    def fire_time(self):
+        return self._fire_time
+
+    @property
+    def interval(self):
+        return self._interval
+
+    @property
+    def journal_id(self):
+        return self._journal_id
+
+    @property
+    def explicit_key(self):
+        """Whether the job was scheduled under a job_key of its own, only cancelling that key cancels it."""
+        return self._explicit_key
+
+    def is_pending(self, now):
+        # a repeating job stays scheduled until it's cancelled
+        return self._interval != 0 or now <= self._fire_time
+
+    def __repr__(self):
+        return "{}(name={}, fire_time={}, interval={})".format(
+            self.__class__.__name__,
+            self._name,
+            self._fire_time,
+            self._interval)
+
+
+class JobRegistry:
+    """Thread-safe registry of scheduled jobs, indexed by app name and then by job key (the triggering entity_id,
+    or None for jobs that aren't tied to an entity)."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def add(self, app_name, key, job):
+        with self._lock:
+            self._jobs.setdefault(app_name, {})[key] = job
+
+    def remove(self, app_name, key, job=None):
+        """Removes the job stored under key, only if it's still job when one is given."""
+        with self._lock:
+            jobs = self._jobs.get(app_name)
+            if not jobs or key not in jobs or (job is not None and jobs[key] is not job):
+                return None
+
+            removed = jobs.pop(key)
+            if not jobs:
+                del self._jobs[app_name]
+
+            return removed
+
+    def remove_all(self, app_name, keep_explicit=False):
+        """Removes every job of app_name, except the ones scheduled under an explicit job_key when keep_explicit."""
+        with self._lock:
+            jobs = self._jobs.pop(app_name, {})
+            if not keep_explicit:
+                return jobs
+
+            kept = {key: job for key, job in jobs.items() if job.explicit_key}
+            if kept:
+                self._jobs[app_name] = kept
+
+            return {key: job for key, job in jobs.items() if not job.explicit_key}
+
+    def jobs(self, app_name):
+        with self._lock:
+            return dict(self._jobs.get(app_name, {}))
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(jobs) for jobs in self._jobs.values())
+
+    def __repr__(self):
+        return "{}(apps={}, jobs={})".format(
+            self.__class__.__name__,
+            len(self._jobs),
+            len(self))
+
+
+JOB_REGISTRY = JobRegistry()
+
+
+def schedule_job(app, callback, delay, trigger_info=None, job_key=None):
+    """Schedules callback to run in delay seconds, replacing the job of the same key. The key is the triggering
+    entity_id for state triggers unless job_key is given."""
+    cancel_job(app, trigger_info, job_key=job_key)
+
+    key = job_key or build_job_key(trigger_info)
+    job_name = build_job_name(app, trigger_info, job_key=job_key)
+    _register(app, key, job_name, callback, datetime.now() + timedelta(seconds=delay), 0, trigger_info,
+              lambda runner: app.run_in(runner, delay, trigger_info=trigger_info), explicit_key=job_key is not None)
 
     app.log('Scheduled job to run in {} seconds, job_name={}'.format(delay, job_name))
 
@@ -17,7 +129,8 @@ def schedule_jobs(app, jobs, trigger_info=None):
     cancel_job(app, trigger_info)
 
     for job_name, job in jobs.items():
-        SCHEDULED_HANDLES[job_name] = app.run_in(job['callback'], job['delay'], trigger_info=trigger_info)
+        _register(app, job_name, job_name, job['callback'], datetime.now() + timedelta(seconds=job['delay']), 0,
+                  trigger_info, lambda runner: app.run_in(runner, job['delay'], trigger_info=trigger_info))
 
         app.log('Scheduled job to run in {} seconds, job_name={}'.format(job['delay'], job_name))
 
@@ -25,8 +138,10 @@ def schedule_jobs(app, jobs, trigger_info=None):
 def schedule_repeat_job(app, callback, start, delay, trigger_info=None):
     cancel_job(app, trigger_info)
 
+    key = build_job_key(trigger_info)
     job_name = build_job_name(app, trigger_info)
-    SCHEDULED_HANDLES[job_name] = app.run_every(callback, start, delay, trigger_info=trigger_info)
+    _register(app, key, job_name, callback, start, delay, trigger_info,
+              lambda runner: app.run_every(runner, start, delay, trigger_info=trigger_info))
 
     app.log('Scheduled job to run at {} and repeat every {} seconds, job_name={}'.format(
         start,
@@ -34,75 +149,161 @@ def schedule_repeat_job(app, callback, start, delay, trigger_info=None):
         job_name))
 
 
-def cancel_job(app, trigger_info=None):
-    target_job_name = build_job_name(app, trigger_info)
-    if target_job_name is None:
-        return
+def _register(app, key, job_name, callback, fire_time, interval, trigger_info, schedule, explicit_key=False):
+    job = None
+
+    @functools.wraps(callback)
+    def job_runner(kwargs):
+        if not interval and job is not None:
+            JOB_REGISTRY.remove(app.name, key, job)
+            if job.journal_id is not None:
+                JOB_JOURNAL.remove(job.journal_id)
+
+        return callback(kwargs)
+
+    journal_id = _journal(app, key, job_name, callback, fire_time, interval, trigger_info, explicit_key)
+    job = ScheduledJob(job_name, schedule(job_runner), fire_time, interval, journal_id=journal_id,
+                       explicit_key=explicit_key)
+    JOB_REGISTRY.add(app.name, key, job)
+
+
+def _journal(app, key, job_name, callback, fire_time, interval, trigger_info, explicit_key):
+    if not app.__dict__.get('_journal_jobs') or not JOB_JOURNAL.is_open:
+        return None
+
+    from lib.core.component import Component
+
+    record = {
+        'app_name': app.name,
+        'key': key,
+        'explicit_key': explicit_key,
+        'job_name': job_name,
+        'method': callback.__name__,
+        'due': fire_time.timestamp(),
+        'interval': interval,
+        'trigger_info': None if trigger_info is None else {
+            'platform': trigger_info.platform,
+            'data': trigger_info.data,
+        },
+    }
+
+    # the callback is re-created after a restart, so it has to be a method of the app or of a component that
+    # can be built again from its config
+    target = getattr(callback, '__self__', None)
+    if target is app:
+        record['component'] = None
+    elif isinstance(target, Component):
+        try:
+            record['config'] = json.loads(json.dumps(target.cfg.raw_config))
+        except (TypeError, ValueError):
+            app.debug('Not journaling job {}, config of {} is not serializable'.format(job_name, target))
+            return None
 
-    existing_job_names = list(SCHEDULED_HANDLES.keys())
+        record['component'] = '{}:{}'.format(target.__class__.__module__, target.__class__.__qualname__)
+    else:
+        app.debug('Not journaling job {}, {} can\'t be restored'.format(job_name, callback))
+        return None
 
-    app.debug('cancelling job ... existing_job_names={}, target_job_name={}'.format(
-        existing_job_names,
-        target_job_name))
+    return JOB_JOURNAL.add(record)
 
-    for job_name in existing_job_names:
-        if job_name.startswith(target_job_name):
-            app.debug('About to cancel job: {}'.format(job_name))
 
-            try:
-                app.cancel_timer(SCHEDULED_HANDLES[job_name])
-                SCHEDULED_HANDLES.pop(job_name, None)
-                app.log('Cancelled job: {}'.format(job_name))
-            except:
-                app.warn('Error when cancel job: ' + traceback.format_exc())
+def restore_jobs(app):
+    """Re-arms the jobs app had pending before a restart, overdue ones run right away. New jobs of app are
+    journaled from now on."""
+    from lib.triggers import TriggerInfo
 
+    app._journal_jobs = True
 
-def build_job_name(app, trigger_info=None):
-    if not trigger_info:
-        app.debug('trigger_info is None, set job_name={}'.format(app.name))
-        return app.name
-    elif trigger_info.platform != 'state':
-        app.debug('trigger_info.platform is {}, set job_name={}'.format(trigger_info.platform, app.name))
-        return app.name
+    for record in sorted(JOB_JOURNAL.take_pending(app.name), key=lambda r: r['due']):
+        try:
+            callback = _restore_callback(app, record)
+        except Exception:
+            app.warn('Unable to restore job {}: {}'.format(record['job_name'], traceback.format_exc()))
+            continue
 
-    triggered_entity_id = trigger_info.data['entity_id']
-    if not triggered_entity_id:
-        app.debug('triggered_entity_id is None, set job_name={}'.format(app.name))
-        return app.name
+        trigger_info = None
+        if record['trigger_info'] is not None:
+            trigger_info = TriggerInfo(record['trigger_info']['platform'], record['trigger_info']['data'])
 
-    app_name = '{}_{}'.format(app.name, triggered_entity_id)
-    app.debug('built job_name={}'.format(app_name))
-    return app_name
+        now = time.time()
+        due = record['due']
+        interval = record['interval']
+        # journals written before explicit keys were recorded don't have it
+        explicit_key = record.get('explicit_key', False)
 
+        if interval:
+            if due < now:
+                due += math.ceil((now - due) / interval) * interval
 
-def find_scheduled_jobs(app):
-    jobs = {}
-    for job_name, handle in SCHEDULED_HANDLES.items():
-        if job_name.startswith(app.name):
-            jobs[job_name] = handle
+            start = datetime.fromtimestamp(due)
+            _register(app, record['key'], record['job_name'], callback, start, interval, trigger_info,
+                      lambda runner: app.run_every(runner, start, interval, trigger_info=trigger_info),
+                      explicit_key=explicit_key)
+        else:
+            delay = max(0, due - now)
+            _register(app, record['key'], record['job_name'], callback, datetime.fromtimestamp(due), 0, trigger_info,
+                      lambda runner: app.run_in(runner, delay, trigger_info=trigger_info), explicit_key=explicit_key)
 
-    return jobs
+        app.log('Restored job {} due at {}'.format(record['job_name'], datetime.fromtimestamp(due)))
 
 
-def has_scheduled_job(app):
-    jobs = find_scheduled_jobs(app)
+def _restore_callback(app, record):
+    if record['component'] is None:
+        return getattr(app, record['method'])
 
-    for handle in jobs.values():
-        if handle is None:
-            continue
+    module_name, class_name = record['component'].split(':')
+    component_class = importlib.import_module(module_name)
+    for name in class_name.split('.'):
+        component_class = getattr(component_class, name)
+
+    return getattr(component_class(app, record['config']), record['method'])
+
+
+def cancel_job(app, trigger_info=None, job_key=None):
+    key = job_key or build_job_key(trigger_info)
+
+    if key is None:
+        # jobs with a job_key of their own (e.g. motion lighting's turn off timer) are only cancelled by that key
+        app.debug('cancelling all jobs of {}'.format(app.name))
+        jobs = list(JOB_REGISTRY.remove_all(app.name, keep_explicit=True).values())
+    else:
+        app.debug('cancelling job of {} for {}'.format(app.name, key))
+        job = JOB_REGISTRY.remove(app.name, key)
+        jobs = [] if job is None else [job]
+
+    for job in jobs:
+        app.debug('About to cancel job: {}'.format(job.name))
+
+        if job.journal_id is not None:
+            JOB_JOURNAL.remove(job.journal_id)
 
         try:
-            scheduled_time, interval, kwargs = app.info_timer(handle)
+            app.cancel_timer(job.handle)
+            app.log('Cancelled job: {}'.format(job.name))
+        except:
+            app.warn('Error when cancel job: ' + traceback.format_exc())
+
+
+def build_job_key(trigger_info=None):
+    """Jobs scheduled from a state trigger are keyed by the triggering entity, everything else by None."""
+    if not trigger_info or trigger_info.platform != 'state':
+        return None
+
+    return trigger_info.data['entity_id'] or None
+
+
+def build_job_name(app, trigger_info=None, job_key=None):
+    key = job_key or build_job_key(trigger_info)
+    if key is None:
+        return app.name
+
+    return '{}_{}'.format(app.name, key)
 
-            # if job is already run, check if it's repeatable job or not
-            if datetime.now() > scheduled_time:
-                if interval != 0:
-                    return True
-                else:
-                    continue
 
-            return True
-        except (ValueError, TypeError):
-            app.debug('Unknown handle: {} in {}\n{}'.format(handle, jobs, traceback.format_exc()))
+def find_scheduled_jobs(app):
+    return {job.name: job.handle for job in JOB_REGISTRY.jobs(app.name).values()}
+
 
-    return False
+def has_scheduled_job(app):
+    now = datetime.now()
+    return any(job.is_pending(now) for job in JOB_REGISTRY.jobs(app.name).values())
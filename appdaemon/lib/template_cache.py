@@ -0,0 +1,94 @@
+import threading
+from collections import OrderedDict
+
+from jinja2 import meta
+
+DEFAULT_MAX_SIZE = 2048
+
+
+class TemplateCache:
+    """Bounded LRU cache of compiled jinja templates keyed by template source.
+
+    Compiled templates don't hold any per-app state (app bound functions are passed in at render time), so a single
+    cache can be shared by every renderer in the process.
+    """
+
+    def __init__(self, environment, max_size=DEFAULT_MAX_SIZE):
+        self._environment = environment
+        self._max_size = max_size
+        self._templates = OrderedDict()
+        self._variables = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def environment(self):
+        return self._environment
+
+    def get(self, source):
+        with self._lock:
+            template = self._templates.get(source)
+            if template is not None:
+                self._templates.move_to_end(source)
+                self._hits += 1
+                return template
+
+            self._misses += 1
+
+        # compile outside of the lock, two threads racing on the same source will produce identical templates
+        template = self._environment.from_string(source)
+
+        with self._lock:
+            self._templates[source] = template
+            self._templates.move_to_end(source)
+
+            while len(self._templates) > self._max_size:
+                self._templates.popitem(last=False)
+                self._evictions += 1
+
+        return template
+
+    def variables(self, source):
+        """Returns the names a template looks up in its render context, i.e. globals and render arguments."""
+        with self._lock:
+            names = self._variables.get(source)
+            if names is not None:
+                self._variables.move_to_end(source)
+                return names
+
+        names = frozenset(meta.find_undeclared_variables(self._environment.parse(source)))
+
+        with self._lock:
+            self._variables[source] = names
+            while len(self._variables) > self._max_size:
+                self._variables.popitem(last=False)
+
+        return names
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+            self._variables.clear()
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._templates),
+                'max_size': self._max_size,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+            }
+
+    def __len__(self):
+        return len(self._templates)
+
+    def __repr__(self):
+        return "{}(stats={})".format(
+            self.__class__.__name__,
+            self.stats())
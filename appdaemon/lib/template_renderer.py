@@ -3,6 +3,20 @@ from datetime import datetime
 from jinja2 import Environment
 
 from lib.helper import to_int, to_float, to_datetime, is_float, is_int
+from lib.template_cache import TemplateCache
+from lib.template_result_cache import record_dependency, get_template_results
+
+def is_template(value):
+    return isinstance(value, str) and ("{{" in value or "{%" in value)
+
+
+def contains_template(value):
+    if isinstance(value, dict):
+        return any(contains_template(v) for v in value.values())
+    elif isinstance(value, list):
+        return any(contains_template(v) for v in value)
+
+    return is_template(value)
 
 
 def safe_eval(value):
@@ -12,118 +26,153 @@ def safe_eval(value):
         return value
 
 
-class TemplateRenderer:
-    def __init__(self, app):
-        self._app = app
-        self._jinja_env = Environment()
+def format_date(date, format='%b %d'):
+    if not isinstance(date, datetime):
+        date = datetime.strptime(date, '%Y-%m-%d %H:%M:%S')
+
+    return date.strftime(format)
+
+
+def get_age(date) -> str:
+    def formatn(number: int, unit: str) -> str:
+        """Add "unit" if it's plural."""
+        if number == 1:
+            return "1 {}".format(unit)
+        return "{:d} {}s".format(number, unit)
+
+    def q_n_r(first: int, second: int):
+        """Return quotient and remaining."""
+        return first // second, first % second
+
+    if not isinstance(date, datetime):
+        date = to_datetime(date).replace(tzinfo=None)
+
+    delta = datetime.utcnow() - date
+    day = delta.days
+    second = delta.seconds
 
-        def get_state(entity_id, overrides={}):
-            state = self._get_state(entity_id)
-            return overrides.get(state, state)
+    year, day = q_n_r(day, 365)
+    if year > 0:
+        return formatn(year, "year")
 
-        def get_state_attribute(entity_id, attribute):
-            return self._get_state(entity_id, attribute=attribute)
+    month, day = q_n_r(day, 30)
+    if month > 0:
+        return formatn(month, "month")
+    if day > 0:
+        return formatn(day, "day")
 
-        def is_state_attribute(entity_id, attribute, expected):
-            value = get_state_attribute(entity_id, attribute)
+    hour, second = q_n_r(second, 3600)
+    if hour > 0:
+        return formatn(hour, "hour")
 
-            if value is None:
-                return False
+    minute, second = q_n_r(second, 60)
+    if minute > 0:
+        return formatn(minute, "minute")
 
-            return value == expected
+    return formatn(second, "second")
 
-        def get_friendly_name(entity_id):
-            return self._get_state(entity_id, attribute="friendly_name")
 
-        def format_date(date, format='%b %d'):
-            if not isinstance(date, datetime):
-                date = datetime.strptime(date, '%Y-%m-%d %H:%M:%S')
+# one environment for the whole process, only functions that don't depend on an app are registered here
+TEMPLATE_ENVIRONMENT = Environment()
+TEMPLATE_ENVIRONMENT.globals['format_date'] = format_date
+TEMPLATE_ENVIRONMENT.globals['relative_time'] = get_age
 
-            return date.strftime(format)
+TEMPLATE_CACHE = TemplateCache(TEMPLATE_ENVIRONMENT)
 
-        def get_age(date) -> str:
-            def formatn(number: int, unit: str) -> str:
-                """Add "unit" if it's plural."""
-                if number == 1:
-                    return "1 {}".format(unit)
-                return "{:d} {}s".format(number, unit)
 
-            def q_n_r(first: int, second: int):
-                """Return quotient and remaining."""
-                return first // second, first % second
+def get_app_globals(app):
+    """Returns the template globals bound to an app, they're built once per app and shared by all its components."""
+    app_globals = app.__dict__.get('_template_globals')
+    if app_globals is None:
+        app_globals = _build_app_globals(app)
+        app.__dict__['_template_globals'] = app_globals
 
-            if not isinstance(date, datetime):
-                date = to_datetime(date).replace(tzinfo=None)
+    return app_globals
 
-            delta = datetime.utcnow() - date
-            day = delta.days
-            second = delta.seconds
 
-            year, day = q_n_r(day, 365)
-            if year > 0:
-                return formatn(year, "year")
+def _build_app_globals(app):
+    def get_state(entity_id, overrides={}):
+        record_dependency(entity_id)
+        state = app.get_state(entity_id)
+        return overrides.get(state, state)
 
-            month, day = q_n_r(day, 30)
-            if month > 0:
-                return formatn(month, "month")
-            if day > 0:
-                return formatn(day, "day")
+    def get_state_attribute(entity_id, attribute):
+        record_dependency(entity_id, attribute)
+        return app.get_state(entity_id, attribute=attribute)
 
-            hour, second = q_n_r(second, 3600)
-            if hour > 0:
-                return formatn(hour, "hour")
+    def is_state_attribute(entity_id, attribute, expected):
+        value = get_state_attribute(entity_id, attribute)
 
-            minute, second = q_n_r(second, 60)
-            if minute > 0:
-                return formatn(minute, "minute")
+        if value is None:
+            return False
 
-            return formatn(second, "second")
+        return value == expected
 
-        def now_is_between(start_time, end_time):
-            return self._now_is_between(start_time, end_time)
+    def get_friendly_name(entity_id):
+        record_dependency(entity_id, 'friendly_name')
+        return app.get_state(entity_id, attribute="friendly_name")
 
-        self._jinja_env.globals['state'] = get_state
-        self._jinja_env.globals['state_attr'] = get_state_attribute
-        self._jinja_env.globals['is_state_attr'] = is_state_attribute
-        self._jinja_env.globals['friendly_name'] = get_friendly_name
-        self._jinja_env.globals['format_date'] = format_date
-        self._jinja_env.globals['relative_time'] = get_age
-        self._jinja_env.globals['now_is_between'] = now_is_between
+    def now_is_between(start_time, end_time):
+        return app.now_is_between(start_time, end_time)
 
-        if hasattr(self._app, 'variables'):
-            for name, value in self._app.variables.items():
-                if name in self._jinja_env.globals:
-                    raise ValueError('Variable {} already defined in template'.format(name))
+    app_globals = {
+        'state': get_state,
+        'state_attr': get_state_attribute,
+        'is_state_attr': is_state_attribute,
+        'friendly_name': get_friendly_name,
+        'now_is_between': now_is_between,
+    }
 
-                self._jinja_env.globals[name] = value
+    if hasattr(app, 'variables'):
+        for name, value in app.variables.items():
+            if name in app_globals or name in TEMPLATE_ENVIRONMENT.globals:
+                raise ValueError('Variable {} already defined in template'.format(name))
+
+            app_globals[name] = value
+
+    return app_globals
+
+
+class TemplateRenderer:
+    def __init__(self, app):
+        self._app = app
+        self._globals = None
+
+    def _get_globals(self):
+        # resolved on first render so that app variables defined during initialize() are picked up
+        if self._globals is None:
+            self._globals = get_app_globals(self._app)
+
+        return self._globals
 
     def render(self, message, **kwargs):
         if self._should_render_template(message):
-            template = self._jinja_env.from_string(message)
-            rendered = template.render(**kwargs)
+            results = get_template_results(self._app)
+            if results is not None:
+                return results.get(message, kwargs, lambda: self._render(message, **kwargs))
 
-            if is_float(rendered):
-                rendered = to_float(rendered)
-            elif is_int(rendered):
-                rendered = to_int(rendered)
-            elif rendered.startswith('[') or rendered.startswith('{'):
-                rendered = safe_eval(rendered)
+            return self._render(message, **kwargs)
 
-            if self._should_render_template(rendered):
-                rendered = self.render(rendered, **kwargs)
+        return message
 
-            if isinstance(rendered, str):
-                rendered = rendered.strip()
+    def _render(self, message, **kwargs):
+        template = TEMPLATE_CACHE.get(message)
+        rendered = template.render(self._get_globals(), **kwargs)
 
-            return rendered
+        if is_float(rendered):
+            rendered = to_float(rendered)
+        elif is_int(rendered):
+            rendered = to_int(rendered)
+        elif rendered.startswith('[') or rendered.startswith('{'):
+            rendered = safe_eval(rendered)
 
-        return message
+        if self._should_render_template(rendered):
+            rendered = self.render(rendered, **kwargs)
 
-    def _should_render_template(self, message):
-        return isinstance(message, str) and ("{{" in message or "{%" in message)
+        if isinstance(rendered, str):
+            rendered = rendered.strip()
 
-    def _get_state(self, entity=None, **kwargs):
-        return self._app.get_state(entity, **kwargs)
+        return rendered
 
-    def _now_is_between(self, start_time, end_time):
-        return self._app.now_is_between(start_time, end_time)
+    def _should_render_template(self, message):
+        return is_template(message)
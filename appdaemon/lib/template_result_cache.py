@@ -0,0 +1,155 @@
+import copy
+import re
+import threading
+import time
+
+from lib.core.state_mirror import STATE_MIRROR
+
+# templates calling these depend on the current time, not only on entity states
+TIME_DEPENDENT_FUNCTIONS = frozenset(['now_is_between', 'relative_time'])
+DEFAULT_TTL = 10
+
+# a different value on every render, can't be cached at all
+RANDOM_FILTER = re.compile(r'\|\s*random\b')
+
+# results of these types are shared between hits as they are, anything else is copied for every caller
+IMMUTABLE_RESULTS = (str, int, float, bool, type(None))
+
+_local = threading.local()
+
+
+def record_dependency(entity_id, attribute=None):
+    """Called by the template state functions before reading entity_id, adds it to the dependencies of the template
+    being rendered."""
+    dependencies = getattr(_local, 'dependencies', None)
+    if dependencies is not None:
+        dependencies.add((entity_id, attribute))
+        # the version before reading, a change landing in between makes the result look stale rather than current
+        _local.versions.setdefault(entity_id, STATE_MIRROR.version(entity_id))
+
+
+def get_template_results(app):
+    return app.__dict__.get('_template_results')
+
+
+def _result_copy(result):
+    if isinstance(result, IMMUTABLE_RESULTS):
+        return result
+
+    return copy.deepcopy(result)
+
+
+class _Entry:
+    def __init__(self, result, dependencies, versions, expires_at):
+        self.result = result
+        self.dependencies = dependencies
+        self.versions = versions
+        self.expires_at = expires_at
+
+    def is_current(self, now):
+        if self.expires_at is not None and self.expires_at <= now:
+            return False
+
+        return all(STATE_MIRROR.version(entity_id) == version for entity_id, version in self.versions)
+
+
+class TemplateResultCache:
+    """Per-app cache of rendered template values.
+
+    While a template renders, every entity it reads through state()/state_attr()/is_state_attr()/friendly_name()
+    is recorded with its STATE_MIRROR version. The rendered value is then reused until one of those entities changes
+    version, nothing has to listen for the changes and a callback of the change already sees the entry as stale.
+    Templates that depend on the current time are rendered again once ttl seconds have passed. Templates that read
+    render arguments (e.g. trigger_info) or random values are never cached, and while the mirror isn't live there are
+    no versions to compare so every template is rendered.
+    """
+
+    def __init__(self, app, template_cache, ttl=DEFAULT_TTL):
+        self._app = app
+        self._template_cache = template_cache
+        self._ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'uncacheable': 0,
+            'invalidations': 0,
+            'bypassed': 0,
+        }
+
+    def get(self, source, kwargs, render_fn):
+        """Returns the cached value of source, calling render_fn() to render it when there is none."""
+        if getattr(_local, 'dependencies', None) is not None:
+            # nested render, its reads count towards the outer template
+            return render_fn()
+
+        if not STATE_MIRROR.is_live:
+            with self._lock:
+                self._stats['bypassed'] += 1
+            return render_fn()
+
+        variables = self._template_cache.variables(source)
+        if any(name in kwargs for name in variables) or 'lipsum' in variables or RANDOM_FILTER.search(source):
+            with self._lock:
+                self._stats['uncacheable'] += 1
+            return render_fn()
+
+        with self._lock:
+            entry = self._entries.get(source)
+            if entry is not None:
+                if entry.is_current(time.monotonic()):
+                    self._stats['hits'] += 1
+                    return _result_copy(entry.result)
+
+                self._stats['invalidations'] += 1
+                del self._entries[source]
+
+            self._stats['misses'] += 1
+
+        dependencies = set()
+        _local.dependencies = dependencies
+        _local.versions = {}
+        try:
+            result = render_fn()
+            versions = tuple(_local.versions.items())
+        finally:
+            _local.dependencies = None
+            _local.versions = None
+
+        expires_at = None
+        if variables & TIME_DEPENDENT_FUNCTIONS:
+            expires_at = time.monotonic() + self._ttl
+
+        with self._lock:
+            self._entries[source] = _Entry(result, frozenset(dependencies), versions, expires_at)
+
+        self._app.debug('Template {} depends on {}'.format(source, sorted(dependencies, key=str)))
+
+        return _result_copy(result)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def dependencies(self):
+        """Returns each cached template with the entities (and attributes) it was rendered from."""
+        now = time.monotonic()
+        with self._lock:
+            return {source: {
+                'entities': sorted(entity_id if attribute is None else '{}.{}'.format(entity_id, attribute)
+                                   for entity_id, attribute in entry.dependencies),
+                'expires_in': None if entry.expires_at is None else max(0, entry.expires_at - now),
+            } for source, entry in self._entries.items()}
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                'size': len(self._entries),
+            }
+
+    def __repr__(self):
+        return "{}(stats={})".format(
+            self.__class__.__name__,
+            self.stats())
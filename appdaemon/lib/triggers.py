@@ -1,7 +1,10 @@
+import threading
+import time
 from datetime import datetime, timedelta
 
 from lib.core.component import Component
 from lib.core.monitored_callback import monitored_callback
+from lib.helper import is_float, to_float
 
 
 def get_trigger(app, config, callback):
@@ -22,6 +25,20 @@ def get_trigger(app, config, callback):
         raise ValueError("Invalid trigger config: " + config)
 
 
+def get_async_trigger(app, config, callback, sync_callback):
+    """Trigger for an app running on the event loop, callback is a coroutine function. Platforms without an async
+    version get the sync trigger with sync_callback, which hands the dispatch over to the loop."""
+    platform = config["platform"]
+    if platform == "state" and not any(config.get(option) is not None for option in RATE_LIMIT_OPTIONS):
+        return AsyncStateTrigger(app, config, callback)
+    elif platform == "event":
+        return AsyncEventTrigger(app, config, callback)
+    elif platform == "action":
+        return AsyncActionTrigger(app, config, callback)
+
+    return get_trigger(app, config, sync_callback)
+
+
 class TriggerInfo:
     def __init__(self, platform, data={}):
         self._platform = platform
@@ -58,7 +75,15 @@ class Trigger(Component):
 
         self._callback = callback
 
-        self.app.debug('Registered trigger {} with {}'.format(self, trigger_config))
+        self.app.debug('Registered trigger {} with {}', self, trigger_config)
+
+
+class AsyncTrigger(Trigger):
+    """Trigger whose handlers are coroutines, AppDaemon runs them on its event loop and the callback is awaited there
+    instead of on a worker thread."""
+
+
+RATE_LIMIT_OPTIONS = ['debounce', 'throttle', 'coalesce', 'min_delta']
 
 
 class StateTrigger(Trigger):
@@ -91,18 +116,165 @@ class StateTrigger(Trigger):
         if not entity_ids:
             entity_ids.extend(self.cfg.list('entity_id', []))
 
-        if not entity_ids:
+        # globs like binary_sensor.*_motion, or regexes starting with ^
+        patterns = self.cfg.list('pattern', [])
+
+        if not entity_ids and not patterns:
             raise ValueError("Missing entity_ids in config: {}".format(trigger_config))
 
+        # rate limiting for chatty entities, all in seconds except min_delta
+        self._debounce = self.cfg.float('debounce', None)
+        self._throttle = self.cfg.float('throttle', None)
+        self._coalesce = self.cfg.float('coalesce', None)
+        self._min_delta = self.cfg.float('min_delta', None)
+
+        if len([w for w in [self._debounce, self._throttle, self._coalesce] if w is not None]) > 1:
+            raise ValueError("Only one of debounce, throttle and coalesce can be used: {}".format(trigger_config))
+
+        self._lock = threading.Lock()
+        self._pending = {}
+        # tells a timer that fired while being rescheduled apart from the one that replaced it
+        self._timer_generation = 0
+        self._last_fired_at = {}
+        self._last_values = {}
+        self._stats = {
+            'received': 0,
+            'delivered': 0,
+            'suppressed_min_delta': 0,
+            'suppressed_throttle': 0,
+            'suppressed_debounce': 0,
+            'suppressed_coalesce': 0,
+        }
+
         for entity_id in entity_ids:
             self.app.listen_state(self._state_change_handler, entity_id, **settings)
 
+        if patterns:
+            self.app.listen_state_pattern(self._state_change_handler, patterns, **settings)
+
     @monitored_callback
     def _state_change_handler(self, entity_id, attribute, old, new, kwargs):
         if old == new:
             return
 
-        self._callback(TriggerInfo("state", {
+        data = {
+            "entity_id": entity_id,
+            "attribute": attribute,
+            "from": old,
+            "to": new,
+        }
+        key = (entity_id, attribute)
+
+        with self._lock:
+            self._stats['received'] += 1
+
+            if not self._passes_min_delta(key, old, new):
+                return self._suppress('min_delta', data)
+
+            if self._throttle is not None:
+                now = time.monotonic()
+                last_fired_at = self._last_fired_at.get(key)
+                if last_fired_at is not None and now - last_fired_at < self._throttle:
+                    return self._suppress('throttle', data)
+
+                self._last_fired_at[key] = now
+            elif self._debounce is not None or self._coalesce is not None:
+                return self._hold(key, data)
+
+        self._fire(data)
+
+    def _passes_min_delta(self, key, old, new):
+        if self._min_delta is None:
+            return True
+
+        baseline = self._last_values.setdefault(key, old)
+        if not is_float(baseline) or not is_float(new):
+            self._last_values[key] = new
+            return True
+
+        if abs(to_float(new) - to_float(baseline)) < self._min_delta:
+            # baseline is kept, so slow drifts still fire once they add up to min_delta
+            return False
+
+        self._last_values[key] = new
+        return True
+
+    def _hold(self, key, data):
+        pending = self._pending.get(key)
+
+        if pending is None:
+            delay = self._debounce if self._debounce is not None else self._coalesce
+            pending = self._pending[key] = {'data': data}
+            self._schedule_pending(key, pending, delay)
+            return
+
+        # only the latest value is delivered, but from the state before the first held change
+        pending['data'] = {**data, 'from': pending['data']['from']}
+
+        if self._debounce is not None:
+            self._suppress('debounce', data)
+            self.app.cancel_timer(pending['handle'])
+            self._schedule_pending(key, pending, self._debounce)
+        else:
+            self._suppress('coalesce', data)
+
+    def _schedule_pending(self, key, pending, delay):
+        self._timer_generation += 1
+        pending['generation'] = self._timer_generation
+        pending['handle'] = self.app.run_in(self._pending_timer_handler, delay, trigger_key=key,
+                                            generation=self._timer_generation)
+
+    @monitored_callback
+    def _pending_timer_handler(self, kwargs):
+        with self._lock:
+            pending = self._pending.get(kwargs['trigger_key'])
+            if pending is None or pending['generation'] != kwargs['generation']:
+                # already fired, or fired while _hold was rescheduling it and the new timer delivers instead
+                return
+
+            del self._pending[kwargs['trigger_key']]
+
+            data = pending['data']
+            if data['from'] == data['to']:
+                # changed back within the window, nothing to report
+                return self._suppress('debounce' if self._debounce is not None else 'coalesce', data)
+
+        self._fire(data)
+
+    def _suppress(self, reason, data):
+        self._stats['suppressed_' + reason] += 1
+        self.debug('Suppressed by {}: {}', reason, data)
+
+    def _fire(self, data):
+        with self._lock:
+            self._stats['delivered'] += 1
+
+        self._callback(TriggerInfo("state", data))
+
+    def stats(self):
+        """Counts raw state changes received, delivered to the callback and suppressed by each rate limit."""
+        with self._lock:
+            return dict(self._stats)
+
+
+class AsyncStateTrigger(AsyncTrigger, StateTrigger):
+    def __init__(self, app, trigger_config, callback):
+        # rate limiting relies on timers, which don't hand back a handle on the loop
+        if any(trigger_config.get(option) is not None for option in RATE_LIMIT_OPTIONS):
+            raise ValueError("Rate limiting is only supported by the sync state trigger: {}".format(trigger_config))
+
+        super().__init__(app, trigger_config, callback)
+
+    @monitored_callback
+    async def _state_change_handler(self, entity_id, attribute, old, new, kwargs):
+        if old == new:
+            return
+
+        with self._lock:
+            self._stats['received'] += 1
+            self._stats['delivered'] += 1
+
+        await self._callback(TriggerInfo("state", {
             "entity_id": entity_id,
             "attribute": attribute,
             "from": old,
@@ -118,7 +290,7 @@ class TimeTrigger(Trigger):
         seconds = self.cfg.value("seconds", 0)
         interval_in_seconds = minutes * 60 + seconds
         if interval_in_seconds > 0:
-            self.app.debug('Scheduled time trigger to run every {} sec'.format(interval_in_seconds))
+            self.app.debug('Scheduled time trigger to run every {} sec', interval_in_seconds)
             now = datetime.now() + timedelta(seconds=2)
             self.app.run_every(self._run_every_handler, now, interval_in_seconds, **{
                 'time': {
@@ -129,7 +301,7 @@ class TimeTrigger(Trigger):
         elif self.cfg.value("time") is not None:
             times = self.cfg.list("time");
             for time in times:
-                self.app.debug('Scheduled time trigger to run at {}'.format(time))
+                self.app.debug('Scheduled time trigger to run at {}', time)
                 self.app.run_daily(self._run_every_handler, time, **{
                     'time': time,
                 })
@@ -159,16 +331,34 @@ class EventTrigger(Trigger):
 
     @monitored_callback
     def _event_change_handler(self, event_name, data, kwargs):
+        if not self._matches_event_data(data):
+            return
+
+        self._callback(TriggerInfo("event", {
+            "event_name": event_name,
+            "data": data,
+        }))
+
+    def _matches_event_data(self, data):
         for data_key, data_value in self._event_data.items():
             if data.get(data_key) != data_value:
-                self.debug('Event data ({}) does not match constraint ({}/{} - {}), skipping'.format(
-                    data,
-                    data_key,
-                    data_value,
-                    self._event_data))
-                return
+                self.debug('Event data ({}) does not match constraint ({}/{} - {}), skipping',
+                           data,
+                           data_key,
+                           data_value,
+                           self._event_data)
+                return False
 
-        self._callback(TriggerInfo("event", {
+        return True
+
+
+class AsyncEventTrigger(AsyncTrigger, EventTrigger):
+    @monitored_callback
+    async def _event_change_handler(self, event_name, data, kwargs):
+        if not self._matches_event_data(data):
+            return
+
+        await self._callback(TriggerInfo("event", {
             "event_name": event_name,
             "data": data,
         }))
@@ -219,3 +409,16 @@ class ActionTrigger(Trigger):
             'action_name': action_name,
             'data': data,
         }))
+
+
+class AsyncActionTrigger(AsyncTrigger, ActionTrigger):
+    @monitored_callback
+    async def _event_change_handler(self, event_name, data, kwargs):
+        action_name = data.get('actionName')
+        if self._target_name is not None and self._target_name != action_name:
+            return
+
+        await self._callback(TriggerInfo('action', {
+            'action_name': action_name,
+            'data': data,
+        }))
@@ -0,0 +1,57 @@
+import threading
+import unittest
+
+from lib.core.action_executor import ActionExecutor
+
+
+class TestActionExecutor(unittest.TestCase):
+
+    def test_all_items_are_run(self):
+        executor = ActionExecutor(max_workers=2)
+        done = []
+        lock = threading.Lock()
+
+        def fn(item, suffix):
+            with lock:
+                done.append(item + suffix)
+
+        executor.run_all('app', fn, ['a', 'b', 'c', 'd'], '!')
+
+        self.assertEqual(sorted(done), ['a!', 'b!', 'c!', 'd!'])
+        self.assertEqual(executor.stats()['running'], 0)
+        self.assertEqual(executor.stats()['caller_backlog'], 0)
+
+    def test_app_cannot_use_more_than_its_share_of_workers(self):
+        executor = ActionExecutor(max_workers=4)
+        threads = set()
+        barrier = threading.Barrier(2, timeout=5)
+
+        def fn(item):
+            threads.add(threading.current_thread().name)
+            if item < 2:
+                barrier.wait()
+
+        executor.run_all('app', fn, [0, 1, 2, 3, 4], max_workers_per_app=1)
+
+        stats = executor.stats()
+        self.assertEqual(stats['submitted'], 1)
+        self.assertEqual(stats['ran_in_caller'], 3)
+        self.assertEqual(stats['max_caller_backlog'], 3)
+        self.assertEqual(stats['caller_backlog'], 0)
+        self.assertEqual(len(threads), 2)
+
+    def test_nested_run_all_on_worker_runs_in_caller(self):
+        executor = ActionExecutor(max_workers=1)
+        done = []
+
+        def inner(item):
+            done.append(item)
+
+        def outer(item):
+            if item == 'nested':
+                executor.run_all('other_app', inner, ['x', 'y'])
+
+        executor.run_all('app', outer, ['first', 'nested'])
+
+        self.assertEqual(sorted(done), ['x', 'y'])
+        self.assertEqual(executor.stats()['submitted'], 1)
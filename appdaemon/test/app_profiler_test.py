@@ -0,0 +1,61 @@
+import os
+import pstats
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from lib.core.app_profiler import NO_PROFILING, AppProfiler
+from lib.core.monitored_callback import monitored_callback
+
+
+def create_app(args, profile_state='off'):
+    app = MagicMock()
+    app.name = 'motion_lighting'
+    app.args = args
+    app.get_state.return_value = profile_state
+    return app
+
+
+def busy_work():
+    return sum(range(1000))
+
+
+@monitored_callback
+def state_change_handler(app, entity, attribute, old, new, kwargs):
+    busy_work()
+
+
+class TestAppProfiler(unittest.TestCase):
+
+    def test_apps_without_profile_entity_are_not_profiled(self):
+        profiler = AppProfiler()
+        app = create_app({})
+
+        self.assertIs(profiler.profiling(app), NO_PROFILING)
+        self.assertIs(profiler.profiling(app), NO_PROFILING)
+        app.listen_state.assert_not_called()
+        self.assertEqual(profiler.stats()['watched_apps'], 0)
+
+    def test_profiles_callbacks_while_entity_is_on(self):
+        profiler = AppProfiler()
+
+        with tempfile.TemporaryDirectory() as directory, patch('lib.core.monitored_callback.APP_PROFILER', profiler):
+            app = create_app({'profile_entity_id': 'input_boolean.profile_motion_lighting', 'profile_dir': directory},
+                             profile_state='on')
+
+            state_change_handler(app, 'binary_sensor.motion', 'state', 'off', 'on', {})
+            state_change_handler(app, 'binary_sensor.motion', 'state', 'on', 'off', {})
+            self.assertEqual(profiler.stats()['profiling_apps'], ['motion_lighting'])
+
+            handler, entity_id = app.listen_state.call_args[0]
+            self.assertEqual(entity_id, 'input_boolean.profile_motion_lighting')
+            handler(entity_id, 'state', 'on', 'off', {})
+
+            profiles = os.listdir(directory)
+            self.assertEqual(len(profiles), 1)
+            stats = pstats.Stats(os.path.join(directory, profiles[0]))
+
+        functions = {function: stat[1] for (_, _, function), stat in stats.stats.items()}
+        self.assertEqual(functions['busy_work'], 2)
+        self.assertEqual(profiler.stats()['profiling_apps'], [])
+        self.assertIs(profiler.profiling(app), NO_PROFILING)
@@ -0,0 +1,158 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import Mock, MagicMock, patch
+
+import appdaemon.plugins.hass.hassapi as hass
+
+from async_automation import AsyncAutomation, create_async_handler
+from lib.actions import AsyncServiceAction, TurnOnAction
+from lib.constraints import AsyncStateConstraint, AsyncConstraintAdapter, get_async_constraint
+from lib.triggers import TriggerInfo
+
+
+class FakeHass:
+    """Async stand-ins for the AppDaemon Hass API, records the thread every call ran on."""
+
+    def __init__(self, states, service_latency=0):
+        self.states = states
+        self.service_latency = service_latency
+        self.service_calls = []
+        self.threads = set()
+
+    def patch(self):
+        fake = self
+
+        async def get_state(app, entity=None, **kwargs):
+            fake.threads.add(threading.get_ident())
+            return fake.states.get(entity)
+
+        async def call_service(app, service, **kwargs):
+            fake.threads.add(threading.get_ident())
+            await asyncio.sleep(fake.service_latency)
+            fake.service_calls.append((service, kwargs))
+
+        return patch.multiple(hass.Hass, get_state=get_state, call_service=call_service)
+
+
+def create_app():
+    app = object.__new__(AsyncAutomation)
+    app.name = 'async_automation'
+    app.args = {}
+    app.log = MagicMock()
+    app.AD = Mock()
+    app._global_constraints = []
+    app._handlers = []
+    app._handler_index = None
+    return app
+
+
+async def do_actions(app, actions):
+    await app.do_actions(actions, None)
+
+
+def service_action(entity_id):
+    return {'platform': 'service', 'service': 'light/turn_on', 'data': {'entity_id': entity_id}}
+
+
+class TestAsyncAutomation(unittest.TestCase):
+
+    def test_dispatch_runs_on_the_loop(self):
+        fake = FakeHass({'binary_sensor.kitchen_motion': 'on', 'input_boolean.enabled': 'on'})
+        app = create_app()
+        loop_threads = set()
+
+        with fake.patch():
+            app.init_handler(create_async_handler(app, {
+                'constraints': [
+                    {'platform': 'state', 'entity_id': 'input_boolean.enabled', 'state': 'on'},
+                    {'platform': 'triggered_state', 'entity_id': 'binary_sensor.kitchen_motion', 'to': 'on'},
+                ],
+                'actions': [service_action('light.kitchen')],
+            }))
+
+            async def dispatch():
+                loop_threads.add(threading.get_ident())
+                await app.trigger_handler(TriggerInfo('state', {
+                    'entity_id': 'binary_sensor.kitchen_motion',
+                    'attribute': None,
+                    'from': 'off',
+                    'to': 'on',
+                }))
+
+            asyncio.run(dispatch())
+
+        self.assertEqual(fake.service_calls, [('light/turn_on', {'entity_id': 'light.kitchen'})])
+        self.assertEqual(fake.threads, loop_threads)
+
+    def test_actions_are_gathered(self):
+        fake = FakeHass({}, service_latency=0.1)
+        app = create_app()
+
+        with fake.patch():
+            actions = [AsyncServiceAction(app, service_action('light.{}'.format(i))) for i in range(5)]
+
+            start = time.perf_counter()
+            asyncio.run(do_actions(app, actions))
+            elapsed = time.perf_counter() - start
+
+        self.assertEqual(len(fake.service_calls), 5)
+        self.assertLess(elapsed, 0.3)
+
+    def test_async_actions_are_traced(self):
+        fake = FakeHass({})
+        app = create_app()
+        app.config = {'trace_buffer_size': 10}
+
+        with fake.patch():
+            asyncio.run(do_actions(app, [AsyncServiceAction(app, service_action('light.kitchen'))]))
+
+        self.assertIn(('AsyncServiceAction', 'action'), [span[:2] for span in app._trace_buffer.spans()])
+
+    def test_sync_action_runs_in_executor(self):
+        app = create_app()
+        action = TurnOnAction(app, {'platform': 'turn_on', 'entity_ids': 'light.kitchen'})
+        action.do_action = MagicMock()
+
+        async def run_in_executor(fn, *args):
+            return fn(*args)
+
+        app.run_in_executor = MagicMock(side_effect=run_in_executor)
+
+        asyncio.run(do_actions(app, [action]))
+
+        app.run_in_executor.assert_called_once()
+        action.do_action.assert_called_once_with(None)
+
+    def test_sleep_blocks_for_sync_components(self):
+        app = create_app()
+
+        with patch('base_automation.time.sleep') as sleep:
+            self.assertIsNone(app.sleep(0.5))
+        sleep.assert_called_once_with(0.5)
+
+        with patch('async_base_automation.asyncio.sleep', MagicMock(side_effect=asyncio.sleep)) as async_sleep:
+            asyncio.run(app.async_sleep(0.01))
+        async_sleep.assert_called_once_with(0.01)
+
+    def test_async_constraint_platforms(self):
+        app = create_app()
+
+        self.assertIsInstance(get_async_constraint(app, {
+            'platform': 'state',
+            'entity_id': 'input_boolean.enabled',
+            'state': 'on',
+        }), AsyncStateConstraint)
+
+        templated = get_async_constraint(app, {
+            'platform': 'state',
+            'entity_id': 'input_boolean.enabled',
+            'state': '{{ state("input_select.mode") }}',
+        })
+        self.assertIsInstance(templated, AsyncConstraintAdapter)
+        self.assertFalse(templated._on_loop)
+
+        triggered = get_async_constraint(app, {'platform': 'triggered_state', 'entity_id': 'sensor.door'})
+        self.assertTrue(triggered._on_loop)
+        self.assertIsNotNone(triggered.dispatch_filter())
@@ -0,0 +1,73 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, patch
+
+from lib.core.callback_latency import CallbackLatencies, LatencyHistogram
+from lib.core.monitored_callback import monitored_callback
+
+
+def create_app(name):
+    app = MagicMock()
+    app.name = name
+    return app
+
+
+@monitored_callback
+def state_change_handler(app, entity, attribute, old, new, kwargs):
+    if new == 'error':
+        raise ValueError(new)
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        for _ in range(90):
+            histogram.record(0.003)
+        for _ in range(9):
+            histogram.record(0.040)
+        histogram.record(45)
+
+        summary = histogram.summary()
+        self.assertEqual(summary['count'], 100)
+        self.assertEqual(summary['p50_ms'], 5)
+        self.assertEqual(summary['p95_ms'], 50)
+        self.assertEqual(summary['p99_ms'], 50)
+        self.assertEqual(summary['max_ms'], 45000)
+        self.assertEqual(histogram.percentile(100), 45000)
+
+
+class TestMonitoredCallback(unittest.TestCase):
+
+    def setUp(self):
+        self.latencies = CallbackLatencies()
+        latencies_patch = patch('lib.core.monitored_callback.CALLBACK_LATENCIES', self.latencies)
+        latencies_patch.start()
+        self.addCleanup(latencies_patch.stop)
+
+    def test_records_per_app_and_callback(self):
+        kitchen, hallway = create_app('kitchen'), create_app('hallway')
+        state_change_handler(kitchen, 'light.kitchen', 'state', 'off', 'on', {})
+        state_change_handler(kitchen, 'light.kitchen', 'state', 'on', 'error', {})
+        state_change_handler(hallway, 'light.hallway', 'state', 'off', 'on', {})
+
+        stats = self.latencies.stats()
+        kitchen_stats = stats['callbacks']['kitchen.state_change_handler']
+        self.assertEqual(kitchen_stats['wall']['count'], 2)
+        self.assertEqual(kitchen_stats['cpu']['count'], 2)
+        self.assertEqual(kitchen_stats['errors'], 1)
+        self.assertIn('light.kitchen', kitchen_stats['slowest']['trigger_info'])
+        self.assertEqual(stats['apps']['hallway']['count'], 1)
+        kitchen.error.assert_called_once()
+
+    def test_coroutine_callbacks_record_wall_time(self):
+        @monitored_callback
+        async def event_handler(app, event_name, data, kwargs):
+            await asyncio.sleep(0.01)
+
+        asyncio.run(event_handler(create_app('kitchen'), 'ios.action_fired', {}, {}))
+
+        stats = list(self.latencies.stats()['callbacks'].values())[0]
+        self.assertEqual(stats['wall']['count'], 1)
+        self.assertGreaterEqual(stats['wall']['max_ms'], 10)
+        self.assertEqual(stats['cpu']['count'], 0)
@@ -0,0 +1,73 @@
+import unittest
+from unittest.mock import Mock, MagicMock
+
+from lib.core.config import Config
+from triggers import TriggerInfo
+
+
+def create_config(config_dict, states={}):
+    app = Mock(**{'variables': {}})
+    app.get_state = MagicMock(side_effect=lambda entity_id, **kwargs: states.get(entity_id))
+    return Config(app, config_dict)
+
+
+class TestConfig(unittest.TestCase):
+
+    def test_static_values_are_resolved_once(self):
+        config = create_config({
+            'entity_id': 'light.kitchen',
+            'entity_ids': ['light.kitchen', ['light.hallway']],
+            'brightness': 200,
+            'enabled': False,
+        })
+
+        self.assertTrue(config.is_static('entity_id'))
+        self.assertEqual(config.value('entity_id'), 'light.kitchen')
+        self.assertEqual(config.list('entity_id'), ['light.kitchen'])
+        self.assertEqual(config.list('entity_ids'), ['light.kitchen', 'light.hallway'])
+        self.assertEqual(config.int('brightness'), 200)
+        self.assertEqual(config.value('enabled', True), False)
+        self.assertEqual(config.value('missing', 'default'), 'default')
+
+    def test_static_values_are_not_shared_with_callers(self):
+        config = create_config({
+            'data': {'message': 'hello', 'data': {'push': 'yes'}},
+            'entity_ids': ['light.kitchen'],
+        })
+
+        data = config.value('data')
+        data['notification_id'] = 'pn_1'
+        data['data']['push'] = 'no'
+        config.list('entity_ids').append('light.hallway')
+
+        self.assertEqual(config.value('data'), {'message': 'hello', 'data': {'push': 'yes'}})
+        self.assertEqual(config.list('entity_ids'), ['light.kitchen'])
+
+    def test_nested_static_values_are_not_shared_with_callers(self):
+        config = create_config({
+            'data': {'entity_ids': ['light.kitchen']},
+            'monitor_settings': [{'light_data': {'rgb_color': [255, 0, 0]}}],
+        })
+
+        config.value('data')['entity_ids'].append('light.hallway')
+        config.value('monitor_settings')[0]['light_data']['rgb_color'][0] = 0
+        config.list('monitor_settings')[0]['light_data']['flash'] = 'long'
+
+        self.assertEqual(config.value('data'), {'entity_ids': ['light.kitchen']})
+        self.assertEqual(config.list('monitor_settings'), [{'light_data': {'rgb_color': [255, 0, 0]}}])
+
+    def test_templated_values_are_rendered_per_access(self):
+        states = {'input_select.scene': 'Dark'}
+        config = create_config({
+            'scene': "{{ state('input_select.scene') }}",
+            'entity_ids': ['light.kitchen', "{{ trigger_info.data.entity_id }}"],
+        }, states)
+
+        self.assertFalse(config.is_static('scene'))
+        self.assertEqual(config.value('scene'), 'Dark')
+
+        states['input_select.scene'] = 'Bright'
+        self.assertEqual(config.value('scene'), 'Bright')
+
+        config.trigger_info = TriggerInfo('state', {'entity_id': 'light.hallway'})
+        self.assertEqual(config.list('entity_ids'), ['light.kitchen', 'light.hallway'])
@@ -0,0 +1,85 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, Mock, patch
+
+from constraints import get_constraint
+from lib.core.constraint_cache import ConstraintCache
+from lib.core.state_mirror import StateMirror
+from triggers import TriggerInfo
+
+
+def entity(entity_id, state):
+    return {'entity_id': entity_id, 'state': state, 'attributes': {}}
+
+
+def change_state(mirror, entity_id, state):
+    asyncio.run(mirror._state_changed_handler('state_changed', {
+        'entity_id': entity_id,
+        'new_state': entity(entity_id, state),
+    }, {}))
+
+
+def create_app(mirror):
+    return Mock(**{'get_state.side_effect': lambda entity_id, **kwargs: mirror.get_state(entity_id, **kwargs)})
+
+
+class TestConstraintCache(unittest.TestCase):
+
+    def setUp(self):
+        self.mirror = StateMirror()
+        self.cache = ConstraintCache()
+        patches = [
+            patch('lib.core.constraint_cache.STATE_MIRROR', self.mirror),
+            patch('lib.constraints.CONSTRAINT_CACHE', self.cache),
+            patch('constraints.CONSTRAINT_CACHE', self.cache),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def attach(self, states):
+        self.mirror.attach(MagicMock(), lambda: {
+            entity_id: entity(entity_id, state) for entity_id, state in states.items()
+        })
+
+    def test_same_config_shares_result_across_apps(self):
+        self.attach({'input_boolean.guest_mode': 'on'})
+        config = {'platform': 'state', 'entity_id': 'input_boolean.guest_mode', 'state': 'on'}
+        kitchen, hallway = create_app(self.mirror), create_app(self.mirror)
+
+        self.assertTrue(get_constraint(kitchen, config).check(TriggerInfo('state')))
+        self.assertTrue(get_constraint(hallway, dict(config)).check(TriggerInfo('state')))
+
+        kitchen.get_state.assert_called_once()
+        hallway.get_state.assert_not_called()
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    def test_dependency_change_invalidates(self):
+        self.attach({'input_boolean.guest_mode': 'on'})
+        app = create_app(self.mirror)
+        constraint = get_constraint(app, {'platform': 'state', 'entity_id': 'input_boolean.guest_mode', 'state': 'on'})
+
+        self.assertTrue(constraint.check(TriggerInfo('state')))
+        change_state(self.mirror, 'input_boolean.guest_mode', 'off')
+        self.assertFalse(constraint.check(TriggerInfo('state')))
+        self.assertFalse(constraint.check(TriggerInfo('state')))
+
+        stats = self.cache.stats()
+        self.assertEqual((stats['misses'], stats['invalidated'], stats['hits']), (1, 1, 1))
+
+    def test_bypassed_without_live_mirror_or_with_templates(self):
+        app = Mock(**{'get_state.return_value': 'on'})
+        constraint = get_constraint(app, {'platform': 'attribute', 'entity_id': 'light.kitchen',
+                                          'attribute': 'brightness', 'value': 'on'})
+        constraint.check(TriggerInfo('state'))
+        constraint.check(TriggerInfo('state'))
+        self.assertEqual(app.get_state.call_count, 2)
+
+        self.attach({'light.kitchen': 'on'})
+        app.variables = {}
+        templated = get_constraint(app, {'platform': 'state', 'entity_id': 'light.kitchen',
+                                         'state': '{{ "on" }}'})
+        templated.check(TriggerInfo('state'))
+        templated.check(TriggerInfo('state'))
+        self.assertEqual(app.get_state.call_count, 4)
+        self.assertEqual(self.cache.stats()['entries'], 0)
@@ -111,3 +111,20 @@ class TestStateConstraint(unittest.TestCase):
         constraint = create_constraint(['open', 'opening'], 'closing')
         result = constraint.check(TriggerInfo('state'))
         self.assertFalse(result)
+
+    def test_match_all_fetches_states_in_bulk(self):
+        app = Mock(**{'get_states.return_value': {'light.kitchen': 'on', 'light.hallway': 'on'}})
+        app.variables = {}
+        constraint = get_constraint(app, {
+            'platform': 'state',
+            'entity_id': ['light.kitchen', 'light.hallway'],
+            'state': 'on',
+            'match_all': True,
+        })
+
+        self.assertTrue(constraint.check(TriggerInfo('state')))
+        app.get_states.assert_called_once_with(['light.kitchen', 'light.hallway'], attribute=None)
+        app.get_state.assert_not_called()
+
+        app.get_states.return_value = {'light.kitchen': 'on', 'light.hallway': 'off'}
+        self.assertFalse(constraint.check(TriggerInfo('state')))
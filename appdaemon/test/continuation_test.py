@@ -0,0 +1,164 @@
+import unittest
+from threading import Lock
+from unittest.mock import Mock, MagicMock, patch
+
+from announcer import Announcer
+from base_automation import BaseAutomation
+from noise_level_monitor import MonitorSetting, NoiseLevelMonitor
+from lib.annoucer.announcement import Announcement
+from lib.annoucer.player import Player, PlayerConfig
+from lib.core.thread_occupancy import ThreadOccupancy
+
+
+class FakeTimers:
+    def __init__(self):
+        self.timers = {}
+        self.next_handle = 0
+
+    def run_in(self, callback, delay, **kwargs):
+        self.next_handle += 1
+        self.timers[self.next_handle] = (callback, delay, kwargs)
+        return self.next_handle
+
+    def cancel_timer(self, handle):
+        del self.timers[handle]
+
+    def fire_next(self):
+        callback, delay, kwargs = self.timers.pop(min(self.timers))
+        callback(kwargs)
+        return delay
+
+
+def create_app(timers):
+    app = object.__new__(BaseAutomation)
+    app.name = 'announcer'
+    app.args = {}
+    app.log = MagicMock()
+    app.run_in = MagicMock(side_effect=timers.run_in)
+    app.cancel_timer = MagicMock(side_effect=timers.cancel_timer)
+    return app
+
+
+def media(url, duration):
+    return Mock(media_url=url, duration=duration)
+
+
+class TestAfter(unittest.TestCase):
+
+    def test_continuation_runs_with_arguments(self):
+        timers = FakeTimers()
+        app = create_app(timers)
+        fn = MagicMock(__name__='restore_light')
+        occupancy = ThreadOccupancy()
+
+        with patch('base_automation.THREAD_OCCUPANCY', occupancy):
+            app.after(3, fn, 'light.kitchen', brightness=255)
+            self.assertEqual(occupancy.stats()['pending_continuations'], 1)
+            fn.assert_not_called()
+
+            self.assertEqual(timers.fire_next(), 3)
+
+        fn.assert_called_once_with('light.kitchen', brightness=255)
+        self.assertEqual(occupancy.stats()['pending_continuations'], 0)
+        self.assertEqual(occupancy.stats()['deferred_seconds'], 3)
+
+    def test_continuation_error_is_logged(self):
+        timers = FakeTimers()
+        app = create_app(timers)
+
+        app.after(1, MagicMock(__name__='fail', side_effect=ValueError('boom')))
+        timers.fire_next()
+
+        self.assertEqual(app.log.call_args.kwargs['level'], 'ERROR')
+
+
+    def test_cancelled_continuation_does_not_run(self):
+        timers = FakeTimers()
+        app = create_app(timers)
+        fn = MagicMock(__name__='restore_light')
+        occupancy = ThreadOccupancy()
+
+        with patch('base_automation.THREAD_OCCUPANCY', occupancy):
+            app.cancel_after(app.after(3, fn))
+
+        self.assertEqual(timers.timers, {})
+        self.assertEqual(occupancy.stats()['pending_continuations'], 0)
+
+
+class TestNoiseLevelMonitor(unittest.TestCase):
+
+    def test_start_right_after_stop_is_not_undone(self):
+        timers = FakeTimers()
+        app = object.__new__(NoiseLevelMonitor)
+        app.name = 'noise_level_monitor'
+        app.args = {}
+        app.log = MagicMock()
+        app.run_in = MagicMock(side_effect=timers.run_in)
+        app.cancel_timer = MagicMock(side_effect=timers.cancel_timer)
+        app.call_service = MagicMock()
+        app.set_state = MagicMock()
+        app.is_monitoring = True
+        app._sensor_continuations = {}
+        app.monitor_settings = [MonitorSetting({'noise_entity_id': 'binary_sensor.nursery_noise', 'light_data': {}})]
+
+        app.get_state = MagicMock(return_value='on')
+        app.stop_monitor()
+        app.get_state = MagicMock(return_value='unavailable')
+        app.start_monitor()
+
+        self.assertEqual(len(timers.timers), 1)
+        timers.fire_next()
+
+        self.assertEqual(app.call_service.call_args.args, ('ffmpeg/start',))
+        app.set_state.assert_not_called()
+        self.assertTrue(app.is_monitoring)
+        self.assertEqual(app._sensor_continuations, {})
+
+
+class TestPlayer(unittest.TestCase):
+
+    def test_medias_are_played_one_after_another(self):
+        timers = FakeTimers()
+        app = create_app(timers)
+        app.call_service = MagicMock()
+        player = Player(app, PlayerConfig({'type': 'google', 'player_entity_id': 'media_player.kitchen'}), None)
+        on_complete = MagicMock()
+
+        player.play_media([media('chime.mp3', 2), media('speech.mp3', 5)], on_complete=on_complete)
+        self.assertEqual(app.call_service.call_count, 1)
+
+        self.assertEqual(timers.fire_next(), 2)
+        self.assertEqual(app.call_service.call_args.kwargs['media_content_id'], 'speech.mp3')
+        on_complete.assert_not_called()
+
+        self.assertEqual(timers.fire_next(), 5)
+        on_complete.assert_called_once_with()
+
+
+class TestAnnouncer(unittest.TestCase):
+
+    def test_announcement_made_while_playing_waits_for_it(self):
+        app = object.__new__(Announcer)
+        app.log = MagicMock()
+        app.args = {}
+        app._announcer_lock = Lock()
+        app._announcing = False
+        app._waiting_players = []
+        app._queue = []
+        app._media_manager = Mock(**{'get_media.side_effect': lambda announcement, with_chime: announcement.message})
+
+        first, second = Mock(), Mock()
+
+        app._queue.append(Announcement('Front door is open', True, None, False))
+        app._lock_and_announce([first])
+        app._queue.append(Announcement('Garage door is open', True, None, False))
+        app._lock_and_announce([second])
+
+        first.play_media.assert_called_once()
+        second.play_media.assert_not_called()
+
+        first.play_media.call_args.kwargs['on_complete']()
+        self.assertEqual(second.play_media.call_args.args[0], ['Garage door is open'])
+
+        second.play_media.call_args.kwargs['on_complete']()
+        self.assertFalse(app._announcing)
@@ -0,0 +1,209 @@
+import unittest
+from unittest.mock import Mock
+
+from benchmark.bench_helper import PatchedHass, FakeStates, load_app_definitions, create_app
+from configurable_automation import ConfigurableAutomation, Handler
+from lib.constraints import get_constraint
+from lib.triggers import TriggerInfo
+
+TRIGGER_DATA_KEYS = ['entity_id', 'attribute', 'from', 'to', 'action_name', 'event_name', 'time']
+
+# configured apps that can't be imported here, anything else failing to import fails the test
+UNIMPORTABLE_APPS = {
+    # its module isn't in this repository
+    'darkness_monitor',
+    # reminder_helper imports climate.air_quality_monitor, lib/climate shadows apps/climate when lib is on sys.path
+    'reminder',
+}
+
+
+def create_handler(app, constraint_configs):
+    return Handler(app, [get_constraint(app, config) for config in constraint_configs], [])
+
+
+def first_match(handlers, trigger_info):
+    for position, handler in enumerate(handlers):
+        if handler.check_constraints(trigger_info):
+            return position
+
+    return None
+
+
+def indexed_first_match(app, trigger_info):
+    for handler in app.candidate_handlers(trigger_info):
+        if handler.check_constraints(trigger_info):
+            return app._handlers.index(handler)
+
+    return None
+
+
+def dispatch_outcome(fn, *args):
+    # trigger_handler stops dispatching on the first error, so the error has to be raised in both cases too
+    try:
+        return fn(*args)
+    except Exception as e:
+        return type(e)
+
+
+def collect_values(value, values):
+    if isinstance(value, dict):
+        for key, v in value.items():
+            if key in TRIGGER_DATA_KEYS:
+                for item in v if isinstance(v, list) else [v]:
+                    if isinstance(item, (str, int, float)):
+                        values.setdefault(key, set()).add(item)
+            collect_values(v, values)
+    elif isinstance(value, list):
+        for v in value:
+            collect_values(v, values)
+
+    return values
+
+
+def create_trigger_infos(values):
+    entity_ids = sorted(values.get('entity_id', []), key=str) + ['sensor.not_configured']
+    states = sorted(values.get('to', set()) | values.get('from', set()), key=str) + ['on', 'off', '12', None]
+
+    trigger_infos = []
+    for entity_id in entity_ids:
+        for attribute in [None] + sorted(values.get('attribute', []), key=str):
+            for to_state in states:
+                trigger_infos.append(TriggerInfo('state', {
+                    'entity_id': entity_id,
+                    'attribute': attribute,
+                    'from': 'off' if to_state != 'off' else 'on',
+                    'to': to_state,
+                }))
+
+    for action_name in sorted(values.get('action_name', []), key=str) + ['not_configured']:
+        trigger_infos.append(TriggerInfo('action', {'action_name': action_name, 'data': {}}))
+
+    for event_name in sorted(values.get('event_name', []), key=str) + ['not_configured']:
+        trigger_infos.append(TriggerInfo('event', {'event_name': event_name, 'data': {}}))
+
+    for time in sorted(values.get('time', []), key=str) + ['00:00:01']:
+        trigger_infos.append(TriggerInfo('time', {'time': time}))
+
+    trigger_infos.append(TriggerInfo('sunrise', {}))
+    trigger_infos.append(TriggerInfo('sunset', {}))
+
+    return trigger_infos
+
+
+class TestDispatchIndex(unittest.TestCase):
+
+    def create_app(self, handler_constraints):
+        app = Mock(**{'variables': {}})
+        app._handlers = [create_handler(app, constraints) for constraints in handler_constraints]
+        app._handler_index = None
+        app.candidate_handlers = lambda trigger_info: ConfigurableAutomation.candidate_handlers(app, trigger_info)
+        return app
+
+    def assert_same_first_match(self, app, trigger_info, expected):
+        self.assertEqual(first_match(app._handlers, trigger_info), expected)
+        self.assertEqual(indexed_first_match(app, trigger_info), expected)
+
+    def test_first_match_order_is_kept(self):
+        app = self.create_app([
+            [{'platform': 'triggered_state', 'entity_id': 'light.kitchen', 'to': 'on'}],
+            [{'platform': 'triggered_state', 'to': 'on'}],
+            [{'platform': 'triggered_state', 'entity_id': 'light.kitchen'}],
+            [],
+        ])
+
+        self.assert_same_first_match(app, TriggerInfo('state', {'entity_id': 'light.kitchen', 'to': 'on'}), 0)
+        self.assert_same_first_match(app, TriggerInfo('state', {'entity_id': 'light.office', 'to': 'on'}), 1)
+        self.assert_same_first_match(app, TriggerInfo('state', {'entity_id': 'light.kitchen', 'to': 'off'}), 2)
+        self.assert_same_first_match(app, TriggerInfo('state', {'entity_id': 'light.office', 'to': 'off'}), 3)
+        self.assert_same_first_match(app, TriggerInfo('action', {'action_name': 'test'}), 3)
+
+    def test_irrelevant_handlers_are_skipped(self):
+        app = self.create_app([
+            [{'platform': 'triggered_state', 'entity_id': ['light.kitchen', 'light.office']}],
+            [{'platform': 'triggered_action', 'action_name': 'leave_home'}],
+            [{'platform': 'triggered_event', 'event_name': ['ios.action_fired']}],
+            [{'platform': 'triggered_time', 'time': '10:00:00'}],
+        ])
+
+        candidates = list(app.candidate_handlers(TriggerInfo('action', {'action_name': 'leave_home'})))
+        self.assertEqual(candidates, [app._handlers[1]])
+
+        candidates = list(app.candidate_handlers(TriggerInfo('state', {'entity_id': 'light.office'})))
+        self.assertEqual(candidates, [app._handlers[0]])
+
+        candidates = list(app.candidate_handlers(TriggerInfo('state', {'entity_id': 'light.bedroom'})))
+        self.assertEqual(candidates, [])
+
+    def test_numeric_and_templated_values_are_not_indexed(self):
+        app = self.create_app([
+            [{'platform': 'triggered_state', 'entity_id': 'sensor.temperature', 'to': '>20'}],
+            [{'platform': 'triggered_state', 'entity_id': '{{ "sensor.humidity" }}'}],
+        ])
+
+        self.assert_same_first_match(app, TriggerInfo('state', {'entity_id': 'sensor.temperature', 'to': '21'}), 0)
+        self.assert_same_first_match(app, TriggerInfo('state', {'entity_id': 'sensor.humidity', 'to': '21'}), 1)
+
+    def test_only_leading_constraints_are_indexed(self):
+        app = self.create_app([
+            [
+                {'platform': 'template', 'template': '{{ true }}', 'expected_value': 'True'},
+                {'platform': 'triggered_state', 'entity_id': 'light.kitchen'},
+            ],
+        ])
+
+        candidates = list(app.candidate_handlers(TriggerInfo('state', {'entity_id': 'light.office'})))
+        self.assertEqual(candidates, [app._handlers[0]])
+
+    def test_negated_event_is_not_indexed(self):
+        app = self.create_app([
+            [{'platform': 'triggered_event', 'event_name': 'ios.action_fired', 'negate': True}],
+        ])
+
+        self.assert_same_first_match(app, TriggerInfo('event', {'event_name': 'call_service', 'data': {}}), 0)
+
+    def test_index_is_rebuilt_when_handler_is_added(self):
+        app = self.create_app([
+            [{'platform': 'triggered_action', 'action_name': 'leave_home'}],
+        ])
+        trigger_info = TriggerInfo('action', {'action_name': 'arrive_home'})
+
+        self.assertEqual(list(app.candidate_handlers(trigger_info)), [])
+
+        app._handlers.append(create_handler(app, [{'platform': 'triggered_action', 'action_name': 'arrive_home'}]))
+        self.assertEqual(list(app.candidate_handlers(trigger_info)), [app._handlers[1]])
+
+
+class TestDispatchIndexConfigurations(unittest.TestCase):
+    """Dispatches triggers built from every value found in configurations/*.yaml through each configured app and
+    checks the indexed lookup picks the same handler as evaluating every handler in order."""
+
+    def test_same_handler_as_full_scan(self):
+        states = FakeStates()
+        compared = 0
+        skipped = set()
+
+        with PatchedHass(states):
+            for name, definition in load_app_definitions().items():
+                try:
+                    app = create_app(name, definition)
+                except ImportError:
+                    skipped.add(name)
+                    continue
+
+                if not isinstance(app, ConfigurableAutomation):
+                    continue
+
+                app.initialize()
+
+                values = collect_values(definition, {})
+                for entity_id in values.get('entity_id', []):
+                    states.set(entity_id, 'on')
+
+                for trigger_info in create_trigger_infos(values):
+                    with self.subTest(app=name, trigger_info=trigger_info):
+                        self.assertEqual(dispatch_outcome(indexed_first_match, app, trigger_info),
+                                         dispatch_outcome(first_match, app._handlers, trigger_info))
+                    compared += 1
+
+        self.assertGreater(compared, 0)
+        self.assertLessEqual(skipped, UNIMPORTABLE_APPS)
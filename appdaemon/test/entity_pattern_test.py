@@ -0,0 +1,87 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import appdaemon.plugins.hass.hassapi as hass
+
+from base_automation import BaseAutomation
+from lib.core.entity_pattern import EntityPatternIndex, entity_pattern_regex
+from lib.core.state_dispatcher import StateDispatcher
+
+
+def entity(entity_id, state):
+    return {'entity_id': entity_id, 'state': state, 'attributes': {}}
+
+
+class TestEntityPatternIndex(unittest.TestCase):
+
+    def test_globs_and_regexes(self):
+        index = EntityPatternIndex()
+        index.add(entity_pattern_regex('binary_sensor.*_motion'), 'motion')
+        index.add(entity_pattern_regex('light.*'), 'lights')
+        index.add(entity_pattern_regex('^light\\.hue_.+'), 'hue')
+
+        self.assertEqual(index.matching('binary_sensor.kitchen_motion'), ('motion',))
+        self.assertEqual(index.matching('binary_sensor.kitchen_motion_battery'), ())
+        self.assertEqual(index.matching('light.hue_kitchen'), ('lights', 'hue'))
+        self.assertEqual(index.matching('switch.kitchen'), ())
+
+    def test_results_are_cached_until_patterns_change(self):
+        index = EntityPatternIndex()
+        index.add(entity_pattern_regex('light.*'), 'lights')
+
+        index.matching('light.kitchen')
+        index.matching('light.kitchen')
+        index.matching('light.hallway')
+        self.assertEqual(index.stats()['misses'], 2)
+
+        index.add(entity_pattern_regex('light.kitchen'), 'kitchen')
+        self.assertEqual(index.matching('light.kitchen'), ('lights', 'kitchen'))
+
+        index.remove('lights')
+        self.assertEqual(index.matching('light.kitchen'), ('kitchen',))
+        self.assertEqual(index.matching('light.hallway'), ())
+
+    def test_item_matching_several_patterns_is_returned_once(self):
+        index = EntityPatternIndex()
+        config = {'threshold_in_minute': 15}
+        index.add('light\\.hue_.*', config)
+        index.add('light\\..*', config)
+
+        self.assertEqual(len(index.matching('light.hue_kitchen')), 1)
+        self.assertEqual(index.items(), [config])
+
+
+class TestPatternListeners(unittest.TestCase):
+
+    def test_dispatcher_routes_new_entities(self):
+        dispatcher = StateDispatcher()
+        dispatcher._submit = lambda listener, args: listener.callback(*args)
+        app = MagicMock()
+        app.name = 'motion_lighting'
+        callback = MagicMock()
+
+        handle = dispatcher.listen_pattern(app, callback, ['binary_sensor.*_motion'], new='on')
+        dispatcher.dispatch('binary_sensor.garage_motion', None, entity('binary_sensor.garage_motion', 'on'))
+        dispatcher.dispatch('binary_sensor.garage_door', None, entity('binary_sensor.garage_door', 'on'))
+
+        callback.assert_called_once_with('binary_sensor.garage_motion', 'state', None, 'on', {'new': 'on'})
+
+        dispatcher.cancel(handle)
+        self.assertEqual(dispatcher.listeners(), [])
+
+    def test_app_filters_appdaemon_callback_without_mirror(self):
+        app = object.__new__(BaseAutomation)
+        app.name = 'motion_lighting'
+        app.args = {}
+        app.log = MagicMock()
+        callback = MagicMock(__name__='motion_handler')
+
+        with patch.object(hass.Hass, 'listen_state', MagicMock()) as listen_state:
+            app.listen_state_pattern(callback, ['binary_sensor.*_motion'], new='on')
+
+        matched_callback = listen_state.call_args.args[0]
+        self.assertIsNone(listen_state.call_args.args[1])
+
+        matched_callback('binary_sensor.garage_door', 'state', 'off', 'on', {})
+        matched_callback('binary_sensor.garage_motion', 'state', 'off', 'on', {})
+        callback.assert_called_once_with('binary_sensor.garage_motion', 'state', 'off', 'on', {})
@@ -0,0 +1,174 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import Mock, MagicMock, patch
+
+from lib.core.job_journal import JobJournal, STALE_AFTER
+from lib.schedule_job import schedule_job, cancel_job, restore_jobs, find_scheduled_jobs, JOB_REGISTRY
+from lib.triggers import TriggerInfo
+from schedule_job_test import FakeScheduler
+
+
+def job_record(app_name='kitchen_lighting', due=None, interval=0):
+    return {
+        'app_name': app_name,
+        'key': 'binary_sensor.kitchen_motion',
+        'job_name': '{}_binary_sensor.kitchen_motion'.format(app_name),
+        'method': 'turn_off_lights',
+        'component': None,
+        'due': time.time() + 60 if due is None else due,
+        'interval': interval,
+        'trigger_info': {'platform': 'state', 'data': {'entity_id': 'binary_sensor.kitchen_motion'}},
+    }
+
+
+class TestJobJournal(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def reopen(self, journal):
+        journal.close()
+        journal = JobJournal(flush_interval=60)
+        journal.open(self.path)
+        return journal
+
+    def test_pending_jobs_survive_restart(self):
+        journal = JobJournal(flush_interval=60)
+        journal.open(self.path)
+
+        record = job_record()
+        journal.add(record)
+        removed = journal.add(job_record(app_name='dining_room_lighting'))
+        journal.remove(removed)
+
+        journal = self.reopen(journal)
+
+        self.assertEqual(journal.take_pending('dining_room_lighting'), [])
+        self.assertEqual(journal.take_pending('kitchen_lighting'), [record])
+        journal.close()
+
+    def test_writes_are_batched(self):
+        journal = JobJournal(flush_interval=60)
+        journal.open(self.path)
+
+        for _ in range(10):
+            journal.remove(journal.add(job_record()))
+
+        self.assertEqual(journal.stats()['queue_depth'], 20)
+
+        journal.flush()
+        self.assertEqual(journal.stats()['flushes'], 1)
+        self.assertEqual(journal.stats()['writes'], 20)
+        journal.close()
+
+    def test_stale_one_shot_jobs_are_dropped(self):
+        journal = JobJournal(flush_interval=60)
+        journal.open(self.path)
+
+        journal.add(job_record(due=time.time() - STALE_AFTER - 1))
+        journal.add(job_record(app_name='hallway_lighting', due=time.time() - STALE_AFTER - 1, interval=60))
+
+        journal = self.reopen(journal)
+
+        self.assertEqual(journal.stats()['restorable'], 1)
+        self.assertEqual(len(journal.take_pending('hallway_lighting')), 1)
+        journal.close()
+
+
+    def test_repeating_jobs_nobody_takes_back_expire(self):
+        journal = JobJournal(flush_interval=60)
+        journal.open(self.path)
+
+        journal.add(job_record(app_name='removed_lighting', interval=60))
+        journal.add(job_record(app_name='hallway_lighting', interval=60))
+
+        journal = self.reopen(journal)
+        journal.add(journal.take_pending('hallway_lighting')[0])
+        journal.close()
+
+        with patch('lib.core.job_journal.time.time', return_value=time.time() + STALE_AFTER + 1):
+            journal = JobJournal(flush_interval=60)
+            journal.open(self.path)
+
+        self.assertEqual(journal.take_pending('removed_lighting'), [])
+        self.assertEqual(len(journal.take_pending('hallway_lighting')), 1)
+        journal.close()
+
+class TestRestoreJobs(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+
+        self.journal = JobJournal(flush_interval=60)
+        self.journal.open(self.path)
+        self.patcher = patch('lib.schedule_job.JOB_JOURNAL', self.journal)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.journal.close()
+        os.remove(self.path)
+        JOB_REGISTRY.remove_all('kitchen_lighting')
+
+    def create_app(self):
+        scheduler = FakeScheduler()
+        app = Mock()
+        app.name = 'kitchen_lighting'
+        app.turn_off_lights = MagicMock(__name__='turn_off_lights')
+        app.turn_off_lights.__self__ = app
+        app.run_in = MagicMock(side_effect=scheduler.run_in)
+        app.cancel_timer = MagicMock(side_effect=scheduler.cancel_timer)
+        return app, scheduler
+
+    def restart(self):
+        self.journal.close()
+        self.journal.open(self.path)
+        JOB_REGISTRY.remove_all('kitchen_lighting')
+
+    def test_pending_job_is_rearmed(self):
+        app, _ = self.create_app()
+        restore_jobs(app)
+        trigger_info = TriggerInfo('state', {'entity_id': 'binary_sensor.kitchen_motion'})
+        schedule_job(app, app.turn_off_lights, 300, trigger_info)
+
+        self.restart()
+        app, scheduler = self.create_app()
+        restore_jobs(app)
+
+        self.assertEqual(list(find_scheduled_jobs(app).keys()), ['kitchen_lighting_binary_sensor.kitchen_motion'])
+        delay = app.run_in.call_args.args[1]
+        self.assertTrue(295 < delay <= 300)
+
+        scheduler.run(1)
+        kwargs = app.turn_off_lights.call_args.args[0]
+        self.assertEqual(kwargs['trigger_info'].data, trigger_info.data)
+
+    def test_overdue_job_runs_right_away(self):
+        self.journal.add(job_record(due=time.time() - 30))
+        self.restart()
+
+        app, _ = self.create_app()
+        restore_jobs(app)
+
+        self.assertEqual(app.run_in.call_args.args[1], 0)
+
+    def test_cancelled_and_completed_jobs_are_not_rearmed(self):
+        app, scheduler = self.create_app()
+        restore_jobs(app)
+        schedule_job(app, app.turn_off_lights, 300, TriggerInfo('state', {'entity_id': 'binary_sensor.a'}))
+        schedule_job(app, app.turn_off_lights, 300, TriggerInfo('state', {'entity_id': 'binary_sensor.b'}))
+        cancel_job(app, TriggerInfo('state', {'entity_id': 'binary_sensor.a'}))
+        scheduler.run(2)
+
+        self.restart()
+        app, _ = self.create_app()
+        restore_jobs(app)
+
+        self.assertEqual(find_scheduled_jobs(app), {})
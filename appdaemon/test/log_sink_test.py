@@ -0,0 +1,115 @@
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+import appdaemon.plugins.hass.hassapi as hass
+
+from base_automation import BaseAutomation
+from lib.core.log_sink import Lazy, LogSink
+
+
+def create_app(log_level):
+    app = object.__new__(BaseAutomation)
+    app.name = 'motion_lighting'
+    app.args = {'log_level': log_level}
+    return app
+
+
+class TestLogSink(unittest.TestCase):
+
+    def test_records_are_written_in_order_by_one_thread(self):
+        sink = LogSink()
+        written = []
+        write = lambda msg, level: written.append((msg, level, threading.current_thread().name))
+
+        for i in range(5):
+            sink.emit(write, str(i), 'INFO')
+        sink.flush()
+
+        self.assertEqual([msg for msg, _, _ in written], ['0', '1', '2', '3', '4'])
+        self.assertEqual({thread for _, _, thread in written}, {'log_sink'})
+        self.assertEqual(sink.stats()['emitted'], 5)
+
+    def test_full_queue_drops_info_and_queues_errors_in_order(self):
+        sink = LogSink()
+        sink.start(max_size=1)
+        blocked = threading.Event()
+        release = threading.Event()
+        written = []
+
+        def write(msg, level):
+            if msg == 'blocking':
+                blocked.set()
+                release.wait(1)
+            written.append(msg)
+
+        sink.emit(write, 'blocking', 'INFO')
+        blocked.wait(1)
+        sink.emit(write, 'queued', 'INFO')
+        sink.emit(write, 'dropped', 'INFO')
+        threading.Timer(0.05, release.set).start()
+        # waits until the writer made room
+        sink.emit(write, 'error', 'ERROR')
+        sink.flush()
+
+        self.assertEqual(written, ['blocking', 'queued', 'error'])
+        stats = sink.stats()
+        self.assertEqual((stats['dropped'], stats['waited_for_space']), (1, 1))
+
+    def test_stuck_writer_drops_oldest_record_for_errors(self):
+        sink = LogSink()
+        sink.start(max_size=1)
+        blocked = threading.Event()
+        release = threading.Event()
+        written = []
+
+        def write(msg, level):
+            if msg == 'blocking':
+                blocked.set()
+                release.wait(1)
+            written.append(msg)
+
+        sink.emit(write, 'blocking', 'INFO')
+        blocked.wait(1)
+        sink.emit(write, 'queued', 'INFO')
+        with patch('lib.core.log_sink.FULL_QUEUE_WAIT', 0.01):
+            sink.emit(write, 'error', 'ERROR')
+        release.set()
+        sink.flush()
+
+        self.assertEqual(written, ['blocking', 'error'])
+        self.assertEqual(sink.stats()['dropped'], 1)
+
+
+class TestAppLog(unittest.TestCase):
+
+    def test_arguments_are_formatted_only_when_level_enabled(self):
+        sink = LogSink()
+        expensive = MagicMock(return_value='stack')
+
+        with patch('base_automation.LOG_SINK', sink), \
+                patch.object(hass.Hass, 'log', MagicMock()) as log:
+            create_app('INFO').debug('Called from {}', Lazy(expensive))
+            sink.flush()
+            expensive.assert_not_called()
+            log.assert_not_called()
+
+            create_app('DEBUG').debug('Called from {}', Lazy(expensive))
+            sink.flush()
+
+        log.assert_called_once_with('DEBUG - Called from stack', level='INFO')
+
+    def test_messages_that_are_not_format_strings(self):
+        sink = LogSink()
+
+        with patch('base_automation.LOG_SINK', sink), \
+                patch.object(hass.Hass, 'log', MagicMock()) as log:
+            app = create_app('DEBUG')
+            app.debug({'entity_ids': ['light.kitchen']})
+            app.debug('Config {"delay": 5} for {}', 'light.kitchen')
+            sink.flush()
+
+        self.assertEqual([c.args[0] for c in log.call_args_list], [
+            "DEBUG - {'entity_ids': ['light.kitchen']}",
+            "DEBUG - Config {\"delay\": 5} for {} ('light.kitchen',)",
+        ])
@@ -0,0 +1,115 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import Mock, MagicMock
+
+from lib.schedule_job import schedule_job, schedule_repeat_job, cancel_job, has_scheduled_job, \
+    find_scheduled_jobs, JOB_REGISTRY
+from lib.triggers import TriggerInfo
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.callbacks = {}
+        self.next_handle = 0
+
+    def run_in(self, callback, delay, **kwargs):
+        self.next_handle += 1
+        self.callbacks[self.next_handle] = (callback, kwargs)
+        return self.next_handle
+
+    def run_every(self, callback, start, interval, **kwargs):
+        return self.run_in(callback, 0, **kwargs)
+
+    def cancel_timer(self, handle):
+        del self.callbacks[handle]
+
+    def run(self, handle):
+        callback, kwargs = self.callbacks.pop(handle)
+        callback(kwargs)
+
+
+def create_app(name):
+    scheduler = FakeScheduler()
+    app = Mock()
+    app.name = name
+    app.run_in = MagicMock(side_effect=scheduler.run_in)
+    app.run_every = MagicMock(side_effect=scheduler.run_every)
+    app.cancel_timer = MagicMock(side_effect=scheduler.cancel_timer)
+    return app, scheduler
+
+
+def state_trigger_info(entity_id):
+    return TriggerInfo('state', {'entity_id': entity_id})
+
+
+class TestScheduleJob(unittest.TestCase):
+
+    def tearDown(self):
+        for app_name in ['kitchen_lighting', 'kitchen_lighting_2']:
+            JOB_REGISTRY.remove_all(app_name)
+
+    def test_job_is_cancelled_by_triggering_entity(self):
+        app, scheduler = create_app('kitchen_lighting')
+
+        schedule_job(app, MagicMock(), 60, state_trigger_info('binary_sensor.kitchen_motion'))
+        schedule_job(app, MagicMock(), 60, state_trigger_info('binary_sensor.dining_room_motion'))
+
+        cancel_job(app, state_trigger_info('binary_sensor.kitchen_motion'))
+
+        self.assertEqual(list(find_scheduled_jobs(app).keys()), ['kitchen_lighting_binary_sensor.dining_room_motion'])
+        self.assertEqual(len(scheduler.callbacks), 1)
+
+    def test_all_jobs_of_app_are_cancelled(self):
+        app, scheduler = create_app('kitchen_lighting')
+        other_app, other_scheduler = create_app('kitchen_lighting_2')
+
+        schedule_job(app, MagicMock(), 60, state_trigger_info('binary_sensor.kitchen_motion'))
+        schedule_job(app, MagicMock(), 60, state_trigger_info('binary_sensor.dining_room_motion'))
+        schedule_job(other_app, MagicMock(), 60)
+
+        cancel_job(app)
+
+        self.assertFalse(has_scheduled_job(app))
+        self.assertEqual(scheduler.callbacks, {})
+        self.assertTrue(has_scheduled_job(other_app))
+
+    def test_explicitly_keyed_job_is_only_cancelled_by_its_key(self):
+        app, scheduler = create_app('kitchen_lighting')
+
+        schedule_job(app, MagicMock(), 60, job_key='turn_off_lights')
+        schedule_job(app, MagicMock(), 60, state_trigger_info('binary_sensor.kitchen_motion'))
+
+        cancel_job(app)
+        self.assertEqual(list(find_scheduled_jobs(app).keys()), ['kitchen_lighting_turn_off_lights'])
+
+        cancel_job(app, job_key='turn_off_lights')
+        self.assertFalse(has_scheduled_job(app))
+        self.assertEqual(scheduler.callbacks, {})
+
+    def test_job_is_removed_once_it_runs(self):
+        app, scheduler = create_app('kitchen_lighting')
+        callback = MagicMock(__name__='turn_off_lights')
+        trigger_info = state_trigger_info('binary_sensor.kitchen_motion')
+
+        schedule_job(app, callback, 60, trigger_info)
+        self.assertTrue(has_scheduled_job(app))
+
+        scheduler.run(1)
+
+        callback.assert_called_once_with({'trigger_info': trigger_info})
+        self.assertFalse(has_scheduled_job(app))
+
+    def test_job_past_its_fire_time_is_not_pending(self):
+        app, _ = create_app('kitchen_lighting')
+
+        schedule_job(app, MagicMock(), -1)
+
+        self.assertFalse(has_scheduled_job(app))
+
+    def test_repeat_job_stays_pending(self):
+        app, scheduler = create_app('kitchen_lighting')
+
+        schedule_repeat_job(app, MagicMock(), datetime.now() - timedelta(seconds=10), 30)
+        scheduler.run(1)
+
+        self.assertTrue(has_scheduled_job(app))
@@ -0,0 +1,81 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from base_automation import BaseAutomation
+from lib.core.slow_callback_watchdog import NO_WATCH, SlowCallbackWatchdog
+
+
+def create_app(ad_config, args=None):
+    app = object.__new__(BaseAutomation)
+    app.name = 'motion_lighting'
+    app.args = args or {}
+    app.config = ad_config
+    app.log = MagicMock()
+    return app
+
+
+def blocking_io(started, release):
+    started.set()
+    release.wait(1)
+
+
+class TestSlowCallbackWatchdog(unittest.TestCase):
+
+    def test_disabled_without_directory(self):
+        watchdog = SlowCallbackWatchdog()
+
+        self.assertIs(watchdog.watch(create_app({}), 'trigger_handler'), NO_WATCH)
+        self.assertFalse(watchdog.is_running)
+
+    def test_app_budget_overrides_process_budget(self):
+        watchdog = SlowCallbackWatchdog()
+        watchdog.start('unused')
+        ad_config = {'slow_callback_dir': 'unused', 'slow_callback_budget': 10}
+
+        self.assertEqual(watchdog.watch(create_app(ad_config), 'trigger_handler').budget, 10)
+        self.assertEqual(watchdog.watch(create_app(ad_config, {'slow_callback_budget': 0.5}), 'trigger_handler').budget,
+                         0.5)
+
+    def test_samples_over_budget_callback_into_collapsed_stacks(self):
+        watchdog = SlowCallbackWatchdog()
+        started = threading.Event()
+        release = threading.Event()
+
+        with tempfile.TemporaryDirectory() as directory:
+            app = create_app({'slow_callback_dir': directory, 'slow_callback_budget': 0.001})
+            watchdog._thread = MagicMock()
+            watchdog._directory = directory
+
+            def callback():
+                with watchdog.watch(app, 'trigger_handler', {'platform': 'state'}):
+                    blocking_io(started, release)
+
+            worker = threading.Thread(target=callback)
+            worker.start()
+            started.wait(1)
+            # sampled twice while blocked, the budget was over right away
+            threading.Event().wait(0.01)
+            watchdog.sample()
+            watchdog.sample()
+            release.set()
+            worker.join(1)
+
+            watch, duration = watchdog._finished.popleft()
+            watchdog._write(watch, duration)
+
+            with open(os.path.join(directory, 'index.jsonl')) as file:
+                entry = json.loads(file.readline())
+            with open(os.path.join(directory, entry['profile'])) as file:
+                stack, count = file.readline().rsplit(' ', 1)
+
+        self.assertEqual((entry['app'], entry['callback'], entry['samples']), ('motion_lighting', 'trigger_handler', 2))
+        self.assertEqual(entry['trigger_info'], "{'platform': 'state'}")
+        self.assertEqual(int(count), 2)
+        frames = stack.split(';')
+        self.assertTrue(frames[-1].startswith('wait (threading.py:'))
+        self.assertIn('blocking_io (slow_callback_watchdog_test.py:23)', frames)
+        self.assertEqual(watchdog.stats()['running_callbacks'], 0)
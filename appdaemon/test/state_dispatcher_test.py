@@ -0,0 +1,163 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, patch
+
+import appdaemon.plugins.hass.hassapi as hass
+
+from base_automation import BaseAutomation
+from lib.core.state_dispatcher import StateDispatcher, StateListener
+from lib.core.state_mirror import StateMirror
+
+
+def create_app(name='motion_lighting'):
+    app = MagicMock()
+    app.name = name
+    return app
+
+
+def entity(entity_id, state, **attributes):
+    return {'entity_id': entity_id, 'state': state, 'attributes': attributes}
+
+
+class InlineDispatcher(StateDispatcher):
+    """Runs sync callbacks on the dispatching thread."""
+
+    def _submit(self, listener, args):
+        listener.callback(*args)
+
+
+class TestStateDispatcher(unittest.TestCase):
+
+    def test_routes_by_entity_domain_and_prefix(self):
+        dispatcher = InlineDispatcher()
+        app = create_app()
+        callbacks = {name: MagicMock() for name in ['exact', 'domain', 'wildcard', 'prefix', 'any', 'other']}
+
+        dispatcher.listen(app, callbacks['exact'], 'sensor.kitchen_temperature')
+        dispatcher.listen(app, callbacks['domain'], 'sensor')
+        dispatcher.listen(app, callbacks['wildcard'], 'sensor.*')
+        dispatcher.listen(app, callbacks['prefix'], 'sensor.kitchen_*')
+        dispatcher.listen(app, callbacks['any'], None)
+        dispatcher.listen(app, callbacks['other'], 'sensor.bedroom_*')
+
+        dispatcher.dispatch('sensor.kitchen_temperature',
+                            entity('sensor.kitchen_temperature', '20'),
+                            entity('sensor.kitchen_temperature', '21'))
+
+        for name in ['exact', 'domain', 'wildcard', 'prefix', 'any']:
+            callbacks[name].assert_called_once_with('sensor.kitchen_temperature', 'state', '20', '21', {})
+        callbacks['other'].assert_not_called()
+
+    def test_filters_like_listen_state(self):
+        dispatcher = InlineDispatcher()
+        app = create_app()
+        to_on = MagicMock()
+        brightness = MagicMock()
+        all_changes = MagicMock()
+
+        dispatcher.listen(app, to_on, 'light.kitchen', new='on', user_data=1)
+        dispatcher.listen(app, brightness, 'light.kitchen', attribute='brightness')
+        dispatcher.listen(app, all_changes, 'light.kitchen', attribute='all')
+
+        dispatcher.dispatch('light.kitchen', entity('light.kitchen', 'on', brightness=10),
+                            entity('light.kitchen', 'on', brightness=10))
+        dispatcher.dispatch('light.kitchen', entity('light.kitchen', 'off', brightness=10),
+                            entity('light.kitchen', 'on', brightness=200))
+
+        to_on.assert_called_once_with('light.kitchen', 'state', 'off', 'on', {'user_data': 1, 'new': 'on'})
+        brightness.assert_called_once_with('light.kitchen', 'brightness', 10, 200, {'attribute': 'brightness'})
+        self.assertEqual(all_changes.call_count, 2)
+
+    def test_cancel(self):
+        dispatcher = InlineDispatcher()
+        kitchen, hallway = create_app('kitchen'), create_app('hallway')
+        callback = MagicMock()
+
+        handle = dispatcher.listen(kitchen, callback, 'light.kitchen')
+        dispatcher.listen(kitchen, callback, 'light.*')
+        dispatcher.listen(hallway, callback, 'light.hallway_*')
+        self.assertEqual(dispatcher.stats()['listeners'], 3)
+
+        dispatcher.cancel(handle)
+        dispatcher.cancel_app(kitchen)
+
+        self.assertEqual([listener.app.name for listener in dispatcher.listeners()], ['hallway'])
+
+    def test_callbacks_are_handed_to_appdaemon_in_order(self):
+        dispatcher = StateDispatcher()
+        app = create_app()
+        app.AD.app_management.objects = {'motion_lighting': {'id': 'object-id', 'pin_app': True, 'pin_thread': 3}}
+        handed_off = []
+
+        async def dispatch_worker(name, args):
+            await asyncio.sleep(0)
+            handed_off.append((name, args))
+            return args['new_state'] != '3'
+
+        app.AD.threading.dispatch_worker = dispatch_worker
+        listener = dispatcher.listen(app, MagicMock(), 'sensor.power')
+
+        async def change_states():
+            for value in range(5):
+                dispatcher.dispatch('sensor.power',
+                                    entity('sensor.power', str(value)),
+                                    entity('sensor.power', str(value + 1)))
+            while dispatcher._draining:
+                await asyncio.sleep(0)
+
+        asyncio.run(change_states())
+
+        self.assertEqual([args['new_state'] for _, args in handed_off], ['1', '2', '3', '4', '5'])
+        name, args = handed_off[0]
+        self.assertEqual(name, 'motion_lighting')
+        self.assertEqual(args['id'], listener.id)
+        self.assertEqual((args['type'], args['function'], args['entity']), ('state', listener.callback, 'sensor.power'))
+        self.assertEqual((args['objectid'], args['pin_app'], args['pin_thread']), ('object-id', True, 3))
+        self.assertEqual(dispatcher.stats()['delivered'], 4)
+        self.assertEqual(dispatcher.stats()['constrained'], 1)
+
+    def test_mirror_feeds_dispatcher(self):
+        mirror = StateMirror()
+        dispatcher = InlineDispatcher()
+        mirror.add_observer(dispatcher.dispatch)
+        mirror.attach(create_app(), lambda: {'light.kitchen': entity('light.kitchen', 'off')})
+        callback = MagicMock()
+        dispatcher.listen(create_app(), callback, 'light.kitchen')
+
+        asyncio.run(mirror._state_changed_handler('state_changed', {
+            'entity_id': 'light.kitchen',
+            'new_state': entity('light.kitchen', 'on'),
+        }, {}))
+
+        callback.assert_called_once_with('light.kitchen', 'state', 'off', 'on', {})
+
+
+class TestAppListenState(unittest.TestCase):
+
+    def create_app(self):
+        app = object.__new__(BaseAutomation)
+        app.name = 'motion_lighting'
+        app.args = {}
+        app.config = {'state_mirror': True}
+        app.log = MagicMock()
+        app.listen_event = MagicMock()
+        app._get_state = MagicMock(return_value={})
+        return app
+
+    def test_listen_state_goes_to_dispatcher(self):
+        app = self.create_app()
+        dispatcher = StateDispatcher()
+
+        with patch('base_automation.STATE_MIRROR', StateMirror()), \
+                patch('base_automation.STATE_DISPATCHER', dispatcher), \
+                patch.object(hass.Hass, 'listen_state', MagicMock(return_value='uuid')) as listen_state, \
+                patch.object(hass.Hass, 'cancel_listen_state', MagicMock()) as cancel_listen_state:
+            handle = app.listen_state(MagicMock(), 'binary_sensor.kitchen_motion', new='on')
+            self.assertIsInstance(handle, StateListener)
+
+            self.assertEqual(app.listen_state(MagicMock(), 'binary_sensor.kitchen_motion', duration=60), 'uuid')
+            listen_state.assert_called_once()
+
+            app.cancel_listen_state(handle)
+            cancel_listen_state.assert_not_called()
+            self.assertEqual(dispatcher.stats()['listeners'], 0)
@@ -0,0 +1,173 @@
+import asyncio
+import copy
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+from base_automation import BaseAutomation
+from lib.core.state_mirror import StateMirror
+
+
+def entity(entity_id, state, **attributes):
+    return {
+        'entity_id': entity_id,
+        'state': state,
+        'attributes': attributes,
+        'last_changed': '2021-01-01T00:00:00+00:00',
+    }
+
+
+def state_changed(mirror, entity_id, state, **attributes):
+    data = {'entity_id': entity_id, 'new_state': entity(entity_id, state, **attributes)}
+    asyncio.run(mirror._state_changed_handler('state_changed', data, {}))
+
+
+def attached_mirror(states):
+    mirror = StateMirror()
+    app = MagicMock()
+    app.name = 'motion_lighting'
+    mirror.attach(app, lambda: states)
+    return mirror
+
+
+class TestStateMirror(unittest.TestCase):
+
+    def test_get_state_lookups(self):
+        mirror = attached_mirror({'light.kitchen': entity('light.kitchen', 'on', brightness=200)})
+
+        self.assertEqual(mirror.get_state('light.kitchen'), 'on')
+        self.assertEqual(mirror.get_state('light.kitchen', attribute='brightness'), 200)
+        self.assertEqual(mirror.get_state('light.kitchen', attribute='last_changed'), '2021-01-01T00:00:00+00:00')
+        self.assertEqual(mirror.get_state('light.kitchen', attribute='all')['state'], 'on')
+        self.assertEqual(mirror.get_state('light.hallway', default='off'), 'off')
+        self.assertEqual(list(mirror.get_state('light')), ['light.kitchen'])
+        self.assertEqual(list(mirror.get_state()), ['light.kitchen'])
+
+    def test_entities_are_read_only(self):
+        mirror = attached_mirror({'light.kitchen': entity('light.kitchen', 'on', brightness=200)})
+        kitchen = mirror.get_state('light.kitchen', attribute='all')
+
+        with self.assertRaises(TypeError):
+            kitchen['state'] = 'off'
+
+        with self.assertRaises(TypeError):
+            kitchen['attributes']['brightness'] = 10
+
+        copied = copy.deepcopy(kitchen)
+        copied['attributes']['brightness'] = 10
+        self.assertEqual(mirror.get_state('light.kitchen', attribute='brightness'), 200)
+
+    def test_state_changed_bumps_version(self):
+        mirror = attached_mirror({'light.kitchen': entity('light.kitchen', 'off')})
+        version = mirror.version('light.kitchen')
+        previous = mirror.get('light.kitchen')
+
+        state_changed(mirror, 'light.kitchen', 'on')
+
+        self.assertGreater(mirror.version('light.kitchen'), version)
+        self.assertEqual(mirror.get_state('light.kitchen'), 'on')
+        self.assertEqual(previous['state'], 'off')
+        self.assertEqual(mirror.version('light.hallway'), 0)
+
+    def test_iteration_survives_new_entity(self):
+        mirror = attached_mirror({'light.kitchen': entity('light.kitchen', 'off')})
+
+        for entity_id, _ in mirror.states().items():
+            state_changed(mirror, 'light.kitchen', 'on')
+            state_changed(mirror, 'light.hallway', 'on')
+
+        self.assertEqual(len(mirror.states()), 2)
+
+    def test_items_iteration_survives_new_entity(self):
+        mirror = attached_mirror({'light.kitchen': entity('light.kitchen', 'off')})
+
+        for entity_id, _ in mirror.items():
+            state_changed(mirror, 'light.hallway', 'on')
+
+        self.assertEqual(sorted(entity_id for entity_id, _ in mirror.items()), ['light.hallway', 'light.kitchen'])
+
+    def test_removed_entity_is_dropped_and_observed(self):
+        mirror = attached_mirror({'light.kitchen': entity('light.kitchen', 'on')})
+        observer = MagicMock()
+        mirror.add_observer(observer)
+        version = mirror.version('light.kitchen')
+        kitchen = mirror.get('light.kitchen')
+
+        asyncio.run(mirror._state_changed_handler('state_changed', {'entity_id': 'light.kitchen', 'new_state': None},
+                                                  {}))
+
+        self.assertIsNone(mirror.get_state('light.kitchen'))
+        self.assertEqual(mirror.states(), {})
+        self.assertGreater(mirror.version('light.kitchen'), version)
+        observer.assert_called_once_with('light.kitchen', kitchen, None)
+
+    def test_states_is_a_dict(self):
+        mirror = attached_mirror({'light.kitchen': entity('light.kitchen', 'on')})
+
+        states = mirror.get_state()
+        states['light.hallway'] = entity('light.hallway', 'off')
+
+        self.assertIsInstance(states, dict)
+        self.assertEqual(json.loads(json.dumps(states))['light.kitchen']['state'], 'on')
+        self.assertEqual(list(mirror.states()), ['light.kitchen'])
+
+    def test_seed_keeps_states_changed_while_attaching(self):
+        mirror = StateMirror()
+        app = MagicMock()
+        app.name = 'motion_lighting'
+
+        def fetch_all():
+            state_changed(mirror, 'light.kitchen', 'on')
+            return {'light.kitchen': entity('light.kitchen', 'off'), 'light.hallway': entity('light.hallway', 'off')}
+
+        self.assertTrue(mirror.attach(app, fetch_all))
+
+        app.listen_event.assert_called_once_with(mirror._state_changed_handler, 'state_changed')
+        self.assertEqual(mirror.get_state('light.kitchen'), 'on')
+        self.assertEqual(mirror.get_state('light.hallway'), 'off')
+
+        mirror.detach(app)
+        self.assertFalse(mirror.is_live)
+
+
+class TestAppReads(unittest.TestCase):
+
+    def create_app(self, config):
+        app = object.__new__(BaseAutomation)
+        app.name = 'motion_lighting'
+        app.args = {}
+        app.config = config
+        app.log = MagicMock()
+        app.listen_event = MagicMock()
+        app._get_state = MagicMock(side_effect=lambda entity_id=None, **kwargs: {
+            'light.kitchen': entity('light.kitchen', 'on'),
+        } if entity_id is None else 'remote')
+        return app
+
+    def test_reads_go_through_mirror_once_attached(self):
+        app = self.create_app({'state_mirror': True})
+
+        with patch('base_automation.STATE_MIRROR', StateMirror()):
+            self.assertEqual(app.get_state('light.kitchen'), 'on')
+            self.assertEqual(app.get_states(['light.kitchen']), {'light.kitchen': 'on'})
+            self.assertEqual(app.get_state('light.kitchen', namespace='mqtt'), 'remote')
+
+        app.listen_event.assert_called_once()
+        self.assertEqual(app._get_state.call_count, 2)
+
+    def test_all_states_scans_the_mirror(self):
+        app = self.create_app({'state_mirror': True})
+        mirror = StateMirror()
+
+        with patch('base_automation.STATE_MIRROR', mirror):
+            self.assertEqual([entity_id for entity_id, _ in app.all_states()], ['light.kitchen'])
+
+        self.assertEqual(app._get_state.call_count, 1)
+
+    def test_mirror_is_off_by_default(self):
+        app = self.create_app({})
+
+        with patch('base_automation.STATE_MIRROR', StateMirror()):
+            self.assertEqual(app.get_state('light.kitchen'), 'remote')
+
+        app.listen_event.assert_not_called()
@@ -0,0 +1,75 @@
+import unittest
+from unittest.mock import MagicMock
+
+from base_automation import BaseAutomation
+from lib.core.state_snapshot import StateSnapshot
+
+
+def create_app(states):
+    app = object.__new__(BaseAutomation)
+    app.args = {}
+    app.log = MagicMock()
+    app._get_state = MagicMock(side_effect=lambda entity_id, attribute=None: states.get((entity_id, attribute)))
+    return app
+
+
+class TestStateSnapshot(unittest.TestCase):
+
+    def test_entity_is_fetched_once_per_snapshot(self):
+        fetch = MagicMock(return_value='on')
+        snapshot = StateSnapshot()
+
+        self.assertEqual(snapshot.get(fetch, 'light.kitchen', {}), 'on')
+        self.assertEqual(snapshot.get(fetch, 'light.kitchen', {}), 'on')
+        snapshot.get(fetch, 'light.kitchen', {'attribute': 'brightness'})
+
+        self.assertEqual(fetch.call_count, 2)
+        self.assertEqual(snapshot.hits, 1)
+        self.assertEqual(snapshot.misses, 2)
+
+    def test_invalidate_drops_all_attributes_of_entity(self):
+        fetch = MagicMock(return_value='on')
+        snapshot = StateSnapshot()
+        snapshot.get(fetch, 'light.kitchen', {})
+        snapshot.get(fetch, 'light.kitchen', {'attribute': 'brightness'})
+        snapshot.get(fetch, 'light.hallway', {})
+
+        snapshot.invalidate(['light.kitchen'])
+        snapshot.get(fetch, 'light.kitchen', {})
+        snapshot.get(fetch, 'light.hallway', {})
+
+        self.assertEqual(fetch.call_count, 4)
+
+    def test_app_only_uses_snapshot_during_dispatch(self):
+        app = create_app({
+            ('light.kitchen', None): 'on',
+            ('light.kitchen', 'brightness'): 200,
+        })
+
+        with app.state_snapshot() as snapshot:
+            self.assertEqual(app.get_state('light.kitchen'), 'on')
+            self.assertEqual(app.get_state('light.kitchen'), 'on')
+            self.assertEqual(app.get_state('light.kitchen', attribute='brightness'), 200)
+
+            with app.state_snapshot() as nested:
+                self.assertIs(snapshot, nested)
+                app.get_state('light.kitchen')
+
+        self.assertEqual(app._get_state.call_count, 2)
+        self.assertEqual(snapshot.hits, 2)
+
+        app.get_state('light.kitchen')
+        self.assertEqual(app._get_state.call_count, 3)
+
+    def test_bulk_fetch_only_requests_missing_entities(self):
+        fetch = MagicMock(return_value='on')
+        fetch_many = MagicMock(side_effect=lambda entity_ids: {e: 'off' for e in entity_ids})
+        snapshot = StateSnapshot()
+        snapshot.get(fetch, 'light.kitchen', {})
+
+        states = snapshot.get_many(fetch_many, ['light.kitchen', 'light.hallway'], {})
+
+        self.assertEqual(states, {'light.kitchen': 'on', 'light.hallway': 'off'})
+        fetch_many.assert_called_once_with(['light.hallway'])
+        self.assertEqual(snapshot.get(fetch, 'light.hallway', {}), 'off')
+        self.assertEqual(fetch.call_count, 1)
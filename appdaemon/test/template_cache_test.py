@@ -0,0 +1,66 @@
+import unittest
+from unittest.mock import Mock, MagicMock
+
+from jinja2 import Environment
+
+from lib.template_cache import TemplateCache
+from lib.template_renderer import TemplateRenderer, TEMPLATE_CACHE, get_app_globals
+
+
+class TestTemplateCache(unittest.TestCase):
+
+    def test_compiled_template_is_reused(self):
+        cache = TemplateCache(Environment())
+
+        template = cache.get('{{ 1 + 1 }}')
+        self.assertIs(template, cache.get('{{ 1 + 1 }}'))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_least_recently_used_template_is_evicted(self):
+        cache = TemplateCache(Environment(), max_size=2)
+
+        first = cache.get('{{ 1 }}')
+        cache.get('{{ 2 }}')
+        cache.get('{{ 1 }}')
+        cache.get('{{ 3 }}')
+
+        stats = cache.stats()
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['evictions'], 1)
+        self.assertIs(first, cache.get('{{ 1 }}'))
+        self.assertEqual(cache.stats()['misses'], 3)
+
+    def test_renderers_share_compiled_template(self):
+        template = "{{ state('sensor.temperature') }}"
+
+        app1 = Mock(**{'variables': {}})
+        app1.get_state = MagicMock(return_value='21.5')
+
+        app2 = Mock(**{'variables': {}})
+        app2.get_state = MagicMock(return_value='18')
+
+        TemplateRenderer(app1).render(template)
+        hits = TEMPLATE_CACHE.stats()['hits']
+
+        self.assertEqual(TemplateRenderer(app2).render(template), 18)
+        self.assertEqual(TEMPLATE_CACHE.stats()['hits'], hits + 1)
+        self.assertEqual(TemplateRenderer(app1).render(template), 21.5)
+
+    def test_app_globals_are_built_once_per_app(self):
+        app = Mock(**{'variables': {'amp_threshold': 0.8}})
+        app.get_state = MagicMock(return_value='0.4')
+
+        first = TemplateRenderer(app)
+        second = TemplateRenderer(app)
+
+        self.assertEqual(first.render("{{ amp_threshold }}"), 0.8)
+        self.assertEqual(second.render("{{ state('sensor.amp') | float < amp_threshold }}"), 'True')
+        self.assertIs(get_app_globals(app), get_app_globals(app))
+        self.assertNotIn('format_date', get_app_globals(app))
+
+    def test_variable_cannot_override_template_function(self):
+        app = Mock(**{'variables': {'relative_time': 1}})
+
+        with self.assertRaises(ValueError):
+            TemplateRenderer(app).render("{{ relative_time }}")
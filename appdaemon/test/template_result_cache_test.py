@@ -0,0 +1,111 @@
+import asyncio
+import unittest
+from unittest.mock import Mock, MagicMock, patch
+
+from lib.core.state_mirror import StateMirror
+from lib.template_renderer import TemplateRenderer, TEMPLATE_CACHE
+from lib.template_result_cache import TemplateResultCache
+
+
+def create_app(states, ttl=10):
+    app = Mock(**{'variables': {}})
+    app.get_state = MagicMock(side_effect=lambda entity_id, attribute=None: states.get((entity_id, attribute)))
+    app._template_results = TemplateResultCache(app, TEMPLATE_CACHE, ttl=ttl)
+    return app
+
+
+def change_state(mirror, entity_id, state):
+    asyncio.run(mirror._state_changed_handler('state_changed', {
+        'entity_id': entity_id,
+        'new_state': {'entity_id': entity_id, 'state': state, 'attributes': {}},
+    }, {}))
+
+
+class TestTemplateResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.mirror = StateMirror()
+        self.mirror.attach(MagicMock(), lambda: {})
+        mirror_patch = patch('lib.template_result_cache.STATE_MIRROR', self.mirror)
+        mirror_patch.start()
+        self.addCleanup(mirror_patch.stop)
+
+    def test_unchanged_template_is_not_rendered_again(self):
+        app = create_app({('sensor.master_bedroom', None): '23.2', ('sensor.lynn_s_room', None): '22.1'})
+        template = "{{ (state('sensor.master_bedroom') | float) - (state('sensor.lynn_s_room') | float) }}"
+
+        self.assertAlmostEqual(TemplateRenderer(app).render(template, trigger_info=None), 1.1)
+        self.assertAlmostEqual(TemplateRenderer(app).render(template, trigger_info=None), 1.1)
+
+        self.assertEqual(app.get_state.call_count, 2)
+        self.assertEqual(app._template_results.stats()['hits'], 1)
+
+    def test_template_is_rendered_again_when_dependency_changes(self):
+        states = {('sensor.master_bedroom', None): '23.2', ('cover.garage_door', 'friendly_name'): 'Garage'}
+        app = create_app(states)
+        template = "{{ friendly_name('cover.garage_door') }} is {{ state('sensor.master_bedroom') }}"
+        renderer = TemplateRenderer(app)
+
+        self.assertEqual(renderer.render(template), 'Garage is 23.2')
+
+        states[('sensor.master_bedroom', None)] = '19'
+        change_state(self.mirror, 'sensor.kitchen', '20')
+        self.assertEqual(renderer.render(template), 'Garage is 23.2')
+
+        change_state(self.mirror, 'sensor.master_bedroom', '19')
+        self.assertEqual(renderer.render(template), 'Garage is 19')
+        self.assertEqual(app._template_results.stats()['invalidations'], 1)
+
+    def test_dependencies_are_not_listened(self):
+        app = create_app({('sensor.master_bedroom', None): '23.2'})
+
+        TemplateRenderer(app).render("{{ state('sensor.master_bedroom') }}")
+        TemplateRenderer(app).render("{{ state('sensor.master_bedroom') }} C")
+
+        app.listen_state.assert_not_called()
+        self.assertEqual(app._template_results.dependencies()["{{ state('sensor.master_bedroom') }} C"], {
+            'entities': ['sensor.master_bedroom'],
+            'expires_in': None,
+        })
+
+    def test_only_mutable_results_are_copied(self):
+        app = create_app({})
+        results = app._template_results
+        mutable = results.get('{{ [1, 2] }}', {}, lambda: [1, 2])
+        mutable.append(3)
+
+        self.assertEqual(results.get('{{ [1, 2] }}', {}, lambda: [1, 2]), [1, 2])
+        text = results.get("{{ 'on' }}", {}, lambda: 'o' + 'n')
+        self.assertIs(results.get("{{ 'on' }}", {}, lambda: 'o' + 'n'), text)
+
+    def test_every_template_is_rendered_while_mirror_is_not_live(self):
+        app = create_app({('sensor.master_bedroom', None): '23.2'})
+        template = "{{ state('sensor.master_bedroom') }}"
+
+        with patch('lib.template_result_cache.STATE_MIRROR', StateMirror()):
+            TemplateRenderer(app).render(template)
+            TemplateRenderer(app).render(template)
+
+        self.assertEqual(app.get_state.call_count, 2)
+        self.assertEqual(app._template_results.stats()['bypassed'], 2)
+
+    def test_template_using_render_arguments_is_not_cached(self):
+        app = create_app({('sensor.master_bedroom', None): '23.2'})
+        template = "{{ state(trigger_info.data.entity_id) }}"
+        trigger_info = Mock(**{'data': {'entity_id': 'sensor.master_bedroom'}})
+
+        TemplateRenderer(app).render(template, trigger_info=trigger_info)
+        TemplateRenderer(app).render(template, trigger_info=trigger_info)
+
+        self.assertEqual(app.get_state.call_count, 2)
+        self.assertEqual(app._template_results.stats()['uncacheable'], 2)
+
+    def test_time_dependent_template_expires(self):
+        app = create_app({}, ttl=0)
+        app.now_is_between = MagicMock(return_value=True)
+        template = "{% if now_is_between('01:00:00', '06:30:00') %}night{% else %}day{% endif %}"
+
+        self.assertEqual(TemplateRenderer(app).render(template), 'night')
+
+        app.now_is_between.return_value = False
+        self.assertEqual(TemplateRenderer(app).render(template), 'day')
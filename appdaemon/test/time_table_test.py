@@ -0,0 +1,99 @@
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytz
+
+from lib.core.time_table import DailyTimeTable, TimeWindowTable, TimeWindows
+
+TZ = pytz.timezone('US/Pacific')
+
+
+def local(hour, minute=0, second=0, day=1):
+    return TZ.localize(datetime(2021, 3, day, hour, minute, second))
+
+
+class FakeApp:
+    def __init__(self, now, sunrise, sunset):
+        self.now = now
+        self.sunrise = sunrise
+        self.sunset = sunset
+        self.AD = MagicMock()
+        self.AD.tz = TZ
+        self.AD.sched.get_now_sync.side_effect = lambda: self.now
+        self.AD.sched.next_sunrise.side_effect = lambda: self.sunrise
+        self.AD.sched.next_sunset.side_effect = lambda: self.sunset
+
+
+class TestTimeWindowTable(unittest.TestCase):
+
+    def test_active_windows(self):
+        table = TimeWindowTable([
+            (8 * 3600, 17 * 3600, 'day'),
+            (22 * 3600, 6 * 3600, 'night'),
+            (16 * 3600, 23 * 3600, 'evening'),
+        ])
+
+        self.assertEqual(table.active(0), ('night',))
+        self.assertEqual(table.active(6 * 3600), ('night',))
+        self.assertEqual(table.active(6 * 3600 + 1), ())
+        self.assertEqual(table.active(8 * 3600), ('day',))
+        self.assertEqual(table.active(17 * 3600), ('day', 'evening'))
+        self.assertEqual(table.active(17 * 3600 + 1), ('evening',))
+        self.assertEqual(table.active(22 * 3600 + 30), ('night', 'evening'))
+        self.assertEqual(table.active(23 * 3600 + 1), ('night',))
+
+
+class TestDailyTimeTable(unittest.TestCase):
+
+    def test_is_between_like_appdaemon(self):
+        table = DailyTimeTable()
+        app = FakeApp(local(23, 30), sunrise=local(6, 40, day=2), sunset=local(18, 10, day=2))
+
+        self.assertTrue(table.is_between(app, '22:00:00', '00:00:00'))
+        self.assertTrue(table.is_between(app, 'sunset - 00:30:00', '00:08:08'))
+        self.assertFalse(table.is_between(app, '04:00:00', '08:00:00'))
+        self.assertTrue(table.is_between(app, '2021-01-01 23:00:00', 'sunrise'))
+        self.assertTrue(table.sun_down(app))
+        self.assertRaises(ValueError, table.is_between, app, '23:00', 'sunrise')
+
+        app.now = local(23, 45)
+        table.is_between(app, 'sunset - 00:30:00', '00:08:08')
+        self.assertEqual(table.stats()['rebuilds'], 1)
+
+    def test_end_of_window_spanning_midnight_is_included(self):
+        table = DailyTimeTable()
+        app = FakeApp(local(6, 0, 0, day=2), sunrise=local(6, 40, day=2), sunset=local(18, 10, day=2))
+
+        self.assertTrue(table.is_between(app, '22:00:00', '06:00:00'))
+
+        app.now = local(6, 0, 1, day=2)
+        self.assertFalse(table.is_between(app, '22:00:00', '06:00:00'))
+
+    def test_rebuilt_after_sun_event(self):
+        table = DailyTimeTable()
+        app = FakeApp(local(17, 50), sunrise=local(6, 40, day=2), sunset=local(18, 0))
+
+        self.assertFalse(table.is_between(app, 'sunset', '23:00:00'))
+        self.assertFalse(table.sun_down(app))
+
+        app.now = local(18, 1)
+        app.sunset = local(18, 2, day=2)
+        self.assertFalse(table.is_between(app, 'sunset', '23:00:00'))
+        self.assertTrue(table.sun_down(app))
+
+        app.now = local(18, 2, day=2)
+        app.sunset = local(18, 3, day=3)
+        self.assertEqual(table.stats()['rebuilds'], 2)
+
+    def test_time_windows_follow_the_table(self):
+        table = DailyTimeTable()
+        app = FakeApp(local(17, 50), sunrise=local(6, 40, day=2), sunset=local(18, 0))
+        windows = TimeWindows([('sunset', '23:00:00', 'evening'), ('00:00:00', '23:59:59', 'all day')])
+
+        with patch('lib.core.time_table.TIME_TABLE', table):
+            self.assertEqual(windows.active(app), ('all day',))
+
+            app.now = local(18, 1)
+            app.sunset = local(17, 55, day=2)
+            self.assertEqual(windows.active(app), ('evening', 'all day'))
@@ -0,0 +1,69 @@
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+from base_automation import BaseAutomation
+from configurable_automation import Handler
+from lib.core.tracing import NO_SPAN, TraceBuffer, Tracer
+
+
+def create_app(trace_buffer_size):
+    app = object.__new__(BaseAutomation)
+    app.name = 'motion_lighting'
+    app.args = {}
+    app.config = {'trace_buffer_size': trace_buffer_size}
+    app.log = MagicMock()
+    return app
+
+
+class TestTraceBuffer(unittest.TestCase):
+
+    def test_keeps_latest_spans(self):
+        buffer = TraceBuffer('motion_lighting', 3)
+        for i in range(5):
+            with buffer.span('check', 'constraint', i):
+                pass
+
+        self.assertEqual([span[5] for span in buffer.spans()], [2, 3, 4])
+
+    def test_size_zero_disables_tracing(self):
+        buffer = TraceBuffer('motion_lighting', 0)
+
+        self.assertIs(buffer.span('check', 'constraint'), NO_SPAN)
+        self.assertEqual(buffer.spans(), [])
+
+
+class TestTracer(unittest.TestCase):
+
+    def test_dispatch_is_dumped_as_chrome_trace(self):
+        tracer = Tracer()
+        app = create_app(100)
+        constraint = MagicMock()
+        constraint.check.return_value = True
+        handler = Handler(app, [constraint], [])
+
+        with patch('configurable_automation.TRACER', tracer):
+            self.assertTrue(handler.check_constraints({'platform': 'state'}))
+
+        trace = json.loads(json.dumps(tracer.chrome_trace()))
+        spans = {event['name']: event for event in trace['traceEvents'] if event['ph'] == 'X'}
+        self.assertEqual(set(spans), {'check_constraints', 'MagicMock'})
+
+        outer, inner = spans['check_constraints'], spans['MagicMock']
+        self.assertEqual((outer['cat'], inner['cat']), ('handler', 'constraint'))
+        self.assertLessEqual(outer['ts'], inner['ts'])
+        self.assertGreaterEqual(outer['ts'] + outer['dur'], inner['ts'] + inner['dur'])
+        self.assertIn({'name': 'process_name', 'ph': 'M', 'pid': outer['pid'], 'args': {'name': 'motion_lighting'}},
+                      trace['traceEvents'])
+
+    def test_failed_span_records_exception(self):
+        tracer = Tracer()
+        app = create_app(10)
+
+        with self.assertRaises(ValueError):
+            with tracer.span(app, 'get_state', 'state', 'light.kitchen'):
+                raise ValueError()
+
+        event, = [event for event in tracer.chrome_trace(['motion_lighting'])['traceEvents'] if event['ph'] == 'X']
+        self.assertEqual(event['args'], {'detail': 'light.kitchen', 'exception': 'ValueError'})
+        self.assertEqual(tracer.chrome_trace(['other_app'])['traceEvents'], [])
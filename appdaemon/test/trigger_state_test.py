@@ -0,0 +1,151 @@
+import unittest
+from unittest.mock import Mock, MagicMock, patch
+
+from lib.triggers import get_trigger
+
+
+class FakeTimers:
+    def __init__(self):
+        self.timers = {}
+        self.next_handle = 0
+
+    def run_in(self, callback, delay, **kwargs):
+        self.next_handle += 1
+        self.timers[self.next_handle] = (callback, kwargs)
+        return self.next_handle
+
+    def cancel_timer(self, handle):
+        del self.timers[handle]
+
+    def fire_all(self):
+        timers = self.timers
+        self.timers = {}
+        for callback, kwargs in timers.values():
+            callback(kwargs)
+
+
+def create_trigger(config):
+    timers = FakeTimers()
+    app = Mock(**{'variables': {}})
+    app.run_in = MagicMock(side_effect=timers.run_in)
+    app.cancel_timer = MagicMock(side_effect=timers.cancel_timer)
+
+    callback = MagicMock()
+    trigger = get_trigger(app, {
+        'platform': 'state',
+        'entity_id': 'sensor.power_meter',
+        **config
+    }, callback)
+
+    return trigger, callback, timers
+
+
+def change(trigger, old, new):
+    trigger._state_change_handler('sensor.power_meter', 'state', old, new, {})
+
+
+def delivered(callback):
+    return [(c.args[0].data['from'], c.args[0].data['to']) for c in callback.call_args_list]
+
+
+class TestStateTrigger(unittest.TestCase):
+
+    def test_every_change_is_delivered_by_default(self):
+        trigger, callback, _ = create_trigger({})
+
+        change(trigger, '1', '2')
+        change(trigger, '2', '3')
+
+        self.assertEqual(delivered(callback), [('1', '2'), ('2', '3')])
+
+    def test_debounce_delivers_trailing_edge(self):
+        trigger, callback, timers = create_trigger({'debounce': 5})
+
+        change(trigger, '1', '2')
+        change(trigger, '2', '3')
+        change(trigger, '3', '4')
+
+        self.assertEqual(delivered(callback), [])
+        self.assertEqual(len(timers.timers), 1)
+
+        timers.fire_all()
+        self.assertEqual(delivered(callback), [('1', '4')])
+        self.assertEqual(trigger.stats()['suppressed_debounce'], 2)
+
+    def test_debounce_drops_change_that_reverted(self):
+        trigger, callback, timers = create_trigger({'debounce': 5})
+
+        change(trigger, 'off', 'on')
+        change(trigger, 'on', 'off')
+        timers.fire_all()
+
+        self.assertEqual(delivered(callback), [])
+        self.assertEqual(trigger.stats()['suppressed_debounce'], 2)
+
+    def test_debounce_ignores_timer_that_fired_while_rescheduled(self):
+        trigger, callback, timers = create_trigger({'debounce': 5})
+
+        change(trigger, '1', '2')
+        stale = dict(timers.timers)
+        change(trigger, '2', '3')
+
+        for handler, kwargs in stale.values():
+            handler(kwargs)
+        self.assertEqual(delivered(callback), [])
+
+        timers.fire_all()
+        self.assertEqual(delivered(callback), [('1', '3')])
+
+    def test_throttle_delivers_leading_edge(self):
+        trigger, callback, _ = create_trigger({'throttle': 60})
+
+        with patch('lib.triggers.time.monotonic', side_effect=[100, 110, 161]):
+            change(trigger, '1', '2')
+            change(trigger, '2', '3')
+            change(trigger, '3', '4')
+
+        self.assertEqual(delivered(callback), [('1', '2'), ('3', '4')])
+        self.assertEqual(trigger.stats()['suppressed_throttle'], 1)
+
+    def test_coalesce_delivers_latest_value_per_window(self):
+        trigger, callback, timers = create_trigger({'coalesce': 10})
+
+        change(trigger, '1', '2')
+        change(trigger, '2', '3')
+        self.assertEqual(len(timers.timers), 1)
+
+        timers.fire_all()
+        change(trigger, '3', '5')
+        timers.fire_all()
+
+        self.assertEqual(delivered(callback), [('1', '3'), ('3', '5')])
+        self.assertEqual(trigger.stats()['suppressed_coalesce'], 1)
+
+    def test_min_delta(self):
+        trigger, callback, _ = create_trigger({'min_delta': 10})
+
+        change(trigger, '100', '104')
+        change(trigger, '104', '109.5')
+        change(trigger, '109.5', '111')
+        change(trigger, '111', 'unavailable')
+
+        self.assertEqual(delivered(callback), [('109.5', '111'), ('111', 'unavailable')])
+        self.assertEqual(trigger.stats(), {
+            'received': 4,
+            'delivered': 2,
+            'suppressed_min_delta': 2,
+            'suppressed_throttle': 0,
+            'suppressed_debounce': 0,
+            'suppressed_coalesce': 0,
+        })
+
+    def test_only_one_rate_limit_mode(self):
+        with self.assertRaises(ValueError):
+            create_trigger({'debounce': 5, 'throttle': 5})
+
+    def test_pattern_listens_for_matching_entities(self):
+        trigger, _, _ = create_trigger({'entity_id': None, 'pattern': ['binary_sensor.*_motion', 'light.*']})
+
+        trigger.app.listen_state.assert_not_called()
+        trigger.app.listen_state_pattern.assert_called_once_with(
+            trigger._state_change_handler, ['binary_sensor.*_motion', 'light.*'])
@@ -0,0 +1,50 @@
+import unittest
+
+from lib.core.value_matcher import compile_matcher, EventDataMatcher, InMatcher, NumericMatcher, EqualsMatcher
+
+
+class TestValueMatcher(unittest.TestCase):
+
+    def test_single_item_list_is_unwrapped(self):
+        matcher = compile_matcher(['on'])
+
+        self.assertIsInstance(matcher, EqualsMatcher)
+        self.assertTrue(matcher.matches('on'))
+        self.assertEqual(matcher.expected, ['on'])
+
+    def test_numeric_comparison(self):
+        matcher = compile_matcher('>=24.5')
+
+        self.assertIsInstance(matcher, NumericMatcher)
+        self.assertTrue(matcher.matches('24.5'))
+        self.assertTrue(matcher.matches(30))
+        self.assertFalse(matcher.matches('24'))
+        self.assertFalse(matcher.matches('unavailable'))
+        self.assertFalse(matcher.matches(None))
+
+    def test_invalid_numeric_comparison_fails_on_check(self):
+        matcher = compile_matcher('<abc')
+
+        with self.assertRaises(ValueError):
+            matcher.matches('1')
+
+    def test_membership(self):
+        matcher = compile_matcher(['on', '>5'])
+
+        self.assertIsInstance(matcher, InMatcher)
+        self.assertTrue(matcher.matches('>5'))
+        self.assertFalse(matcher.matches('6'))
+        self.assertFalse(matcher.matches({'state': 'on'}))
+
+    def test_membership_with_unhashable_values(self):
+        matcher = compile_matcher([['on'], 'off'])
+
+        self.assertTrue(matcher.matches(['on']))
+        self.assertTrue(matcher.matches('off'))
+
+    def test_event_data_is_compared_flattened(self):
+        matcher = EventDataMatcher({'args': {'button': 'left', 'press_type': ['single', 'double']}})
+
+        self.assertIsNone(matcher.mismatch({'args': {'button': 'left', 'press_type': 'double'}, 'command': 'click'}))
+        self.assertEqual(matcher.mismatch({'args': {'button': 'right', 'press_type': 'single'}}),
+                         ('args.button', 'left', 'right'))